@@ -7,3 +7,15 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals #Imports the signals to connect them
+        from blog import models as blog_models
+        from .instrumentation import timed_function
+        # count Markdown rendering in the request timings from here, so the blog app does not depend on api
+        blog_models.render_markdown = timed_function('markdown')(blog_models.render_markdown)
+        from django.db.models.signals import post_migrate
+        # the search index table is created outside the migrations, once the blog tables exist
+        post_migrate.connect(create_search_index, sender=self.apps.get_app_config('blog'))
+
+
+def create_search_index(**kwargs):
+    from .search import get_search_backend
+    get_search_backend().setup()
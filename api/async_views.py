@@ -0,0 +1,139 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.request import ForcedAuthentication
+from rest_framework.response import Response
+from .instrumentation import timed
+from .reads import arun_read
+
+# URL configuration of ASGI requests when settings.ASYNC_READ_VIEWS is on: the read endpoints served by
+# native async views. WSGI servers keep ROOT_URLCONF, as each async view would need an event loop of its own.
+ASYNC_READ_URLCONF = getattr(settings, 'ASYNC_READ_URLCONF', 'blogging_platform.async_urls')
+
+
+class AsyncReadViewsMiddleware:
+    """
+    Routes ASGI requests through ASYNC_READ_URLCONF. Under WSGI (a sync middleware chain)
+    it removes itself, so requests keep the DRF views of ROOT_URLCONF.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ASYNC_READ_VIEWS', False) or not iscoroutinefunction(get_response):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        markcoroutinefunction(self)
+
+    async def __call__(self, request):
+        request.urlconf = ASYNC_READ_URLCONF
+        return await self.get_response(request)
+
+
+class ResolvedAuthentication(BaseAuthentication):
+    """
+    Replays the outcome of an authenticator that already ran on the event loop.
+    """
+    def __init__(self, authenticator, result=None, error=None):
+        self.authenticator = authenticator
+        self.result = result
+        self.error = error
+
+    def authenticate(self, request):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def authenticate_header(self, request):
+        return self.authenticator.authenticate_header(request)
+
+
+class AsyncReadView(View):
+    """
+    Serves GET of a DRF view natively on the event loop. It runs the same reads as the DRF
+    view (its `<action>_read`, or `get_read` for an APIView; see api/reads.py), with the
+    database work going through the async ORM, and the same request pipeline: authentication,
+    then DRF's initial() for permissions, throttles and versioning, then exception handling.
+
+    Every other method, and renderers other than JSON (such as the browsable API), are
+    handed to the DRF view itself, `sync_view`.
+    """
+    sync_view = None # the DRF view function (from as_view()) serving this route
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # like DRF views, these authenticate with bearer tokens rather than session cookies
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def get(self, request, *args, **kwargs):
+        view = self.drf_view()
+        view.args, view.kwargs = args, kwargs
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        try:
+            view.format_kwarg = view.get_format_suffix(**kwargs)
+            renderer, _ = view.perform_content_negotiation(view.request)
+            if renderer.format != 'json':
+                return await self.delegate(request, *args, **kwargs)
+            await self.authenticate(view.request)
+            view.initial(view.request, *args, **kwargs)
+            read = getattr(view, f'{getattr(view, "action", None) or "get"}_read')
+            response = await arun_read(read(view.request, *args, **kwargs))
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return self.render(view.finalize_response(view.request, response, *args, **kwargs))
+
+    def drf_view(self):
+        """
+        An instance of the DRF view set up the way its as_view() function does.
+        """
+        view = self.sync_view.cls(**self.sync_view.initkwargs)
+        actions = getattr(self.sync_view, 'actions', None)
+        if actions is not None:
+            view.action_map = {'head': actions['get'], **actions}
+        return view
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    post = put = patch = delete = options = delegate
+
+    async def authenticate(self, request):
+        """
+        Run the request's authenticators on the event loop (in a thread for ones that are not
+        reads), then hand DRF their outcome, so initial() does not authenticate again.
+        """
+        if any(isinstance(authenticator, ForcedAuthentication) for authenticator in request.authenticators):
+            return # APIClient.force_authenticate
+        resolved = []
+        for authenticator in request.authenticators:
+            try:
+                with timed('auth'):
+                    if hasattr(authenticator, 'authenticate_read'):
+                        result = await arun_read(authenticator.authenticate_read(request))
+                    else:
+                        result = await sync_to_async(authenticator.authenticate)(request)
+            except APIException as error: # DRF's Request._authenticate lets other errors propagate
+                resolved.append(ResolvedAuthentication(authenticator, error=error))
+                break
+            resolved.append(ResolvedAuthentication(authenticator, result))
+            if result is not None:
+                break
+        request.authenticators = tuple(resolved)
+
+    def render(self, response):
+        """
+        Render DRF responses here; Django would otherwise render them in a worker thread.
+        """
+        if not isinstance(response, Response):
+            return response
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
@@ -0,0 +1,115 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication as BaseJWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .instrumentation import timed
+from .reads import run_read
+
+# Seconds a user row is served from the in-process cache to read-only requests. Saves in this
+# process invalidate it at once; this bounds how long other processes can serve a stale row.
+AUTH_USER_CACHE_TTL = getattr(settings, 'AUTH_USER_CACHE_TTL', 30)
+# Most users kept per process; the least recently used are evicted first
+AUTH_USER_CACHE_SIZE = getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000)
+
+
+class UserCache:
+    """
+    Bounded LRU of user rows with a time-to-live, shared by the threads of one process.
+    """
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(str(user_id))
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[str(user_id)]
+                return None
+            self.entries.move_to_end(str(user_id))
+        # every request gets its own instance so nothing it sets on the user leaks into other requests
+        return copy.copy(user)
+
+    def set(self, user_id, user):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[str(user_id)] = (copy.copy(user), time.monotonic() + self.ttl)
+            self.entries.move_to_end(str(user_id))
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL)
+
+
+class JWTAuthentication(BaseJWTAuthentication):
+    """
+    simplejwt's bearer token authentication.
+
+    Read-only requests are served the user from the in-process user cache, so authenticating
+    them runs no query; writes always load (and re-cache) the user from the database.
+    """
+    def authenticate(self, request):
+        with timed('auth'):
+            return run_read(self.authenticate_read(request))
+
+    def authenticate_read(self, request):
+        """
+        authenticate() as a read (see api/reads.py), which the async read views run on the event loop.
+        """
+        validated_token = self.get_token(request)
+        if validated_token is None:
+            return None
+        user_id = self.get_user_id(validated_token)
+        user = user_cache.get(user_id) if request.method in SAFE_METHODS else None
+        if user is None:
+            user = yield self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}), 'first'
+            if user is not None:
+                user_cache.set(user_id, user)
+        return self.check_user(user, validated_token), validated_token
+
+    def get_token(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return self.get_validated_token(raw_token)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def check_user(self, user, validated_token):
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,131 @@
+import hashlib
+import io
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+from .background import enqueue
+
+User = get_user_model()
+
+# Square thumbnail sizes (in pixels) generated for every profile picture
+AVATAR_SIZES = getattr(settings, 'AVATAR_SIZES', (64, 128, 256))
+AVATAR_MAX_UPLOAD_SIZE = getattr(settings, 'AVATAR_MAX_UPLOAD_SIZE', 5 * 1024 * 1024)
+# Largest accepted image in pixels, checked before the image is decoded
+AVATAR_MAX_PIXELS = getattr(settings, 'AVATAR_MAX_PIXELS', 40_000_000)
+AVATAR_QUALITY = getattr(settings, 'AVATAR_QUALITY', 85)
+
+# accepted upload formats and the extension the original is stored with
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+# thumbnail extension -> Pillow format
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+def avatar_dir(digest):
+    return f'avatars/{digest[:2]}/{digest}'
+
+
+def thumbnail_name(digest, size, extension):
+    return f'{avatar_dir(digest)}/{size}.{extension}'
+
+
+def read_upload(upload):
+    """
+    Validate an uploaded image by decoding it. Returns (bytes, extension).
+    """
+    if upload.size > AVATAR_MAX_UPLOAD_SIZE:
+        raise ValidationError({'profile_picture': f"Images must be at most {AVATAR_MAX_UPLOAD_SIZE // (1024 * 1024)} MB."})
+    data = upload.read()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.format not in UPLOAD_FORMATS:
+                raise ValidationError({'profile_picture': "Upload a JPEG, PNG, WebP or GIF image."})
+            if image.width * image.height > AVATAR_MAX_PIXELS:
+                raise ValidationError({'profile_picture': "The image is too large."})
+            image.load() # decode the pixels so truncated or corrupt files are rejected now
+            extension = UPLOAD_FORMATS[image.format]
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        raise ValidationError({'profile_picture': "Upload a valid image."})
+    return data, extension
+
+
+def render_thumbnails(data, sizes):
+    """
+    Decode an image and encode a square thumbnail per size and format, as {(size, extension): bytes}.
+    Pillow releases the GIL while it decodes, resamples and encodes, so running this on the
+    background worker thread does not hold up the request threads.
+    """
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGBA')
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            # JPEG has no alpha channel, so transparent areas become white
+            flattened = Image.new('RGB', thumbnail.size, 'white')
+            flattened.paste(thumbnail, mask=thumbnail.getchannel('A'))
+            for extension, image_format in THUMBNAIL_FORMATS.items():
+                output = io.BytesIO()
+                (thumbnail if image_format == 'WEBP' else flattened).save(output, image_format, quality=AVATAR_QUALITY)
+                rendered[(size, extension)] = output.getvalue()
+    return rendered
+
+
+def save_profile_picture(user, upload):
+    """
+    Store a validated upload under its content hash and point the user at it. An image that
+    was uploaded before is stored once and reuses its thumbnails; otherwise they are generated
+    on the background worker after commit.
+    """
+    data, extension = read_upload(upload)
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{avatar_dir(digest)}/original.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+
+    user.profile_picture.name = name
+    user.profile_picture_hash = digest
+    user.profile_picture_thumbnails = User.objects.filter(profile_picture_hash=digest, profile_picture_thumbnails=True).exists()
+    user.save(update_fields=['profile_picture', 'profile_picture_hash', 'profile_picture_thumbnails'])
+    if not user.profile_picture_thumbnails:
+        transaction.on_commit(lambda: enqueue(generate_thumbnails, digest, name))
+    return user
+
+
+def generate_thumbnails(digest, name):
+    """
+    Render the thumbnails of a stored original, store the missing ones and mark every
+    user with that picture as having thumbnails.
+    """
+    with default_storage.open(name) as original:
+        data = original.read()
+    rendered = render_thumbnails(data, AVATAR_SIZES)
+
+    for (size, extension), content in rendered.items():
+        thumbnail = thumbnail_name(digest, size, extension)
+        if not default_storage.exists(thumbnail):
+            default_storage.save(thumbnail, ContentFile(content))
+
+    for user in User.objects.filter(profile_picture_hash=digest, profile_picture_thumbnails=False):
+        user.profile_picture_thumbnails = True
+        # save() so the signals refresh cached posts showing the user and the authentication cache
+        user.save(update_fields=['profile_picture_thumbnails'])
+
+
+def avatar_urls(user):
+    """
+    URLs of the user's profile picture and its thumbnails ({size: {extension: url}}, once generated),
+    or None without a picture. Every URL names content by its hash, so it can be cached forever.
+    """
+    if not user.profile_picture:
+        return None
+    sizes = None
+    if user.profile_picture_thumbnails:
+        sizes = {
+            str(size): {extension: default_storage.url(thumbnail_name(user.profile_picture_hash, size, extension))
+                        for extension in THUMBNAIL_FORMATS}
+            for size in AVATAR_SIZES
+        }
+    return {'original': user.profile_picture.url, 'sizes': sizes}
@@ -0,0 +1,52 @@
+import logging
+import queue
+import threading
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Run jobs synchronously in the thread that queues them instead of on the worker (set for the test runner)
+BACKGROUND_JOBS_INLINE = getattr(settings, 'BACKGROUND_JOBS_INLINE', False)
+
+# In-process job queue drained by a single daemon worker thread
+_jobs = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _run():
+    """
+    Worker loop: run queued jobs one at a time and release DB connections between them.
+    """
+    while True:
+        func, args, kwargs = _jobs.get()
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Background job %r failed", func)
+        finally:
+            close_old_connections()
+            _jobs.task_done()
+
+
+def enqueue(func, *args, **kwargs):
+    """
+    Queue func(*args, **kwargs) to run on the background worker, starting it on first use.
+    """
+    if BACKGROUND_JOBS_INLINE:
+        func(*args, **kwargs)
+        return
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='api-background', daemon=True)
+            _worker.start()
+    _jobs.put((func, args, kwargs))
+
+
+def wait_for_jobs():
+    """
+    Block until every queued job has finished (used by tests and management commands).
+    """
+    _jobs.join()
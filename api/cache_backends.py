@@ -0,0 +1,82 @@
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+# a lock file older than this was left by a process that died while holding it
+LOCK_STALE_SECONDS = 10
+
+
+class SharedFileCache(FileBasedCache):
+    """
+    File-based cache shared by every process on the host, whose add() and incr() are atomic
+    across those processes, so the counters kept in it (throttles, unread notification counts)
+    lose no updates. FileBasedCache checks and writes in two steps, and its incr() also drops
+    the timeout of the entry.
+
+    An add() or incr() holds a lock file next to the entry, created with O_EXCL.
+    """
+    @contextmanager
+    def locked(self, key, version=None):
+        self._createdir()
+        path = self._key_to_file(key, version) + '.lock'
+        while True:
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.001)
+        try:
+            yield
+        finally:
+            os.remove(path)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.locked(key, version):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self.locked(key, version):
+            fname = self._key_to_file(key, version)
+            entry = self._read_entry(fname)
+            if entry is None:
+                raise ValueError(f"Key '{key}' not found")
+            expiry, value = entry
+            value += delta
+            self._write_entry(fname, expiry, value)
+        return value
+
+    def _read_entry(self, fname):
+        """
+        (expiry, value) of the entry stored in fname, or None when it is missing or expired.
+        """
+        try:
+            with open(fname, 'rb') as f:
+                expiry = pickle.load(f)
+                if expiry is not None and expiry < time.time():
+                    return None
+                return expiry, pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+
+    def _write_entry(self, fname, expiry, value):
+        # written aside and moved into place like set() does, keeping the expiry the entry has
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                f.write(pickle.dumps(expiry, self.pickle_protocol))
+                f.write(zlib.compress(pickle.dumps(value, self.pickle_protocol)))
+            os.replace(tmp_path, fname)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,214 @@
+import hashlib
+import secrets
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+from .reads import run_read, call_read, get_object_read
+
+# Cache alias holding cached response bodies, fragments and sorted keys
+RESPONSE_CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 60)
+# Cache alias holding object versions. Responses, fragments and sorted keys are cached under a
+# version, so sharing the versions between every process that changes data (servers, background
+# jobs, management commands) is enough for all of them to follow changes.
+VERSION_CACHE_ALIAS = getattr(settings, 'VERSION_CACHE_ALIAS', RESPONSE_CACHE_ALIAS)
+
+
+def get_cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def get_version_cache():
+    return caches[VERSION_CACHE_ALIAS]
+
+
+def version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def new_version():
+    """
+    A fresh version token: the change time in nanoseconds plus random bits, so a version
+    evicted from the cache is never re-issued with the value an old ETag carries.
+    """
+    return f'{time.time_ns():x}-{secrets.token_hex(4)}'
+
+
+def version_timestamp(version):
+    """
+    The change time (in seconds) encoded in a version token, used for Last-Modified.
+    """
+    return int(version.split('-', 1)[0], 16) / 1e9
+
+
+def get_version(kind, pk='list'):
+    """
+    Current version token of an object (or of a whole collection when pk is 'list').
+    """
+    cache = get_version_cache()
+    key = version_key(kind, pk)
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        # keep a version another process stored first
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_versions(kind, pks):
+    """
+    Current version tokens of many objects in one cache round trip, as {pk: version}.
+    """
+    cache = get_version_cache()
+    keys = {pk: version_key(kind, pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for pk, key in keys.items():
+        versions[pk] = found.get(key) or get_version(kind, pk)
+    return versions
+
+
+def fragment_keys(kind, variant, versions):
+    return {pk: f'fragment:{kind}:{variant}:{pk}:{version}' for pk, version in versions.items()}
+
+
+def cached_fragments_read(kind, pks, variant, load, render):
+    """
+    The pre-serialized JSON bytes of each object, in the order of pks, as a read (see api/reads.py).
+
+    Fragments are cached under the object's version, so any change to the object
+    invalidates them. The misses are loaded with the queryset load(missing_pks), turned
+    into {pk: bytes} by render(objects) and backfilled.
+    """
+    cache = get_cache()
+    keys = fragment_keys(kind, variant, get_versions(kind, pks))
+    found = cache.get_many(keys.values())
+    fragments = {pk: found[key] for pk, key in keys.items() if key in found}
+
+    missing = [pk for pk in pks if pk not in fragments]
+    if missing:
+        built = render((yield load(missing)))
+        cache.set_many({keys[pk]: fragment for pk, fragment in built.items()}, timeout=RESPONSE_CACHE_TIMEOUT)
+        fragments.update(built)
+    return [fragments[pk] for pk in pks if pk in fragments]
+
+
+def sorted_keys_key(kind, pk, version):
+    return f'keys:{kind}:{pk}:{version}'
+
+
+def cached_sorted_keys_read(kind, pk, keys_read):
+    """
+    The sort keys of a collection's members (such as the (published date, id) of an author's
+    posts) as a read, cached under the collection's version so bump_version(kind, pk)
+    invalidates them. The read keys_read only runs on a miss; what it returns is cached as is.
+    """
+    cache = get_cache()
+    key = sorted_keys_key(kind, pk, get_version(kind, pk))
+    keys = cache.get(key)
+    if keys is None:
+        keys = yield from keys_read
+        cache.set(key, keys, timeout=RESPONSE_CACHE_TIMEOUT)
+    return keys
+
+
+def bump_versions(kind, pks):
+    """
+    Give every listed object a new version, invalidating their ETags and cached responses.
+    """
+    version = new_version()
+    get_version_cache().set_many({version_key(kind, pk): version for pk in pks}, timeout=None)
+
+
+def bump_version(kind, pk='list'):
+    bump_versions(kind, [pk])
+
+
+class ConditionalResponseMixin:
+    """
+    Serves GET responses with a strong ETag and Last-Modified taken from a version token,
+    answers 304 before doing any work when the client's copy is current, and otherwise
+    caches the serialized data under the version so repeat reads skip serialization.
+
+    Views set `cache_kind`; the tokens are bumped by the signals in api/signals.py.
+    """
+    cache_kind = None
+
+    def conditional_headers(self, request, version, cache_key):
+        """
+        Returns (headers, conditional): a response carrying the ETag and Last-Modified of the version,
+        and the 304/412 response to send instead of the data, or None when the client's copy is stale.
+        """
+        # the query string (e.g. ?fields=) and the renderer change the representation, so both are part of the ETag
+        variant = hashlib.md5(f'{cache_key}:{request.accepted_renderer.format}'.encode('utf-8')).hexdigest()[:12]
+        etag = f'"{self.cache_kind}-{version}-{variant}"'
+        last_modified = version_timestamp(version)
+
+        headers = HttpResponse()
+        headers['ETag'] = etag
+        headers['Last-Modified'] = http_date(last_modified)
+        conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=headers)
+        return headers, (conditional if conditional is not headers else None)
+
+    def response_cache_key(self, request, version, cache_key):
+        return f'response:{self.cache_kind}:{cache_key}:{request.accepted_renderer.format}:{version}'
+
+    def cached_response(self, data, headers):
+        response = Response(data)
+        response['ETag'] = headers['ETag']
+        response['Last-Modified'] = headers['Last-Modified']
+        return response
+
+    def versioned_response(self, request, version, cache_key, build_data):
+        return run_read(self.versioned_response_read(request, version, cache_key, call_read(build_data)))
+
+    def versioned_response_read(self, request, version, cache_key, data_read):
+        """
+        versioned_response() as a read (see api/reads.py), running the read data_read on a miss.
+        """
+        headers, conditional = self.conditional_headers(request, version, cache_key)
+        if conditional is not None:
+            return conditional
+
+        cache = get_cache()
+        key = self.response_cache_key(request, version, cache_key)
+        data = cache.get(key)
+        if data is None:
+            data = yield from data_read
+            cache.set(key, data, timeout=RESPONSE_CACHE_TIMEOUT)
+        return self.cached_response(data, headers)
+
+
+
+class ConditionalRetrieveMixin(ConditionalResponseMixin):
+    """
+    Detail responses versioned per object.
+    """
+    def retrieve(self, request, *args, **kwargs):
+        return run_read(self.retrieve_read(request, *args, **kwargs))
+
+    def retrieve_read(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return (yield from self.versioned_response_read(
+            request, get_version(self.cache_kind, pk), f'{pk}:{request.GET.urlencode()}', self.object_data_read(),
+        ))
+
+    def object_data_read(self):
+        return self.get_serializer((yield from get_object_read(self))).data
+
+
+class ConditionalListMixin(ConditionalResponseMixin):
+    """
+    List responses versioned per collection: any change to one of its objects invalidates every page.
+    """
+    def list(self, request, *args, **kwargs):
+        # the query string selects the page and filters, so it is part of the cache key
+        return self.versioned_response(
+            request, get_version(self.cache_kind), f'list:{request.get_full_path()}',
+            lambda: super(ConditionalListMixin, self).list(request, *args, **kwargs).data,
+        )
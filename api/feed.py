@@ -0,0 +1,179 @@
+import heapq
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router
+from django.db.models import Q
+from blog.models import BlogPost, AuthorSubscription, TimelineEntry
+from .reads import run_read
+
+User = get_user_model()
+
+# Authors with more subscribers than this are merged in at read time instead of being pushed
+FEED_PUSH_MAX_SUBSCRIBERS = getattr(settings, 'FEED_PUSH_MAX_SUBSCRIBERS', 10000)
+# Number of timeline rows inserted per bulk_create
+FEED_CHUNK_SIZE = getattr(settings, 'FEED_CHUNK_SIZE', 1000)
+# Number of an author's latest posts copied into a timeline on subscribe
+FEED_BACKFILL_SIZE = getattr(settings, 'FEED_BACKFILL_SIZE', 20)
+
+
+def feed_date(post):
+    """
+    The date a post is ordered by in timelines.
+    """
+    return post.published_date or post.created_date
+
+
+def is_pull_author(author_id):
+    """
+    True when the author has too many subscribers to push posts into every timeline.
+    """
+    return User.objects.filter(pk=author_id, subscriber_count__gt=FEED_PUSH_MAX_SUBSCRIBERS).exists()
+
+
+def upsert_entries(entries):
+    """
+    Insert timeline rows; a post already in a timeline is moved to the date it carries now.
+    """
+    # MySQL upserts on whichever unique key conflicts and takes no conflict target
+    features = connections[router.db_for_write(TimelineEntry)].features
+    TimelineEntry.objects.bulk_create(
+        entries, update_conflicts=True, update_fields=['published_date'],
+        unique_fields=['user', 'post'] if features.supports_update_conflicts_with_target else None,
+    )
+
+
+def push_post_to_timelines(post_id):
+    """
+    Copy a published post into the timeline of every subscriber of its author, in chunks.
+    """
+    post = BlogPost.objects.filter(pk=post_id, status='published').select_related('author').only(
+        'id', 'author_id', 'published_date', 'created_date', 'author__subscriber_count').first()
+    if post is None or post.author.subscriber_count > FEED_PUSH_MAX_SUBSCRIBERS:
+        return
+
+    published_date = feed_date(post)
+    subscriber_ids = (AuthorSubscription.objects.filter(author_id=post.author_id)
+                      .values_list('user_id', flat=True)
+                      .iterator(chunk_size=FEED_CHUNK_SIZE))
+    batch = []
+    for user_id in subscriber_ids:
+        batch.append(TimelineEntry(user_id=user_id, post_id=post.id, published_date=published_date))
+        if len(batch) >= FEED_CHUNK_SIZE:
+            upsert_entries(batch)
+            batch = []
+    if batch:
+        upsert_entries(batch)
+
+
+def remove_post_from_timelines(post_id):
+    """
+    Drop a post that is no longer published from every timeline.
+    """
+    TimelineEntry.objects.filter(post_id=post_id).delete()
+
+
+def backfill_timeline(user_id, author_id):
+    """
+    Copy the author's latest published posts into a new subscriber's timeline.
+    """
+    if is_pull_author(author_id):
+        return
+    posts = (BlogPost.objects.filter(author_id=author_id, status='published')
+             .order_by('-published_date', '-id')
+             .only('id', 'published_date', 'created_date')[:FEED_BACKFILL_SIZE])
+    upsert_entries([TimelineEntry(user_id=user_id, post_id=post.id, published_date=feed_date(post)) for post in posts])
+
+
+def clear_author_from_timeline(user_id, author_id):
+    """
+    Remove an author's posts from a timeline after unsubscribing.
+    """
+    TimelineEntry.objects.filter(user_id=user_id, post__author_id=author_id).delete()
+
+
+def read_timeline(user, limit, before=None):
+    """
+    Return (posts, next) for the user's home feed: up to `limit` published posts, newest
+    first, and the (published date, id) key to pass as `before` for the next page (None on
+    the last page). `before` continues after that key, so posts sharing a date are never skipped.
+
+    Pushed posts come from one range scan over the user's timeline; posts of
+    high-subscriber authors are pulled at read time and merged in.
+    """
+    return run_read(timeline_read(user, limit, before))
+
+
+def timeline_read(user, limit, before=None):
+    """
+    read_timeline() as a read (see api/reads.py).
+    """
+    pushed = yield pushed_entries(user, limit, before)
+    pull_author_ids = yield pull_authors(user)
+    pulled = (yield pulled_posts(pull_author_ids, limit, before)) if pull_author_ids else []
+    keys = merge_timeline(pushed, pulled, limit)
+    posts_by_id = {post.pk: post for post in (yield timeline_posts([post_id for _, post_id in keys]))}
+    return [posts_by_id[post_id] for _, post_id in keys if post_id in posts_by_id], next_key(keys, limit)
+
+
+def next_key(keys, limit):
+    return keys[-1] if len(keys) >= limit else None
+
+
+def after_key(before, date_field, id_field):
+    """
+    Filter for the rows that come after the (published date, id) key in newest-first order.
+    """
+    published_date, pk = before
+    return Q(**{f'{date_field}__lt': published_date}) | Q(**{date_field: published_date, f'{id_field}__lt': pk})
+
+
+def pushed_entries(user, limit, before):
+    """
+    (published_date, post_id) of the newest posts pushed into the user's timeline.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if before is not None:
+        entries = entries.filter(after_key(before, 'published_date', 'post_id'))
+    return entries.order_by('-published_date', '-post_id').values_list('published_date', 'post_id')[:limit]
+
+
+def pull_authors(user):
+    """
+    Ids of the followed authors that are too big to push to every timeline, by their stored subscriber count.
+    """
+    return (AuthorSubscription.objects.filter(user=user, author__subscriber_count__gt=FEED_PUSH_MAX_SUBSCRIBERS)
+            .values_list('author_id', flat=True))
+
+
+def pulled_posts(author_ids, limit, before):
+    """
+    (published_date, id) of the newest published posts of the pull authors.
+    """
+    posts = BlogPost.objects.filter(author_id__in=author_ids, status='published', published_date__isnull=False)
+    if before is not None:
+        posts = posts.filter(after_key(before, 'published_date', 'id'))
+    return posts.order_by('-published_date', '-id').values_list('published_date', 'id')[:limit]
+
+
+def merge_timeline(pushed, pulled, limit):
+    """
+    Merge both newest-first streams into a page of (published_date, post id), dropping posts present in both.
+    """
+    keys = []
+    seen = set()
+    for published_date, post_id in heapq.merge(pushed, pulled, reverse=True):
+        if post_id not in seen:
+            seen.add(post_id)
+            keys.append((published_date, post_id))
+        if len(keys) >= limit:
+            break
+    return keys
+
+
+def timeline_posts(post_ids):
+    """
+    The page's posts, hydrated in one batch.
+    """
+    return (BlogPost.objects.filter(pk__in=post_ids)
+            .select_related('author', 'category')
+            .prefetch_related('tags'))
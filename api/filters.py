@@ -1,5 +1,8 @@
 import django_filters
+from django.db.models import Case, When, Value, IntegerField
+from rest_framework.filters import SearchFilter
 from blog.models import BlogPost
+from .search import get_search_backend
 
 class BlogPostFilter(django_filters.FilterSet):
     """
@@ -28,3 +31,25 @@ class BlogPostFilter(django_filters.FilterSet):
         """
         model = BlogPost #the model that this filter applies to
         fields = ['category', 'author', 'status', 'start_date', 'end_date']
+
+
+class PostSearchFilter(SearchFilter):
+    """
+    Answers '?search=' from the full-text search backend instead of icontains scans.
+    Matching posts are returned best match first unless another ordering is requested.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+
+        post_ids = get_search_backend().search(query)
+        if not post_ids:
+            return queryset.none()
+
+        # rank 0 is the best match; the keyset paginator can page on this annotation
+        search_rank = Case(
+            *[When(pk=post_id, then=Value(position)) for position, post_id in enumerate(post_ids)],
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=post_ids).annotate(search_rank=search_rank).order_by('search_rank')
@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.utils.crypto import get_random_string
+from rest_framework.exceptions import Throttled
+
+# Password hashes computed at the same time. Hashing is CPU bound, so more workers only take CPU from other requests.
+PASSWORD_HASH_WORKERS = getattr(settings, 'PASSWORD_HASH_WORKERS', 2)
+# Hash jobs allowed to wait for a worker; further attempts are turned away until the queue drains
+PASSWORD_HASH_QUEUE = getattr(settings, 'PASSWORD_HASH_QUEUE', 32)
+
+
+class HashPool:
+    """
+    Bounded pool of threads for password hashing. Request threads hand hashes to it instead
+    of computing them, so a burst of sign-ins can only ever use PASSWORD_HASH_WORKERS cores
+    and the rest of the workers (and, under ASGI, the event loop) keep serving reads.
+    """
+    def __init__(self, workers, queue):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + queue)
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise Throttled(wait=1, detail="Too many sign-in attempts in progress, try again shortly.")
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+
+hash_pool = HashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
+_dummy_password_hash = None
+
+
+def dummy_password_hash():
+    """
+    A hash made with the current hasher and work factor, checked for unknown accounts so
+    that a sign-in for an email that does not exist takes as long as one that does.
+    """
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = make_password(get_random_string(32))
+    return _dummy_password_hash
+
+
+def verify_password(user, password):
+    """
+    Check the password of a user (or of a dummy account when user is None) in the hash pool.
+    A hash made with outdated settings is upgraded after a successful check, like User.check_password.
+    """
+    encoded = user.password if user is not None else dummy_password_hash()
+    valid = hash_pool.run(check_password, password, encoded)
+    if user is None or not valid:
+        return False
+    if identify_hasher(encoded).must_update(encoded):
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return True
+
+
+def hash_password(password):
+    """
+    make_password, computed in the hash pool.
+    """
+    return hash_pool.run(make_password, password)
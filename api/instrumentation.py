@@ -0,0 +1,195 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.crypto import constant_time_compare
+from .mysql_pool.pool import pool_stats
+
+logger = logging.getLogger('api.instrumentation')
+
+# Requests slower than this (in milliseconds) are logged at WARNING with their SQL
+INSTRUMENTATION_SLOW_MS = getattr(settings, 'INSTRUMENTATION_SLOW_MS', 500)
+# Fraction of slow requests whose SQL is included in the log line
+INSTRUMENTATION_SQL_SAMPLE_RATE = getattr(settings, 'INSTRUMENTATION_SQL_SAMPLE_RATE', 1.0)
+# Most statements kept per request for the slow-request log
+INSTRUMENTATION_MAX_QUERIES = getattr(settings, 'INSTRUMENTATION_MAX_QUERIES', 200)
+# Requests sending this value in an X-Profile header are run under cProfile; None turns profiling off
+INSTRUMENTATION_PROFILE_KEY = getattr(settings, 'INSTRUMENTATION_PROFILE_KEY', None)
+# Functions listed in the profile of a request, by cumulative time
+INSTRUMENTATION_PROFILE_LIMIT = getattr(settings, 'INSTRUMENTATION_PROFILE_LIMIT', 40)
+
+_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Timings collected while one request is handled: {name: [count, seconds]} plus its SQL.
+    Nested timers with the same name count once, so a serializer nested in another is not added twice.
+    """
+    def __init__(self):
+        self.timings = {}
+        self.active = set()
+        self.queries = []
+
+    def add(self, name, seconds):
+        timing = self.timings.setdefault(name, [0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+
+    def server_timing(self, total):
+        entries = [f'{name};dur={seconds * 1000:.1f};desc="{count}"' for name, (count, seconds) in self.timings.items()]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the current request's timing `name`. Does nothing
+    outside an instrumented request.
+    """
+    metrics = _metrics.get()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+    metrics.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.active.discard(name)
+        metrics.add(name, time.perf_counter() - start)
+
+
+def timed_function(name):
+    """
+    Decorator form of timed().
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _metrics.get() is None:
+                return fn(*args, **kwargs)
+            with timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper timing every statement of an instrumented request.
+    """
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.add('db', elapsed)
+        if len(metrics.queries) < INSTRUMENTATION_MAX_QUERIES:
+            metrics.queries.append({'sql': sql, 'ms': round(elapsed * 1000, 2)})
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentationMiddleware:
+    """
+    Times each request's SQL, Markdown rendering, serialization and authentication, returns
+    the timings in a Server-Timing header and logs them as one JSON line. Requests slower than
+    INSTRUMENTATION_SLOW_MS are logged at WARNING with a sample of their SQL, and a request
+    carrying `X-Profile: <INSTRUMENTATION_PROFILE_KEY>` is run under cProfile.
+
+    Profiling only covers requests served synchronously (WSGI). Under ASGI the middleware runs
+    on the event loop, where a profiler would also record every other request in flight and
+    miss the view running in a thread, so X-Profile is ignored there; timings still work.
+
+    Turned on with INSTRUMENTATION_ENABLED; when off the middleware removes itself at startup,
+    and the timers in the rest of the code cost a context variable lookup.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # connections opened from now on get the recorder as they connect, the open ones here
+        connection_created.connect(install_query_recorder, dispatch_uid='api.instrumentation')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token, start = self.begin()
+        profiler = self.profiler(request)
+        try:
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        return self.finish(request, response, metrics, start, profiler)
+
+    async def __acall__(self, request):
+        metrics, token, start = self.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        return self.finish(request, response, metrics, start, None)
+
+    def begin(self):
+        metrics = RequestMetrics()
+        return metrics, _metrics.set(metrics), time.perf_counter()
+
+    def profiler(self, request):
+        key = request.headers.get('X-Profile')
+        if INSTRUMENTATION_PROFILE_KEY and key and constant_time_compare(key, INSTRUMENTATION_PROFILE_KEY):
+            return cProfile.Profile()
+        return None
+
+    def finish(self, request, response, metrics, start, profiler):
+        total = time.perf_counter() - start
+        response['Server-Timing'] = metrics.server_timing(total)
+
+        slow = total * 1000 >= INSTRUMENTATION_SLOW_MS
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'timings': {name: {'count': count, 'ms': round(seconds * 1000, 2)}
+                        for name, (count, seconds) in metrics.timings.items()},
+        }
+        pools = pool_stats()
+        if pools:
+            record['db_pool'] = pools
+        if slow and random.random() < INSTRUMENTATION_SQL_SAMPLE_RATE:
+            record['sql'] = metrics.queries
+        if profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(INSTRUMENTATION_PROFILE_LIMIT)
+            record['profile'] = output.getvalue()
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record))
+        return response
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+async def asgi_get(application, path, token):
+    """
+    Send one GET through the ASGI application the way an ASGI server would. Returns the status code.
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'https', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 443),
+    }
+    received = False
+    done = asyncio.Event()
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    done.set()
+    return status
+
+
+class Command(BaseCommand):
+    """
+    Drive the ASGI application in-process with many concurrent clients, once with the sync
+    DRF views and once with the async read views, and report throughput, latency and the
+    peak number of threads the process needed.
+    """
+    help = "Benchmark read endpoints under ASGI with sync and async views."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/posts/', help="Endpoint to request.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests sent per concurrency level.")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 100], help="Concurrent clients.")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError("The benchmark needs at least one active user.")
+        token = str(RefreshToken.for_user(user).access_token)
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['localhost']):
+            for mode, enabled in (('sync', False), ('async', True)):
+                with override_settings(ASYNC_READ_VIEWS=enabled):
+                    # the middleware reads the setting when the handler loads it
+                    application = get_asgi_application()
+                    results[mode] = {
+                        concurrency: asyncio.run(self.run(application, options['path'], token, concurrency, options['requests']))
+                        for concurrency in options['concurrency']
+                    }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    async def run(self, application, path, token, concurrency, count):
+        status = await asgi_get(application, path, token) # warm up
+        if status != 200:
+            raise CommandError(f"{path} returned {status}.")
+
+        latencies = []
+        remaining = count
+        peak_threads = threading.active_count()
+        sampling = True
+
+        async def sample_threads():
+            nonlocal peak_threads
+            while sampling:
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        async def client():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                await asgi_get(application, path, token)
+                latencies.append(time.perf_counter() - start)
+
+        sampler = asyncio.create_task(sample_threads())
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        sampling = False
+        await sampler
+
+        latencies.sort()
+        return {
+            'requests_per_second': round(count / elapsed, 1),
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+            'peak_threads': peak_threads,
+        }
@@ -0,0 +1,258 @@
+import io
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver, reverse
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from blog.models import BlogPost, Category, Tag, Comment, Notification
+
+User = get_user_model()
+
+# Routes the router generates for the viewset actions that api/urls.py also maps to paths of their own;
+# both serve the same view, so measuring the explicit path covers the router's one
+ROUTE_ALIASES = {
+    'most-liked-posts': 'blogpost-most-liked',
+    'highest-rated-posts': 'blogpost-highest-rated',
+    'posts-by-category': 'blogpost-posts-by-category',
+    'posts-by-author': 'blogpost-posts-by-author',
+    'like-post': 'blogpost-like-post',
+    'rate-post': 'blogpost-rate-post',
+    'share-post': 'blogpost-share-post',
+    'subscribe-to-author': 'user-subscribe-to-author',
+    'unsubscribe-from-author': 'user-unsubscribe-from-author',
+}
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def png_upload():
+    output = io.BytesIO()
+    Image.new('RGB', (300, 300), 'teal').save(output, 'PNG')
+    output.name = 'avatar.png'
+    output.seek(0)
+    return output
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    """
+    Request every route in api/urls.py through the test client against the current database
+    (see generate_data) and report latency percentiles, throughput, query counts and peak
+    Python memory per route as JSON, so runs can be diffed across commits.
+
+    Every request runs in a transaction that is rolled back, so write endpoints measure the
+    same work on each iteration and leave the data unchanged. Work deferred to on_commit
+    (background jobs, outbox delivery) is therefore not part of the measurement.
+    """
+    help = "Benchmark every API route and report the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Timed requests per route.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per route before measuring.")
+        parser.add_argument('--route', action='append', help="Only benchmark the routes with these URL names.")
+        parser.add_argument('--password', default='password', help="Password of the benchmark user, for the sign-in routes.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        self.fixtures = self.load_fixtures()
+        token = str(RefreshToken.for_user(self.fixtures['user']).access_token)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.anonymous = APIClient()
+
+        specs = self.routes(options['password'])
+        if options['route']:
+            unknown = set(options['route']) - {spec[0] for spec in specs}
+            if unknown:
+                raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}.")
+            specs = [spec for spec in specs if spec[0] in options['route']]
+
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+            scope: '1000000/s' for scope in settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})}}
+        results = {}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False, MEDIA_ROOT=media_root,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', REST_FRAMEWORK=rest_framework,
+        ):
+            for name, method, kwargs, data, anonymous in specs:
+                client = self.anonymous if anonymous else self.client
+                # a route can be measured with several methods, so results are keyed by 'name METHOD'
+                key = f'{name} {method.upper()}'
+                results[key] = self.measure(client, method, reverse(name, kwargs=kwargs), data, options['iterations'], options['warmup'])
+                self.stderr.write(f"{key}: p50 {results[key]['p50_ms']} ms, {results[key]['queries']} queries")
+
+        report = {'meta': self.meta(options), 'routes': results, 'uncovered_routes': self.uncovered(specs)}
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def load_fixtures(self):
+        """
+        Pick the objects the routes are requested with: a user with posts and subscriptions (so the
+        feed has content), one of the authors they follow and one they do not, and one of their posts.
+        """
+        user = (User.objects.filter(is_active=True, posts__isnull=False, subscriptions__isnull=False)
+                .order_by('-last_login', 'pk').first())
+        if user is None:
+            raise CommandError("No active user with posts and subscriptions; run generate_data first.")
+        post = BlogPost.objects.filter(author=user, status='published').order_by('-pk').first()
+        if post is None:
+            raise CommandError(f"{user} has no published posts; run generate_data first.")
+        return {
+            'user': user,
+            'author': user.subscriptions.order_by('pk').first().author,
+            'stranger': User.objects.exclude(pk=user.pk).exclude(subscribers__user=user).order_by('pk').first(),
+            'post': post,
+            'comment': Comment.objects.filter(author=user).order_by('pk').first()
+                       or Comment.objects.create(post=post, author=user, content='benchmark comment'),
+            'category': Category.objects.order_by('pk').first() or Category.objects.create(name='benchmark'),
+            'tag': Tag.objects.order_by('pk').first() or Tag.objects.create(name='benchmark'),
+            'notification': Notification.objects.filter(user=user).order_by('-pk').first()
+                            or Notification.objects.create(user=user, message='benchmark notification'),
+        }
+
+    def routes(self, password):
+        """
+        (URL name, method, URL kwargs, request data, anonymous) for every route worth measuring.
+        """
+        f = self.fixtures
+        user, author, post = f['user'], f['author'], f['post']
+        category = post.category or f['category']
+        new_user = {'username': 'bench-new-user', 'email': 'bench-new-user@example.com', 'password': 'bench-password'}
+        routes = [
+            ('token_obtain_pair', 'post', {}, {'email': user.email, 'password': password}, True),
+            ('token_refresh', 'post', {}, {'refresh': str(RefreshToken.for_user(user))}, True),
+            ('user_login', 'post', {}, {'email': user.email, 'password': password}, True),
+            ('feed', 'get', {}, None, False),
+            ('blogpost-list', 'get', {}, None, False),
+            ('blogpost-list', 'post', {}, {'title': 'Benchmark post', 'content': '# Benchmark\n\nSome *text*.', 'category': category.name}, False),
+            ('blogpost-detail', 'get', {'pk': post.pk}, None, False),
+            ('blogpost-detail', 'patch', {'pk': post.pk}, {'title': 'Benchmark title'}, False),
+            ('blogpost-detail', 'delete', {'pk': post.pk}, None, False),
+            ('posts-by-category', 'get', {'category_slug': category.slug}, None, False),
+            ('posts-by-author', 'get', {'author_slug': author.slug}, None, False),
+            ('most-liked-posts', 'get', {}, None, False),
+            ('highest-rated-posts', 'get', {}, None, False),
+            ('blogpost-trending', 'get', {}, None, False),
+            ('blogpost-related', 'get', {'pk': post.pk}, None, False),
+            ('like-post', 'post', {'pk': post.pk}, None, False),
+            ('rate-post', 'post', {'pk': post.pk}, {'rating': 4}, False),
+            ('share-post', 'post', {'pk': post.pk}, {'email': 'reader@example.com'}, False),
+            ('user-list', 'get', {}, None, False),
+            ('user-register', 'post', {}, new_user, True),
+            ('user-detail', 'get', {'pk': author.pk}, None, False),
+            ('user-detail', 'patch', {'pk': user.pk}, {'bio': 'Benchmark bio'}, False),
+            ('user-profile-picture', 'post', {'pk': user.pk}, png_upload, False),
+            ('subscribe-to-author', 'post', {'pk': f['stranger'].pk}, None, False),
+            ('unsubscribe-from-author', 'delete', {'pk': author.pk}, None, False),
+            ('category-list', 'get', {}, None, False),
+            ('category-detail', 'get', {'pk': f['category'].pk}, None, False),
+            ('tag-list', 'get', {}, None, False),
+            ('tag-detail', 'get', {'pk': f['tag'].pk}, None, False),
+            ('tag-cloud', 'get', {}, None, False),
+            ('comment-list', 'get', {}, None, False),
+            ('comment-list', 'post', {}, {'post': post.pk, 'author': user.pk, 'content': 'Benchmark comment'}, False),
+            ('comment-detail', 'get', {'pk': f['comment'].pk}, None, False),
+            ('notification-list', 'get', {}, None, False),
+            ('notification-detail', 'get', {'pk': f['notification'].pk}, None, False),
+            ('notification-unread-count', 'get', {}, None, False),
+            ('notification-mark-all-read', 'post', {}, None, False),
+        ]
+        return routes
+
+    def request(self, client, method, url, data):
+        """
+        Send one request in a transaction that is rolled back afterwards.
+        """
+        kwargs = {}
+        if callable(data): # file uploads need a fresh file per request
+            kwargs = {'data': {'profile_picture': data()}, 'format': 'multipart'}
+        elif data is not None:
+            kwargs = {'data': data, 'format': 'json'}
+        with transaction.atomic():
+            response = getattr(client, method)(url, **kwargs)
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, client, method, url, data, iterations, warmup):
+        for _ in range(warmup):
+            self.request(client, method, url, data)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(client, method, url, data)
+        # the savepoint and rollback of the benchmark's own transaction are not the view's queries
+        view_queries = [query for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+
+        tracemalloc.start()
+        self.request(client, method, url, data)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            request_start = time.perf_counter()
+            self.request(client, method, url, data)
+            latencies.append(time.perf_counter() - request_start)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'method': method.upper(),
+            'url': url,
+            'status': response.status_code,
+            'queries': len(view_queries),
+            'response_bytes': len(getattr(response, 'content', b'') or b''),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'mean_ms': round(elapsed / iterations * 1000, 2),
+            'requests_per_second': round(iterations / elapsed, 1),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+
+    def uncovered(self, specs):
+        """
+        URL names in api/urls.py that no spec requests, so new routes do not silently go unmeasured.
+        """
+        covered = {spec[0] for spec in specs}
+        covered |= {alias for name, alias in ROUTE_ALIASES.items() if name in covered}
+        names = {pattern.name for pattern in get_resolver('api.urls').url_patterns if pattern.name}
+        return sorted(name for name in names - covered if name != 'api-root')
+
+    def meta(self, options):
+        return {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': BlogPost.objects.count(),
+                'comments': Comment.objects.count(),
+                'categories': Category.objects.count(),
+                'tags': Tag.objects.count(),
+            },
+        }
@@ -0,0 +1,51 @@
+import json
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    """
+    Compare requests per second of GET /api/posts/ served through the DRF serializers
+    against pages assembled from cached JSON fragments, for several page sizes.
+    Runs in-process against the configured database, which needs at least as many
+    posts as the largest page size.
+    """
+    help = "Benchmark the post list with and without the JSON fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests timed per page size and mode.")
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 100], help="Page sizes to benchmark.")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.order_by('pk').first()
+        if user is None:
+            raise CommandError("The benchmark needs at least one user.")
+        if BlogPost.objects.count() < max(options['sizes']):
+            raise CommandError(f"The benchmark needs at least {max(options['sizes'])} posts.")
+
+        client = APIClient()
+        client.force_authenticate(user)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False):
+            for size in options['sizes']:
+                results[size] = {}
+                for mode, enabled in (('serializer', False), ('fragments', True)):
+                    with override_settings(POST_FRAGMENT_CACHE=enabled):
+                        results[size][mode] = self.requests_per_second(client, size, options['requests'])
+                results[size]['speedup'] = round(results[size]['fragments'] / results[size]['serializer'], 2)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def requests_per_second(self, client, size, count):
+        url = f'/api/posts/?page_size={size}'
+        response = client.get(url) # warm up (and fill the fragment cache)
+        if response.status_code != 200:
+            raise CommandError(f"{url} returned {response.status_code}.")
+        start = time.perf_counter()
+        for _ in range(count):
+            client.get(url)
+        return round(count / (time.perf_counter() - start), 1)
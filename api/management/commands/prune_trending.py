@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.trending import prune
+
+
+class Command(BaseCommand):
+    """
+    Remove trending scores whose last like or rating fell outside their window,
+    keeping the leaderboard table small. Run it periodically (e.g. from cron).
+    """
+    help = "Delete stale trending scores."
+
+    def handle(self, *args, **options):
+        deleted = prune()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} stale trending score(s)."))
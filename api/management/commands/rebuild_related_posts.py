@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from api.related import rebuild
+
+
+class Command(BaseCommand):
+    """
+    Recompute the related posts of every published post from scratch. Changes are applied
+    incrementally as they happen; run this periodically (e.g. from cron) to pick up the drift
+    in tag weights as tags gain and lose posts.
+    """
+    help = "Rebuild the precomputed related posts of every published post."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of posts whose related posts are replaced per transaction.")
+
+    def handle(self, *args, **options):
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Computed related posts for {count} post(s)."))
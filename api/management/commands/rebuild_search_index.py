@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Create the search index table if needed and re-index every blog post.
+    """
+    help = "Rebuild the full-text search index for blog posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of posts loaded per query.")
+
+    def handle(self, *args, **options):
+        count = get_search_backend().rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} post(s)."))
@@ -0,0 +1,42 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.outbox import drain_outbox, OUTBOX_BATCH_SIZE
+
+logger = logging.getLogger('api.outbox')
+
+
+class Command(BaseCommand):
+    """
+    Deliver queued outbox emails in batches over one mail connection.
+    With --loop it keeps polling, which is how the worker runs in production; while
+    the mail server is unreachable it waits twice as long after each failure, up to --max-backoff.
+    """
+    help = "Send pending emails from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help="Number of emails claimed at a time.")
+        parser.add_argument('--loop', action='store_true', help="Keep draining the outbox until interrupted.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to wait between polls with --loop.")
+        parser.add_argument('--max-backoff', type=float, default=300.0,
+                            help="Longest wait in seconds between retries while the mail server is unreachable.")
+
+    def handle(self, *args, **options):
+        delay = options['interval']
+        while True:
+            try:
+                sent, failed = drain_outbox(batch_size=options['batch_size'])
+            except OSError as error: # smtplib errors are OSErrors too
+                if not options['loop']:
+                    raise CommandError(f"Mail server unavailable: {error}")
+                delay = min(delay * 2, options['max_backoff'])
+                logger.warning("Mail server unavailable, retrying in %.0f seconds: %s", delay, error)
+                time.sleep(delay)
+                continue
+
+            delay = options['interval']
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} email(s), {failed} failed."))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
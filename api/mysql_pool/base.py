@@ -0,0 +1,62 @@
+"""
+django.db.backends.mysql with a per-process connection pool. Use 'api.mysql_pool' as the ENGINE
+and configure the pool in OPTIONS, e.g. {'pool': {'max_size': 10}} (see ConnectionPool for the
+options); without a 'pool' option it behaves exactly like the MySQL backend.
+
+Pooling replaces persistent connections, so CONN_MAX_AGE must be 0: Django closes the connection
+at the end of every request and the pool keeps it open for the next one. Session state set on a
+connection (variables, temporary tables, locks) outlives the request that set it.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.mysql import base as mysql
+from .pool import ConnectionPool, PoolTimeout, get_pool
+
+Database = mysql.Database
+
+
+def connect(params):
+    connection = Database.connect(**params)
+    # the same workaround as django.db.backends.mysql's get_new_connection
+    if connection.encoders.get(bytes) is bytes:
+        connection.encoders.pop(bytes)
+    return connection
+
+
+class DatabaseWrapper(mysql.DatabaseWrapper):
+    @property
+    def pool(self):
+        pool_options = self.settings_dict['OPTIONS'].get('pool')
+        if not pool_options:
+            return None
+        return get_pool(self.alias, lambda: self.make_pool({} if pool_options is True else pool_options))
+
+    def make_pool(self, pool_options):
+        if self.settings_dict.get('CONN_MAX_AGE', 0) != 0:
+            raise ImproperlyConfigured("Pooling doesn't support persistent connections; set CONN_MAX_AGE to 0.")
+        params = self.get_connection_params()
+        return ConnectionPool(lambda: connect(params), **pool_options)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            # owned by this wrapper, so the pool gets the slot back if its thread goes away
+            return pool.checkout(owner=self)
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        if self.in_atomic_block:
+            # the wrapper keeps referring to a connection closed in a transaction, so it cannot be reused
+            pool.close(self.connection)
+        else:
+            pool.checkin(self.connection)
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+# alias -> ConnectionPool, for the current process (a forked worker starts with none)
+_pools = {}
+_pools_pid = None
+# pools inherited through fork: kept referenced, since closing their sockets would end the parent's sessions
+_inherited = []
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections shared by the threads of one process.
+
+    At most `max_size` connections are open; a checkout waits up to `timeout` seconds for one
+    to be returned. Idle connections are pinged before they are handed out (`check`) and
+    replaced once older than `max_lifetime` or idle for longer than `max_idle` seconds.
+
+    A connection whose owner is garbage collected without returning it (a thread that ended
+    with it checked out) is closed and its slot freed.
+    """
+    def __init__(self, connect, max_size=10, timeout=10, max_lifetime=3600, max_idle=600, check=True):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check = check
+        self.lock = threading.Condition()
+        self.idle = deque() # (connection, created at, returned at), most recently returned last
+        self.created_at = {} # id(connection) -> created at, for every open connection
+        self.opening = 0 # connections being opened, which already count towards max_size
+        self.finalizers = {} # id(connection) -> finalizer of its owner, while checked out
+        self.counters = dict.fromkeys(
+            ['checkouts', 'created', 'reused', 'waits', 'timeouts', 'recycled', 'unhealthy', 'lost'], 0)
+        self.wait_seconds = 0.0
+
+    @property
+    def size(self):
+        return len(self.created_at) + self.opening
+
+    def checkout(self, owner=None):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self.lock:
+            self.counters['checkouts'] += 1
+        while True:
+            with self.lock:
+                connection = self.take_idle()
+                if connection is None and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if not waited:
+                        waited = True
+                        self.counters['waits'] += 1
+                    if remaining <= 0 or not self.lock.wait(remaining):
+                        self.counters['timeouts'] += 1
+                        self.wait_seconds += time.monotonic() - start
+                        raise PoolTimeout(f"No database connection free within {self.timeout}s "
+                                          f"({self.max_size} in use).")
+                    continue
+                if connection is None:
+                    self.opening += 1
+                if waited:
+                    self.wait_seconds += time.monotonic() - start
+
+            if connection is None:
+                connection = self.open()
+            elif self.check and not self.healthy(connection):
+                with self.lock:
+                    self.counters['unhealthy'] += 1
+                self.close(connection)
+                continue
+            else:
+                with self.lock:
+                    self.counters['reused'] += 1
+            if owner is not None:
+                self.finalizers[id(connection)] = weakref.finalize(owner, self.lost, connection)
+            return connection
+
+    def take_idle(self):
+        """
+        Pop the most recently returned idle connection that is still young enough; called with the lock held.
+        """
+        now = time.monotonic()
+        while self.idle:
+            connection, created_at, returned_at = self.idle.pop()
+            if now - created_at < self.max_lifetime and now - returned_at < self.max_idle:
+                return connection
+            self.counters['recycled'] += 1
+            self.close_locked(connection)
+        return None
+
+    def open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self.lock:
+                self.opening -= 1
+                self.lock.notify()
+            raise
+        with self.lock:
+            self.opening -= 1
+            self.created_at[id(connection)] = time.monotonic()
+            self.counters['created'] += 1
+        return connection
+
+    def healthy(self, connection):
+        try:
+            connection.ping()
+        except Exception:
+            return False
+        return True
+
+    def checkin(self, connection):
+        """
+        Return a connection, rolling back whatever transaction it was left in.
+        """
+        finalizer = self.finalizers.pop(id(connection), None)
+        if finalizer is not None:
+            finalizer.detach()
+        try:
+            connection.rollback()
+        except Exception:
+            self.close(connection)
+            return
+        with self.lock:
+            created_at = self.created_at.get(id(connection))
+            if created_at is None:
+                return
+            if time.monotonic() - created_at >= self.max_lifetime:
+                self.counters['recycled'] += 1
+                self.close_locked(connection)
+            else:
+                self.idle.append((connection, created_at, time.monotonic()))
+            self.lock.notify()
+
+    def close(self, connection):
+        """
+        Close a checked out connection instead of returning it, freeing its slot.
+        """
+        finalizer = self.finalizers.pop(id(connection), None)
+        if finalizer is not None:
+            finalizer.detach()
+        with self.lock:
+            self.close_locked(connection)
+            self.lock.notify()
+
+    def close_locked(self, connection):
+        self.created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def lost(self, connection):
+        self.finalizers.pop(id(connection), None)
+        with self.lock:
+            self.counters['lost'] += 1
+            self.close_locked(connection)
+            self.lock.notify()
+
+    def close_idle(self):
+        with self.lock:
+            while self.idle:
+                self.close_locked(self.idle.pop()[0])
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_size': self.max_size,
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': len(self.created_at) - len(self.idle),
+                **self.counters,
+                'wait_ms': round(self.wait_seconds * 1000, 1),
+            }
+
+
+def get_pool(alias, factory):
+    """
+    The process's pool for a database alias, made with factory() on first use.
+    """
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # connections inherited from the parent process must not be shared with it
+            _inherited.extend(_pools.values())
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if alias not in _pools:
+            _pools[alias] = factory()
+        return _pools[alias]
+
+
+def pool_stats():
+    """
+    {alias: stats} of this process's pools.
+    """
+    with _pools_lock:
+        pools = dict(_pools) if _pools_pid == os.getpid() else {}
+    return {alias: pool.stats() for alias, pool in pools.items()}
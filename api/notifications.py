@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.cache import caches
+from blog.models import Notification
+from .reads import run_read
+
+# Cache holding the unread counters; every process that creates or reads notifications must share it
+NOTIFICATION_CACHE_ALIAS = getattr(settings, 'NOTIFICATION_CACHE_ALIAS', 'default')
+# Counters are recounted after this many seconds, so one that missed an update is not wrong forever
+UNREAD_COUNT_TIMEOUT = getattr(settings, 'UNREAD_COUNT_TIMEOUT', 60 * 60)
+
+
+def get_counter_cache():
+    return caches[NOTIFICATION_CACHE_ALIAS]
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """
+    Number of unread notifications for the user, counted once and then kept in the cache.
+    """
+    return run_read(unread_count_read(user_id))
+
+
+def unread_count_read(user_id):
+    """
+    unread_count() as a read (see api/reads.py).
+    """
+    cache = get_counter_cache()
+    count = cache.get(unread_key(user_id))
+    if count is None:
+        count = yield Notification.objects.filter(user_id=user_id, is_read=False), 'count'
+        cache.add(unread_key(user_id), count, timeout=UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """
+    Add delta to a cached counter. A counter that is not cached is left to be recounted on the next read.
+    """
+    cache = get_counter_cache()
+    try:
+        if delta > 0:
+            cache.incr(unread_key(user_id), delta)
+        elif delta < 0:
+            cache.decr(unread_key(user_id), -delta)
+    except ValueError:
+        pass
+
+
+def reset_unread_counts(user_ids):
+    """
+    Drop the cached counters after a bulk insert that sent no signals; they are recounted on the next read.
+    """
+    get_counter_cache().delete_many([unread_key(user_id) for user_id in user_ids])
+
+
+def mark_read(user_id, up_to=None):
+    """
+    Mark the user's unread notifications (up to and including id `up_to`) read with a single UPDATE.
+    Returns the number of notifications marked.
+    """
+    notifications = Notification.objects.filter(user_id=user_id, is_read=False)
+    if up_to is not None:
+        notifications = notifications.filter(id__lte=up_to)
+    marked = notifications.update(is_read=True)
+    adjust_unread_count(user_id, -marked)
+    return marked
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+from datetime import timedelta
+from smtplib import SMTPConnectError, SMTPServerDisconnected
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils.timezone import now
+from blog.models import EmailOutbox
+from .background import enqueue
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_FROM_EMAIL = getattr(settings, 'OUTBOX_FROM_EMAIL', 'no-reply@blog.com')
+OUTBOX_BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+# First retry delay in seconds, doubled after every failed attempt
+OUTBOX_RETRY_BACKOFF = getattr(settings, 'OUTBOX_RETRY_BACKOFF', 60)
+# A claimed email whose worker died is retried after this many seconds
+OUTBOX_CLAIM_TIMEOUT = getattr(settings, 'OUTBOX_CLAIM_TIMEOUT', 300)
+# Drain the outbox on the background worker right after an email is queued
+OUTBOX_AUTO_DRAIN = getattr(settings, 'OUTBOX_AUTO_DRAIN', True)
+
+# Failures that leave the mail connection unusable: the rest of the batch is not tried on it
+# (its claims expire after OUTBOX_CLAIM_TIMEOUT) and the error is raised for the caller to back off
+CONNECTION_ERRORS = (SMTPConnectError, SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def queue_share_email(post, recipient, sender):
+    """
+    Queue an email sharing the post. Returns (outbox row, created); an identical share
+    that is still waiting to be sent is returned instead of queueing a duplicate.
+    """
+    recipient = recipient.strip().lower()
+    dedup_key = hashlib.sha256(f"share:{post.pk}:{sender.pk}:{recipient}".encode('utf-8')).hexdigest()
+
+    # only emails waiting to be sent hold their key, and it is unique, so concurrent shares queue one email
+    email, created = EmailOutbox.objects.get_or_create(dedup_key=dedup_key, defaults={
+        'post': post,
+        'sender': sender,
+        'recipient': recipient,
+        'subject': f"Check out this blog post: {post.title}",
+        'body': post.content,
+    })
+    if created and OUTBOX_AUTO_DRAIN:
+        transaction.on_commit(lambda: enqueue(drain_outbox))
+    return email, created
+
+
+def claim_batch(batch_size):
+    """
+    Mark the next due emails as being sent by this worker and return them.
+    Rows locked by another worker are skipped.
+    """
+    current = now()
+    with transaction.atomic():
+        emails = list(EmailOutbox.objects.select_for_update(skip_locked=True)
+                      .filter(status__in=['pending', 'sending'], next_attempt_at__lte=current)
+                      .order_by('next_attempt_at', 'id')[:batch_size])
+        if emails:
+            EmailOutbox.objects.filter(pk__in=[email.pk for email in emails]).update(
+                status='sending', next_attempt_at=current + timedelta(seconds=OUTBOX_CLAIM_TIMEOUT))
+    return emails
+
+
+def deliver(connection, email):
+    """
+    Send one claimed email over the open connection and record the outcome.
+    Returns True when it was sent; raises CONNECTION_ERRORS after recording them.
+    Emails that are done with (sent or failed) release their dedup_key.
+    """
+    message = EmailMessage(email.subject, email.body, OUTBOX_FROM_EMAIL, [email.recipient], connection=connection)
+    try:
+        message.send()
+    except Exception as error:
+        attempts = email.attempts + 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            status, next_attempt_at, dedup_key = 'failed', now(), None
+        else:
+            status, dedup_key = 'pending', email.dedup_key
+            next_attempt_at = now() + timedelta(seconds=OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1))
+        EmailOutbox.objects.filter(pk=email.pk).update(
+            status=status, attempts=attempts, next_attempt_at=next_attempt_at, last_error=str(error), dedup_key=dedup_key)
+        logger.warning("Outbox email %s failed (attempt %s): %s", email.pk, attempts, error)
+        if isinstance(error, CONNECTION_ERRORS):
+            raise
+        return False
+
+    EmailOutbox.objects.filter(pk=email.pk).update(
+        status='sent', attempts=email.attempts + 1, sent_at=now(), last_error='', dedup_key=None)
+    return True
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Send every due email in batches over a single reused mail connection.
+    Returns (sent, failed) counts. When the mail server cannot be reached (the connection
+    fails to open or drops) nothing more is tried and the OSError is raised.
+    """
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+        while True:
+            emails = claim_batch(batch_size)
+            if not emails:
+                break
+            for email in emails:
+                if deliver(connection, email):
+                    sent += 1
+                else:
+                    failed += 1
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,244 @@
+import base64
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .reads import run_read
+
+
+def encode_cursor(value, pk):
+    """
+    Opaque cursor for the row sorting at (value, pk).
+    """
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    data = json.dumps([value, pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(encoded):
+    """
+    The (value, pk) an opaque cursor was made from, with the value as serialized. Raises ValueError when it is malformed.
+    """
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        return value, int(pk)
+    except (TypeError, ValueError, UnicodeError) as error:
+        raise ValueError(f"Malformed cursor {encoded!r}") from error
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor (keyset) pagination on a sort field plus the primary key.
+
+    Each page continues from the (value, id) of the last row of the previous page
+    with a WHERE clause instead of an OFFSET, so page N costs the same as page 1,
+    and no COUNT(*) query is run. NULL sort values always come last.
+    """
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 10)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    # (sort field, tiebreaker) used when the view did not apply its own ordering
+    ordering = ('-published_date', 'id')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return run_read(self.paginate_queryset_read(queryset, request))
+
+    def paginate_queryset_read(self, queryset, request):
+        """
+        paginate_queryset() as a read (see api/reads.py).
+        """
+        return self.set_page((yield self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request):
+        """
+        The ordered query for the requested page, with one extra row to know whether there is a next page.
+        """
+        self.prepare(queryset, request)
+        queryset = self.order_queryset(queryset)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.after_cursor(*cursor))
+
+        return queryset[:self.page_size + 1]
+
+    def prepare(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.key = self.get_key(queryset)
+        self.descending = self.key.startswith('-')
+        self.field_name = self.key.lstrip('-')
+        annotation = queryset.query.annotations.get(self.field_name)
+        if annotation is not None:
+            self.field = annotation.output_field
+        else:
+            self.field = queryset.model._meta.get_field(self.field_name)
+
+    def order_queryset(self, queryset):
+        return queryset.order_by(self.get_sort(), 'id')
+
+    def sorted_keys(self, queryset, request, limit):
+        """
+        ((value, id) of the first `limit` rows in page order, complete) for paginate_keys to page
+        through; complete is False when the queryset has more rows. Every value must be non-NULL.
+        """
+        return run_read(self.sorted_keys_read(queryset, request, limit))
+
+    def sorted_keys_read(self, queryset, request, limit):
+        self.prepare(queryset, request)
+        rows = yield self.order_queryset(queryset).values_list(self.field_name, 'id')[:limit + 1]
+        return rows[:limit], len(rows) <= limit
+
+    def paginate_keys(self, sorted_keys, queryset, request):
+        """
+        Page through the (value, id) pairs from sorted_keys() instead of querying. Returns the
+        page as unsaved instances carrying only the id and sort value, which is all the cursor
+        needs, or None when the page runs past an incomplete list and has to be queried.
+        """
+        keys, complete = sorted_keys
+        self.prepare(queryset, request)
+        start = 0
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            start = self.keys_after(keys, *cursor)
+        rows = keys[start:start + self.page_size + 1]
+        if len(rows) <= self.page_size and not complete:
+            return None
+        return self.set_page([queryset.model(**{'id': pk, self.field_name: value}) for value, pk in rows])
+
+    def keys_after(self, keys, value, pk):
+        """
+        Index of the first key sorting after (value, pk), by binary search.
+        """
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            key_value, key_pk = keys[middle]
+            if value is None:
+                after = False # no key is NULL, so none sorts after a NULL cursor
+            elif key_value == value:
+                after = key_pk > pk
+            else:
+                after = key_value < value if self.descending else key_value > value
+            if after:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_key(self, queryset):
+        """
+        Use the ordering applied by a filter backend if it is on a model field or an
+        annotation (such as the search rank), else the default.
+        """
+        order_by = queryset.query.order_by
+        if order_by and isinstance(order_by[0], str):
+            name = order_by[0].lstrip('-')
+            if name in queryset.query.annotations:
+                return order_by[0]
+            if name != 'id' and name in {field.name for field in queryset.model._meta.concrete_fields}:
+                return order_by[0]
+        return self.ordering[0]
+
+    def get_sort(self):
+        """
+        Sort expression with NULLs last. NULLS LAST is only spelled out when the database
+        would not already sort that way, so the sort can still be served from an index.
+        """
+        sort = F(self.field_name).desc() if self.descending else F(self.field_name).asc()
+        # databases where NULL sorts smallest (MySQL, SQLite) put NULLs last in descending order
+        nulls_already_last = self.descending != connection.features.nulls_order_largest
+        if getattr(self.field, 'null', True) and not nulls_already_last:
+            sort = F(self.field_name).desc(nulls_last=True) if self.descending else F(self.field_name).asc(nulls_last=True)
+        return sort
+
+    def after_cursor(self, value, pk):
+        """
+        Filter for the rows that sort after (value, pk), with NULL values last.
+        """
+        f = self.field_name
+        if value is None:
+            return Q(**{f'{f}__isnull': True, 'id__gt': pk})
+        lookup = 'lt' if self.descending else 'gt'
+        after = Q(**{f'{f}__{lookup}': value}) | Q(**{f: value, 'id__gt': pk})
+        if getattr(self.field, 'null', True):
+            after |= Q(**{f'{f}__isnull': True})
+        return after
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = decode_cursor(encoded)
+            if value is not None:
+                value = self.field.to_python(value)
+            return value, pk
+        except (TypeError, ValueError, ValidationError): # to_python raises ValidationError on unparsable values
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        return encode_cursor(getattr(row, self.field_name), row.pk)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_json(self, fragments):
+        """
+        Assemble the paginated JSON body from already serialized result fragments (bytes).
+        """
+        return b''.join([
+            b'{"next":', json.dumps(self.get_next_link()).encode('utf-8'),
+            b',"results":[', b','.join(fragments), b']}',
+        ])
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PostCursorPagination(KeysetPagination):
+    ordering = ('-published_date', 'id')
+
+
+class CommentCursorPagination(KeysetPagination):
+    ordering = ('-created_date', 'id')
+
+
+class NotificationCursorPagination(KeysetPagination):
+    ordering = ('-created_at', 'id')
@@ -0,0 +1,94 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet
+from django.http import Http404
+
+
+def run_read(read):
+    """
+    Drive a read to its result in a sync view.
+
+    A read is a generator written once for both the DRF views and the async read views in
+    api/async_views.py. It yields each piece of database work it needs and is sent its result:
+    - a QuerySet, sent back as a list of its rows;
+    - (queryset, method), such as (posts, 'first'), sent back as what the method returns; async
+      views call its async twin (afirst);
+    - a callable, run as is here and in a worker thread by async views, for work that queries
+      out of sight (filter backends validating values against the database, search).
+    Reads compose with `yield from`, and their return value is the result. Their names end in
+    _read: paginate_queryset_read() is paginate_queryset() as a read.
+    """
+    try:
+        step = next(read)
+        while True:
+            step = read.send(evaluate(step))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def arun_read(read):
+    """
+    Drive a read to its result on the event loop, through the async ORM.
+    """
+    try:
+        step = next(read)
+        while True:
+            step = read.send(await aevaluate(step))
+    except StopIteration as stop:
+        return stop.value
+
+
+def evaluate(step):
+    if isinstance(step, QuerySet):
+        return list(step)
+    if callable(step):
+        return step()
+    queryset, method = step
+    return getattr(queryset, method)()
+
+
+async def aevaluate(step):
+    if isinstance(step, QuerySet):
+        return [row async for row in step]
+    if callable(step):
+        return await sync_to_async(step)()
+    queryset, method = step
+    return await getattr(queryset, f'a{method}')()
+
+
+def call_read(build):
+    """
+    A read returning build(), for handing a plain function to code that takes a read.
+    Only sync views may run it, as build() queries directly.
+    """
+    return build()
+    yield # makes this a generator
+
+
+def filter_queryset_read(view, queryset):
+    """
+    view.filter_queryset(queryset) as a read. Filtering only builds a lazy queryset unless one of
+    the view's `querying_filter_params` is given (its filter checks the value against the database,
+    or runs a search); only then is it yielded, so async views filter in a worker thread.
+    """
+    if set(getattr(view, 'querying_filter_params', ())) & set(view.request.query_params):
+        return (yield lambda: view.filter_queryset(queryset))
+    return view.filter_queryset(queryset)
+
+
+def get_object_read(view):
+    """
+    view.get_object() as a read: the object the URL names in the filtered queryset, after
+    the object permission checks, else Http404.
+    """
+    queryset = yield from filter_queryset_read(view, view.get_queryset())
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        queryset = queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+    except (TypeError, ValueError, ValidationError): # a lookup value of the wrong type, as get_object_or_404 treats it
+        raise Http404
+    obj = yield queryset, 'first'
+    if obj is None:
+        raise Http404
+    view.check_object_permissions(view.request, obj)
+    return obj
@@ -0,0 +1,235 @@
+import heapq
+import math
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from blog.models import BlogPost, RelatedPost, Tag
+from .background import enqueue
+
+# Related posts stored for each post
+RELATED_POSTS_COUNT = getattr(settings, 'RELATED_POSTS_COUNT', 10)
+# Added to the tag similarity (a cosine, 0 to 1) of posts in the same category and by the same author
+RELATED_CATEGORY_BOOST = getattr(settings, 'RELATED_CATEGORY_BOOST', 0.2)
+RELATED_AUTHOR_BOOST = getattr(settings, 'RELATED_AUTHOR_BOOST', 0.1)
+# Tags on more published posts than this say little about similarity and would make every post a candidate
+RELATED_MAX_TAG_POSTS = getattr(settings, 'RELATED_MAX_TAG_POSTS', 5000)
+# Update the related posts around a changed post on the background worker instead of inside the request
+RELATED_POSTS_ASYNC = getattr(settings, 'RELATED_POSTS_ASYNC', True)
+
+Through = BlogPost.tags.through
+
+
+class TagVectors:
+    """
+    Published posts as sparse vectors over their tags, each tag weighted by its inverse
+    document frequency, kept in both orientations: the tags of each post (rows) and the
+    posts of each tag (columns). Scoring one post against every other is its row times the
+    transposed matrix, which only touches the posts sharing one of its tags.
+
+    The similarity of two posts is the cosine of their vectors plus RELATED_CATEGORY_BOOST
+    and RELATED_AUTHOR_BOOST when they share a category or an author; tags on more than
+    RELATED_MAX_TAG_POSTS posts are left out.
+    """
+    def __init__(self, total, tag_counts):
+        self.weights = {tag: math.log((1 + total) / (1 + count)) + 1
+                        for tag, count in tag_counts.items() if count <= RELATED_MAX_TAG_POSTS}
+        self.post_tags = {} # post id -> [tag id]
+        self.tag_posts = {} # tag id -> [post id], only for the tags being scored
+        self.owners = {} # post id -> (author id, category id), for published posts
+        self.norms = {}
+
+    def add_rows(self, links):
+        for post_id, tag_id in links:
+            if tag_id in self.weights:
+                self.post_tags.setdefault(post_id, []).append(tag_id)
+
+    def add_columns(self, links):
+        for post_id, tag_id in links:
+            if tag_id in self.weights:
+                self.tag_posts.setdefault(tag_id, []).append(post_id)
+
+    def norm(self, post_id):
+        norm = self.norms.get(post_id)
+        if norm is None:
+            norm = self.norms[post_id] = math.sqrt(sum(self.weights[tag] ** 2 for tag in self.post_tags.get(post_id, ())))
+        return norm
+
+    def scores(self, post_id):
+        """
+        {post id: similarity} of every published post sharing a tag with the post.
+        """
+        dots = {}
+        for tag in self.post_tags.get(post_id, ()):
+            weight = self.weights[tag] ** 2
+            for other in self.tag_posts.get(tag, ()):
+                if other != post_id:
+                    dots[other] = dots.get(other, 0.0) + weight
+
+        author, category = self.owners[post_id]
+        norm = self.norm(post_id)
+        scores = {}
+        for other, dot in dots.items():
+            other_author, other_category = self.owners[other]
+            score = dot / (norm * self.norm(other))
+            if category is not None and other_category == category:
+                score += RELATED_CATEGORY_BOOST
+            if other_author == author:
+                score += RELATED_AUTHOR_BOOST
+            scores[other] = score
+        return scores
+
+
+def top(scores):
+    """
+    The RELATED_POSTS_COUNT best (post id, score) pairs, best first; ties go to the older post.
+    """
+    return heapq.nlargest(RELATED_POSTS_COUNT, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def published_links():
+    return Through.objects.filter(blogpost__status='published', blogpost__published_date__isnull=False)
+
+
+def load_all():
+    """
+    The vectors of every published post, for a full rebuild.
+    """
+    links = list(published_links().values_list('blogpost_id', 'tag_id').iterator(chunk_size=10000))
+    owners = {pk: (author_id, category_id) for pk, author_id, category_id in
+              BlogPost.objects.filter(BlogPost.PUBLISHED).values_list('pk', 'author_id', 'category_id').iterator(chunk_size=10000)}
+    vectors = TagVectors(len(owners), Counter(tag_id for _, tag_id in links))
+    vectors.owners = owners
+    vectors.add_rows(links)
+    vectors.add_columns(links)
+    return vectors
+
+
+def load_around(post_ids):
+    """
+    Just enough of the vectors to score the given posts: their rows, the columns of their
+    tags, and the rows of every post in those columns (for their norms). Document
+    frequencies come from the maintained Tag.post_count.
+    """
+    own_tags = set(Through.objects.filter(blogpost_id__in=post_ids).values_list('tag_id', flat=True))
+    tag_counts = dict(Tag.objects.filter(pk__in=own_tags, post_count__lte=RELATED_MAX_TAG_POSTS).values_list('pk', 'post_count'))
+    columns = list(published_links().filter(tag_id__in=tag_counts).values_list('blogpost_id', 'tag_id'))
+
+    candidates = {post_id for post_id, _ in columns} | set(post_ids)
+    rows = list(Through.objects.filter(blogpost_id__in=candidates).values_list('blogpost_id', 'tag_id'))
+    other_tags = {tag_id for _, tag_id in rows} - own_tags
+    tag_counts.update(Tag.objects.filter(pk__in=other_tags).values_list('pk', 'post_count'))
+
+    vectors = TagVectors(BlogPost.objects.filter(BlogPost.PUBLISHED).count(), tag_counts)
+    vectors.owners = {pk: (author_id, category_id) for pk, author_id, category_id in
+                      BlogPost.objects.filter(BlogPost.PUBLISHED, pk__in=candidates).values_list('pk', 'author_id', 'category_id')}
+    vectors.add_rows(rows)
+    vectors.add_columns(columns)
+    return vectors
+
+
+def store(related):
+    """
+    Replace the stored related posts of each post in {post id: [(related id, score)]}.
+    """
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=list(related)).delete()
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+            for post_id, rows in related.items() for rank, (related_id, score) in enumerate(rows)
+        ], batch_size=1000)
+
+
+def rebuild(batch_size=500):
+    """
+    Recompute the related posts of every published post. Returns the number of posts.
+    Each batch of posts is replaced in its own transaction, so readers always see full lists.
+    """
+    vectors = load_all()
+    RelatedPost.objects.exclude(post__status='published', post__published_date__isnull=False).delete()
+    batch = {}
+    for post_id in vectors.owners:
+        batch[post_id] = top(vectors.scores(post_id))
+        if len(batch) >= batch_size:
+            store(batch)
+            batch = {}
+    if batch:
+        store(batch)
+    return len(vectors.owners)
+
+
+def refresh(post_ids):
+    """
+    Recompute the related posts of the given posts in full; unpublished posts get none.
+    """
+    post_ids = set(post_ids)
+    if post_ids:
+        vectors = load_around(post_ids)
+        store({post_id: top(vectors.scores(post_id)) if post_id in vectors.owners else [] for post_id in post_ids})
+
+
+def update_around(post_id):
+    """
+    Bring the related posts up to date after the post's tags, category or publication changed.
+
+    The post's own list is recomputed. Similarity is symmetric, so for every post that lists
+    it or shares a tag with it only their similarity changed, and it is folded into their
+    stored list; a list is recomputed in full only when the post falls below the last entry
+    of a full list, since the candidate that would take its place is not stored.
+
+    The weights of the post's tags shift with their post counts; run rebuild_related_posts
+    periodically to fold that drift in.
+    """
+    vectors = load_around({post_id})
+    scores = vectors.scores(post_id) if post_id in vectors.owners else {}
+    neighbours = set(scores) | set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+    stored = {}
+    for neighbour, related_id, score in (RelatedPost.objects.filter(post_id__in=neighbours)
+                                         .order_by('post_id', 'rank').values_list('post_id', 'related_id', 'score')):
+        stored.setdefault(neighbour, {})[related_id] = score
+
+    updated, stale = {post_id: top(scores)}, set()
+    for neighbour in neighbours:
+        rows = stored.get(neighbour, {})
+        score = scores.get(neighbour)
+        if post_id in rows and len(rows) >= RELATED_POSTS_COUNT and (score is None or score < min(rows.values())):
+            stale.add(neighbour)
+            continue
+        before = top(rows)
+        rows.pop(post_id, None)
+        if score is not None:
+            rows[post_id] = score
+        after = top(rows)
+        # most neighbours of a post on a popular tag would not list it either way
+        if after != before:
+            updated[neighbour] = after
+    store(updated)
+    refresh(stale)
+
+
+def related_post_ids(post_id):
+    """
+    The stored related posts of a post, most similar first.
+    """
+    return list(RelatedPost.objects.filter(post_id=post_id).order_by('rank').values_list('related_id', flat=True))
+
+
+def after_commit(func, *args):
+    """
+    Run func(*args) once the current transaction commits, on the background worker when RELATED_POSTS_ASYNC is set.
+    """
+    def run():
+        if RELATED_POSTS_ASYNC:
+            enqueue(func, *args)
+        else:
+            func(*args)
+    transaction.on_commit(run)
+
+
+def update_around_later(post_ids):
+    for post_id in set(post_ids):
+        after_commit(update_around, post_id)
+
+
+def refresh_later(post_ids):
+    if post_ids:
+        after_commit(refresh, set(post_ids))
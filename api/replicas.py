@@ -0,0 +1,187 @@
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Read replicas as {database alias: weight}; each alias must also be in DATABASES
+DATABASE_REPLICAS = getattr(settings, 'DATABASE_REPLICAS', {})
+PRIMARY_DATABASE = getattr(settings, 'PRIMARY_DATABASE', 'default')
+# Seconds a client keeps reading from the primary after a request of theirs wrote
+REPLICA_STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+# Replicas further behind the primary than this (in seconds) are skipped
+REPLICA_MAX_LAG = getattr(settings, 'REPLICA_MAX_LAG', 5)
+# Seconds a replica's measured lag is trusted before it is measured again
+REPLICA_LAG_CHECK_INTERVAL = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+REPLICA_PIN_COOKIE = 'read_primary'
+# Cache holding the pins of bearer-token clients; it must be shared by every process serving requests,
+# since a client's next read can land on any of them
+REPLICA_PIN_CACHE_ALIAS = getattr(settings, 'REPLICA_PIN_CACHE_ALIAS', 'default')
+
+_routing = ContextVar('database_routing', default=None)
+_lag_checks = {} # alias -> (healthy, checked at)
+_lag_lock = threading.Lock()
+
+
+class RoutingState:
+    """
+    Where the current request reads from, and whether it has written.
+    """
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of a request to the replica ReplicaRoutingMiddleware picked for it and
+    everything else (writes, reads after a write, work outside requests) to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is not None and state.replica is not None:
+            return state.replica
+        return PRIMARY_DATABASE if DATABASE_REPLICAS else None
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            # read your own writes for the rest of the request too
+            state.wrote = True
+            state.replica = None
+        return PRIMARY_DATABASE if DATABASE_REPLICAS else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {PRIMARY_DATABASE, *DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def replica_lag(alias):
+    """
+    Seconds the replica is behind its source, 0 for a database that is not replicating,
+    or None when replication is broken or the replica cannot be reached.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        return 0
+    try:
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+                column = 'Seconds_Behind_Source'
+            except DatabaseError: # MySQL before 8.0.22
+                cursor.execute('SHOW SLAVE STATUS')
+                column = 'Seconds_Behind_Master'
+            row = cursor.fetchone()
+            if row is None:
+                return 0
+            return dict(zip([col[0] for col in cursor.description], row))[column]
+    except DatabaseError:
+        return None
+
+
+def lag_checks_due():
+    now = time.monotonic()
+    return any(alias not in _lag_checks or _lag_checks[alias][1] + REPLICA_LAG_CHECK_INTERVAL <= now
+               for alias in DATABASE_REPLICAS)
+
+
+def replica_healthy(alias):
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag_checks.get(alias)
+    if checked is not None and checked[1] + REPLICA_LAG_CHECK_INTERVAL > now:
+        return checked[0]
+    lag = replica_lag(alias)
+    healthy = lag is not None and lag <= REPLICA_MAX_LAG
+    with _lag_lock:
+        _lag_checks[alias] = (healthy, now)
+    return healthy
+
+
+def choose_replica():
+    """
+    A replica picked by weight among those within REPLICA_MAX_LAG, or None to use the primary.
+    """
+    healthy = [(alias, weight) for alias, weight in DATABASE_REPLICAS.items() if weight > 0 and replica_healthy(alias)]
+    if not healthy:
+        return None
+    aliases, weights = zip(*healthy)
+    return random.choices(aliases, weights=weights)[0]
+
+
+def get_pin_cache():
+    return caches[REPLICA_PIN_CACHE_ALIAS]
+
+
+def pin_key(authorization):
+    return 'replica-pin:' + hashlib.sha256(authorization.encode('utf-8')).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves safe-method requests from a read replica. A request that writes pins its client
+    to the primary for REPLICA_STICKY_SECONDS, so they read their own writes: by a signed
+    cookie, and for bearer-token clients (which may not keep cookies) by their token.
+
+    Does nothing unless DATABASE_REPLICAS is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(choose_replica() if self.can_use_replica(request) else None)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        replica = None
+        if self.can_use_replica(request):
+            # measuring lag queries the replicas, which cannot happen on the event loop
+            replica = await sync_to_async(choose_replica)() if lag_checks_due() else choose_replica()
+        state = RoutingState(replica)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(request, response, state)
+
+    def can_use_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        if request.get_signed_cookie(REPLICA_PIN_COOKIE, default=None, max_age=REPLICA_STICKY_SECONDS):
+            return False
+        authorization = request.headers.get('Authorization')
+        return not (authorization and get_pin_cache().get(pin_key(authorization)))
+
+    def finish(self, request, response, state):
+        if state.wrote:
+            response.set_signed_cookie(REPLICA_PIN_COOKIE, '1', max_age=REPLICA_STICKY_SECONDS,
+                                       secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax')
+            authorization = request.headers.get('Authorization')
+            if authorization:
+                get_pin_cache().set(pin_key(authorization), True, REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,185 @@
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from blog.models import BlogPost
+
+# Maximum number of ranked post ids a search returns
+SEARCH_MAX_RESULTS = getattr(settings, 'SEARCH_MAX_RESULTS', 200)
+# How much more a match in the title counts than a match in the body
+SEARCH_TITLE_BOOST = getattr(settings, 'SEARCH_TITLE_BOOST', 5.0)
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """
+    Split a search query into lowercase word terms.
+    """
+    return [term.lower() for term in WORD_RE.findall(query)]
+
+
+def post_document(post):
+    """
+    Return the (title, body) indexed for a post. The body also carries the tag names and the author's username.
+    """
+    tags = ' '.join(tag.name for tag in post.tags.all())
+    return post.title, f"{post.content}\n{tags}\n{post.author.username}"
+
+
+class BaseSearchBackend:
+    """
+    A full-text index of blog posts. Subclasses keep their own index table in sync
+    through index_post/remove_post and answer search() with post ids, best match first.
+    """
+    def setup(self):
+        """
+        Create the index table if it does not exist yet.
+        """
+
+    def index_post(self, post):
+        raise NotImplementedError
+
+    def remove_post(self, post_id):
+        raise NotImplementedError
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=500):
+        """
+        Re-index every post. Returns the number of posts indexed.
+        """
+        self.setup()
+        count = 0
+        posts = BlogPost.objects.select_related('author').prefetch_related('tags').order_by('pk')
+        for post in posts.iterator(chunk_size=batch_size):
+            self.index_post(post)
+            count += 1
+        return count
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index ranked with bm25, with the title column weighted by SEARCH_TITLE_BOOST.
+    Used for tests and local runs.
+    """
+    table = 'blog_post_search'
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+
+    def index_post(self, post):
+        title, body = post_document(post)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [post.pk])
+            cursor.execute(f"INSERT INTO {self.table} (rowid, title, body) VALUES (%s, %s, %s)", [post.pk, title, body])
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [post_id])
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        # every term must match, each as a prefix
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, %s, 1.0) LIMIT %s",
+                [match, SEARCH_TITLE_BOOST, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """
+    InnoDB FULLTEXT index queried in boolean mode, with the title relevance weighted by SEARCH_TITLE_BOOST.
+    """
+    table = 'blog_post_search'
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "post_id BIGINT NOT NULL PRIMARY KEY, "
+                "title VARCHAR(200) NOT NULL, "
+                "body LONGTEXT NOT NULL, "
+                "FULLTEXT KEY blog_post_search_title (title), "
+                "FULLTEXT KEY blog_post_search_title_body (title, body)"
+                ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+            )
+
+    def index_post(self, post):
+        title, body = post_document(post)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"REPLACE INTO {self.table} (post_id, title, body) VALUES (%s, %s, %s)",
+                [post.pk, title, body],
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE post_id = %s", [post_id])
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        # every term must match, each as a prefix
+        match = ' '.join(f'+{term}*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT post_id FROM {self.table} "
+                "WHERE MATCH(title, body) AGAINST (%s IN BOOLEAN MODE) "
+                "ORDER BY MATCH(title) AGAINST (%s IN BOOLEAN MODE) * %s "
+                "+ MATCH(title, body) AGAINST (%s IN BOOLEAN MODE) DESC "
+                "LIMIT %s",
+                [match, match, SEARCH_TITLE_BOOST, match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Fallback for databases without a full-text backend: icontains on the post fields, newest first.
+    """
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        posts = BlogPost.objects.all()
+        for term in search_terms(query):
+            posts = posts.filter(
+                Q(title__icontains=term) | Q(content__icontains=term)
+                | Q(tags__name__icontains=term) | Q(author__username__icontains=term)
+            )
+        return list(posts.order_by('-published_date', 'id').values_list('id', flat=True).distinct()[:limit])
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'mysql': MySQLFullTextBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """
+    Return the backend named by the SEARCH_BACKEND setting, or the one matching the database vendor.
+    """
+    backend_path = getattr(settings, 'SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(connection.vendor, DatabaseSearchBackend)()
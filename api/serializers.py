@@ -1,5 +1,9 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth import get_user_model
+from .hashing import hash_password
+from .avatars import avatar_urls
+from .instrumentation import timed
 from blog.models import (
     BlogPost,
     Category,
@@ -15,36 +19,89 @@ from blog.models import (
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """
+    Counts the time spent serializing into the request's 'serialize' timing (see api/instrumentation.py).
+    """
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)  # Ensure password is write-only
+    avatar = serializers.SerializerMethodField() # profile picture and thumbnail URLs (uploaded with POST users/<pk>/profile-picture/)
     
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'password', 'bio']
+        fields = ['id', 'username', 'slug', 'email', 'password', 'bio', 'avatar']
+        read_only_fields = ['slug'] # derived from the username, used in author URLs
+
+    def get_avatar(self, user):
+        return avatar_urls(user)
 
     def create(self, validated_data):
         password = validated_data.pop('password')  # Pop the password before saving
         user = User(**validated_data)  # Create a new User instance
-        user.set_password(password)  # Hash the password
+        user.password = hash_password(password)  # Hash the password in the bounded hash pool
         user.save()  # Save the user to the database
         return user
 
 
-class CategorySerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """
+    Field names asked for with '?fields=a,b' on a read request, or None when every field is wanted.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Lets clients drop fields with '?fields=' (sparse fieldsets). The view uses
+    selected_fields() to avoid querying the columns of dropped fields at all.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'))
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, request):
+        requested = requested_fields(request)
+        if requested is None:
+            return list(cls.Meta.fields)
+        return [name for name in cls.Meta.fields if name in requested]
+
+
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'slug', 'post_count']
+        read_only_fields = ['slug'] # derived from the name, used in category URLs
+
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = ['id', 'name', 'post_count']
 
-class TagSerializer(serializers.ModelSerializer):
+# tags nested in posts leave out the count, so cached posts do not go stale whenever it changes
+class PostTagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name']
         
-class BlogPostSerializer(serializers.ModelSerializer):
+class BlogPostSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True) #nested serializer for author details
     #category = serializers.StringRelatedField(many=True, read_only=True)
     #category = CategorySerializer(read_only=True)#nested serializer for category
-    tags = TagSerializer(many=True, read_only=True)
+    tags = PostTagSerializer(many=True, read_only=True)
     comments = serializers.StringRelatedField(many=True, read_only=True)# Related comments
     content_as_html = serializers.ReadOnlyField()# HTML-rendered content
     category = serializers.SlugRelatedField(slug_field='name', queryset=Category.objects.all())
@@ -53,7 +110,8 @@ class BlogPostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BlogPost
-        fields = ['id', 'title', 'content', 'author', 'category', 'published_date', 'created_date', 'tags', 'comments', 'content_as_html']
+        fields = ['id', 'title', 'content', 'author', 'category', 'published_date', 'created_date', 'tags', 'comments', 'content_as_html',
+                  'excerpt', 'word_count', 'reading_time', 'like_count', 'comment_count', 'rating_count', 'average_rating']
     
     # validates the title field to ensure it's not empty
     def validate_title(self, value):
@@ -74,22 +132,37 @@ class BlogPostSerializer(serializers.ModelSerializer):
         return value
     
 
-class CommentSerializer(serializers.ModelSerializer):
+class BlogPostListSerializer(TimedSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Compact representation used by list endpoints: the stored excerpt and counts instead
+    of the full body, rendered HTML and embedded comments (those are on the detail view).
+    """
+    author = UserSerializer(read_only=True)
+    tags = PostTagSerializer(many=True, read_only=True)
+    category = serializers.SlugRelatedField(slug_field='name', read_only=True)
+
+    class Meta:
+        model = BlogPost
+        fields = ['id', 'title', 'excerpt', 'author', 'category', 'published_date', 'created_date', 'tags',
+                  'word_count', 'reading_time', 'like_count', 'comment_count', 'rating_count', 'average_rating']
+
+
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'post', 'author', 'content', 'created_date']
 
-class PostLikeSerializer(serializers.ModelSerializer):
+class PostLikeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = PostLike
         fields = ['user', 'post', 'created_at']
 
-class PostRatingSerializer(serializers.ModelSerializer):
+class PostRatingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = PostRating
         fields = ['user', 'post', 'rating', 'created_at']
 
-class AuthorSubscriptionSerializer(serializers.ModelSerializer):
+class AuthorSubscriptionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)# Nested serializer for author details
 
     class Meta:
@@ -97,8 +170,8 @@ class AuthorSubscriptionSerializer(serializers.ModelSerializer):
         fields = ['user', 'author', 'subscribed_at']
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
-        fields = ['id', 'user', 'message', 'create_at', 'is_read']
+        fields = ['id', 'user', 'message', 'created_at', 'is_read']
 
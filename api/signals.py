@@ -1,10 +1,342 @@
-from django.db.models.signals import post_save
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from blog.models import BlogPost, AuthorSubscription, Notification
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.settings import api_settings
+from blog.models import BlogPost, Category, Tag, Comment, AuthorSubscription, Notification, PostLike, PostRating, RelatedPost
+from .background import enqueue
+from .feed import push_post_to_timelines, remove_post_from_timelines, backfill_timeline, clear_author_from_timeline
+from .search import get_search_backend
+from .caching import bump_version, bump_versions
+from .notifications import adjust_unread_count, reset_unread_counts
+from .related import update_around_later, refresh_later
+from .authentication import user_cache
+
+User = get_user_model()
+
+# Number of notifications inserted per bulk_create
+NOTIFICATION_CHUNK_SIZE = getattr(settings, 'NOTIFICATION_CHUNK_SIZE', 1000)
+# Run the fan-out on the background worker after commit instead of inside the request
+NOTIFICATION_FANOUT_ASYNC = getattr(settings, 'NOTIFICATION_FANOUT_ASYNC', True)
+# Number of post versions bumped per cache write when a user's posts change
+POST_VERSION_CHUNK_SIZE = 1000
+# The user columns posts show: their author (UserSerializer, avatar included) and the usernames of their commenters
+POST_USER_FIELDS = ('username', 'slug', 'email', 'bio', 'profile_picture', 'profile_picture_hash', 'profile_picture_thumbnails')
+
+
+def fan_out_post_notification(author_id, message):
+    """
+    Create one notification per subscriber of the author, streaming subscriber ids
+    and inserting them in fixed-size chunks.
+    """
+    subscriber_ids = (AuthorSubscription.objects.filter(author_id=author_id)
+                      .values_list('user_id', flat=True)
+                      .iterator(chunk_size=NOTIFICATION_CHUNK_SIZE))
+    batch = []
+    for user_id in subscriber_ids:
+        batch.append(Notification(user_id=user_id, message=message))
+        if len(batch) >= NOTIFICATION_CHUNK_SIZE:
+            Notification.objects.bulk_create(batch)
+            reset_unread_counts([notification.user_id for notification in batch])
+            batch = []
+    if batch:
+        Notification.objects.bulk_create(batch)
+        reset_unread_counts([notification.user_id for notification in batch])
+
 
 @receiver(post_save, sender=BlogPost)
 def send_post_notification(sender, instance, created, **kwargs):
     if created:
-        author_subscriptions = AuthorSubscription.objects.filter(author=instance.author)
-        for subscription in author_subscriptions:
-            Notification.objects.create(user=subscription.user, message=f"New post published by {instance.author.username}: {instance.title}.")
\ No newline at end of file
+        # build the message once for every subscriber
+        message = f"New post published by {instance.author.username}: {instance.title}."
+        if NOTIFICATION_FANOUT_ASYNC:
+            transaction.on_commit(lambda: enqueue(fan_out_post_notification, instance.author_id, message))
+        else:
+            fan_out_post_notification(instance.author_id, message)
+
+
+@receiver(post_save, sender=BlogPost)
+def update_timelines(sender, instance, created, **kwargs):
+    # push a post into subscriber timelines when it is published (or its date moves); pull it back out if unpublished.
+    # edits of a published post leave the timelines alone instead of rescanning every subscriber
+    previous = getattr(instance, '_previous', None)
+    was_listed = previous is not None and previous['status'] == 'published'
+    if instance.status == 'published':
+        if not was_listed or previous['published_date'] != instance.published_date:
+            if NOTIFICATION_FANOUT_ASYNC:
+                transaction.on_commit(lambda: enqueue(push_post_to_timelines, instance.pk))
+            else:
+                push_post_to_timelines(instance.pk)
+    elif was_listed:
+        remove_post_from_timelines(instance.pk)
+
+
+@receiver(post_save, sender=AuthorSubscription)
+def backfill_subscriber_timeline(sender, instance, created, **kwargs):
+    if created:
+        User.update_subscriber_count(instance.author_id, 1)
+        backfill_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=AuthorSubscription)
+def clear_subscriber_timeline(sender, instance, **kwargs):
+    User.update_subscriber_count(instance.author_id, -1)
+    clear_author_from_timeline(instance.user_id, instance.author_id)
+
+
+# keep the search index in step with posts and their tags
+@receiver(post_save, sender=BlogPost)
+def index_post(sender, instance, **kwargs):
+    get_search_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_post(sender, instance, **kwargs):
+    get_search_backend().remove_post(instance.pk)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def reindex_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    backend = get_search_backend()
+    if not reverse:
+        backend.index_post(instance)
+    elif pk_set:
+        # tag.blogpost_set changed: reindex the posts that gained or lost the tag
+        for post in BlogPost.objects.filter(pk__in=pk_set).select_related('author').prefetch_related('tags'):
+            backend.index_post(post)
+
+
+# likes and ratings removed outside like_post/rate_post (e.g. when a user is deleted) still adjust the stored totals
+@receiver(post_delete, sender=PostLike)
+def discount_like(sender, instance, **kwargs):
+    BlogPost.update_like_count(instance.post_id, -1)
+
+
+@receiver(post_delete, sender=PostRating)
+def discount_rating(sender, instance, **kwargs):
+    BlogPost.update_rating_totals(instance.post_id, -instance.rating, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        BlogPost.update_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def discount_comment(sender, instance, **kwargs):
+    BlogPost.update_comment_count(instance.post_id, -1)
+
+
+# invalidate the ETags and cached responses of everything a change shows up in
+@receiver([post_save, post_delete], sender=BlogPost)
+def invalidate_post(sender, instance, **kwargs):
+    bump_version('post', instance.pk)
+
+
+# the row a post is saved over: the author and category it leaves still list and count it until updated below
+@receiver(pre_save, sender=BlogPost)
+def remember_previous_post(sender, instance, **kwargs):
+    instance._previous = None
+    if not instance._state.adding:
+        instance._previous = (BlogPost.objects.filter(pk=instance.pk)
+                              .values('author_id', 'category_id', 'status', 'published_date').first())
+
+
+def was_published(previous):
+    return previous is not None and previous['status'] == 'published' and previous['published_date'] is not None
+
+
+# publishing, editing, moving and deleting a post changes the published post lists it is (or was) part of
+@receiver([post_save, post_delete], sender=BlogPost)
+def invalidate_post_lists(sender, instance, **kwargs):
+    authors, categories = {instance.author_id}, {instance.category_id}
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        authors.add(previous['author_id'])
+        categories.add(previous['category_id'])
+    bump_versions('author-posts', authors)
+    bump_versions('category-posts', categories - {None})
+
+
+def adjust_post_counts(model, kind, deltas):
+    """
+    Apply {pk: delta} to the published post counts of categories or tags and invalidate their responses.
+    """
+    by_delta = {}
+    for pk, delta in deltas.items():
+        if pk is not None and delta:
+            by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in by_delta.items():
+        model.update_post_counts(pks, delta)
+    changed = [pk for pks in by_delta.values() for pk in pks]
+    if changed:
+        bump_versions(kind, changed + ['list'])
+
+
+def post_tag_ids(post_id):
+    return list(BlogPost.tags.through.objects.filter(blogpost_id=post_id).values_list('tag_id', flat=True))
+
+
+# keep the published post counts of categories and tags in step (see reconcile_category_tag_counts)
+@receiver(post_save, sender=BlogPost)
+def count_saved_post(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    counted, published = was_published(previous), instance.is_published
+    categories = {}
+    if counted:
+        categories[previous['category_id']] = -1
+    if published:
+        categories[instance.category_id] = categories.get(instance.category_id, 0) + 1
+    adjust_post_counts(Category, 'category', categories)
+    # a new post has no tags yet; they are counted as they are added
+    if counted != published and not created:
+        adjust_post_counts(Tag, 'tag', dict.fromkeys(post_tag_ids(instance.pk), 1 if published else -1))
+
+
+# pre_delete, while the post's tags can still be read
+@receiver(pre_delete, sender=BlogPost)
+def count_deleted_post(sender, instance, **kwargs):
+    if instance.is_published:
+        adjust_post_counts(Category, 'category', {instance.category_id: -1})
+        adjust_post_counts(Tag, 'tag', dict.fromkeys(post_tag_ids(instance.pk), -1))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def count_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    # the remove signals name every pk asked for, so what is really unlinked is read before it goes
+    if not reverse:
+        # post.tags changed: each added or removed tag gains or loses this post
+        if not instance.is_published:
+            return
+        if action == 'post_add':
+            adjust_post_counts(Tag, 'tag', dict.fromkeys(pk_set, 1))
+        elif action in ('pre_remove', 'pre_clear'):
+            links = sender.objects.filter(blogpost_id=instance.pk)
+            if pk_set is not None:
+                links = links.filter(tag_id__in=pk_set)
+            instance._untagged = list(links.values_list('tag_id', flat=True))
+        elif action in ('post_remove', 'post_clear'):
+            adjust_post_counts(Tag, 'tag', dict.fromkeys(instance.__dict__.pop('_untagged', []), -1))
+    else:
+        # tag.blogpost_set changed: the tag gains or loses the published posts among them
+        published = BlogPost.objects.filter(BlogPost.PUBLISHED)
+        if action == 'post_add':
+            adjust_post_counts(Tag, 'tag', {instance.pk: published.filter(pk__in=pk_set).count()})
+        elif action in ('pre_remove', 'pre_clear'):
+            untagged = published.filter(tags=instance)
+            if pk_set is not None:
+                untagged = untagged.filter(pk__in=pk_set)
+            instance._untagged = untagged.count()
+        elif action in ('post_remove', 'post_clear'):
+            adjust_post_counts(Tag, 'tag', {instance.pk: -instance.__dict__.pop('_untagged', 0)})
+
+
+# keep the precomputed related posts around a post current (see api/related.py)
+@receiver(post_save, sender=BlogPost)
+def relate_saved_post(sender, instance, created, **kwargs):
+    # a new post has no tags yet; it is related as they are added
+    previous = getattr(instance, '_previous', None)
+    if previous is None:
+        return
+    if (was_published(previous) != instance.is_published or previous['category_id'] != instance.category_id
+            or previous['author_id'] != instance.author_id):
+        update_around_later([instance.pk])
+
+
+# the posts listing a deleted post lose it to the cascade and are recomputed without it
+@receiver(pre_delete, sender=BlogPost)
+def relate_deleted_post(sender, instance, **kwargs):
+    refresh_later(list(RelatedPost.objects.filter(related_id=instance.pk).values_list('post_id', flat=True)))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def relate_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear') and instance.is_published:
+            update_around_later([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        update_around_later(pk_set)
+    elif action == 'pre_clear':
+        update_around_later(list(instance.blogpost_set.values_list('pk', flat=True)))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=PostLike)
+@receiver([post_save, post_delete], sender=PostRating)
+def invalidate_commented_post(sender, instance, **kwargs):
+    bump_version('post', instance.post_id)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def invalidate_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_versions('post', (pk_set or []) if reverse else [instance.pk])
+
+
+# pre_delete, so the posts that referred to a deleted category or tag can still be found
+@receiver([post_save, pre_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    bump_versions('category', [instance.pk, 'list'])
+    # posts show the category name
+    bump_versions('post', BlogPost.objects.filter(category_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver([post_save, pre_delete], sender=Tag)
+def invalidate_tag(sender, instance, **kwargs):
+    bump_versions('tag', [instance.pk, 'list'])
+    # posts show the tag name
+    bump_versions('post', BlogPost.tags.through.objects.filter(tag_id=instance.pk).values_list('blogpost_id', flat=True))
+
+
+def bump_user_posts(user_id):
+    """
+    Give new versions to the posts a user wrote or commented on, reading their ids in chunks.
+    """
+    for post_ids in (BlogPost.objects.filter(author_id=user_id).values_list('pk', flat=True),
+                     Comment.objects.filter(author_id=user_id).values_list('post_id', flat=True).distinct()):
+        post_ids = post_ids.order_by().iterator(chunk_size=POST_VERSION_CHUNK_SIZE)
+        while chunk := list(islice(post_ids, POST_VERSION_CHUNK_SIZE)):
+            bump_versions('post', chunk)
+
+
+# whether a user save changes how their posts look; password changes, logins and the like leave them alone
+@receiver(pre_save, sender=User)
+def remember_user_representation(sender, instance, update_fields=None, **kwargs):
+    instance._posts_changed = False
+    fields = [name for name in POST_USER_FIELDS if update_fields is None or name in update_fields]
+    if not instance._state.adding and fields:
+        stored = User.objects.filter(pk=instance.pk).values(*fields).first()
+        # compared as stored, since a file field reads back '' where the instance holds a file without a name
+        instance._posts_changed = stored is None or any(
+            stored[name] != sender._meta.get_field(name).get_prep_value(getattr(instance, name)) for name in fields)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_posts(sender, instance, created, **kwargs):
+    if getattr(instance, '_posts_changed', False):
+        # a prolific user has many posts and comments, so they are bumped on the background worker
+        transaction.on_commit(lambda: enqueue(bump_user_posts, instance.pk))
+
+
+# saving a user (profile edits, password changes, deactivation) drops the copy cached for authentication
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+# keep the cached unread counters in step with single notifications
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        adjust_unread_count(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def discount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_count(instance.user_id, -1)
@@ -1,3 +1,1597 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.hashers import check_password
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from django.utils.timezone import now
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from blog.models import (BlogPost, Category, Tag, Comment, PostLike, PostRating, EmailOutbox, Notification, RelatedPost,
+                         AuthorSubscription, TimelineEntry, TrendingScore, MARKDOWN_RENDER_VERSION)
+from .caching import VERSION_CACHE_ALIAS, bump_version, get_cache, get_version, get_version_cache
+from .views import BlogPostViewSet
+from .outbox import drain_outbox, queue_share_email
+from .pagination import encode_cursor
+from .trending import TRENDING_WINDOWS, record_event, record_like, record_rating
+from .notifications import NOTIFICATION_CACHE_ALIAS, get_counter_cache, unread_count, unread_key
+from .cache_backends import SharedFileCache
+from .authentication import user_cache
+from .throttling import THROTTLE_CACHE_ALIAS, LoginEmailThrottle, SlidingWindowThrottle
+from .async_views import AsyncReadView
+from .instrumentation import timed
+from . import replicas, related, trending
+from .mysql_pool.pool import ConnectionPool, PoolTimeout
+from PIL import Image
 
-# Create your tests here.
+User = get_user_model()
+
+
+# the shared cache in a directory of this test run, so tests neither see nor clear the one servers on the host use
+TEST_CACHES = {**settings.CACHES, 'shared': {**settings.CACHES['shared'], 'LOCATION': tempfile.mkdtemp()}}
+
+
+class CleanCacheMixin:
+    """
+    Starts every test with empty caches, so nothing cached by an earlier test (responses,
+    versions, counters of reused ids) is seen.
+    """
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        get_version_cache().clear()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   CACHES=TEST_CACHES)
+class BlogAPITestCase(CleanCacheMixin, APITestCase):
+    """
+    Base of the API tests: plain HTTP, a fast password hasher and empty caches.
+    """
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   CACHES=TEST_CACHES)
+class BlogAPITransactionTestCase(CleanCacheMixin, APITransactionTestCase):
+    """
+    BlogAPITestCase for tests that need real transactions.
+    """
+
+
+class RerenderPostsTests(BlogAPITestCase):
+    """
+    rerender_posts re-renders only the posts whose stored HTML is stale and invalidates their cached responses.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.posts = [BlogPost.objects.create(title=f'Post {i}', content=f'# Heading {i}', author=self.author) for i in range(3)]
+
+    def rerender(self):
+        out = io.StringIO()
+        call_command('rerender_posts', workers=1, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_only_stale_posts_are_rerendered(self):
+        fresh, old_renderer, edited = self.posts
+        BlogPost.objects.filter(pk=old_renderer.pk).update(render_version=1, content_html='')
+        BlogPost.objects.filter(pk=edited.pk).update(content='*Edited*') # no save(), so its HTML is stale
+        versions = {post.pk: get_version('post', post.pk) for post in self.posts}
+
+        self.assertIn('Re-rendered 2 post(s).', self.rerender())
+        old_renderer.refresh_from_db()
+        self.assertEqual((old_renderer.content_html, old_renderer.render_version), ('<h1>Heading 1</h1>', MARKDOWN_RENDER_VERSION))
+        edited.refresh_from_db()
+        self.assertEqual((edited.content_html, edited.excerpt), ('<p><em>Edited</em></p>', 'Edited'))
+        self.assertEqual(get_version('post', fresh.pk), versions[fresh.pk])
+        self.assertNotEqual(get_version('post', old_renderer.pk), versions[old_renderer.pk])
+        self.assertNotEqual(get_version('post', edited.pk), versions[edited.pk])
+
+        self.assertIn('Re-rendered 0 post(s).', self.rerender())
+
+    def test_renderer_version_bump_rerenders_every_post(self):
+        with mock.patch('blog.models.MARKDOWN_RENDER_VERSION', MARKDOWN_RENDER_VERSION + 1), \
+                mock.patch('blog.management.commands.rerender_posts.MARKDOWN_RENDER_VERSION', MARKDOWN_RENDER_VERSION + 1):
+            self.assertTrue(all(post.is_render_stale() for post in BlogPost.objects.all()))
+            self.assertIn('Re-rendered 3 post(s).', self.rerender())
+            self.assertFalse(any(post.is_render_stale() for post in BlogPost.objects.all()))
+
+
+class BackgroundJobTests(BlogAPITestCase):
+    """
+    New posts notify every subscriber with chunked inserts after commit, and queued outbox
+    emails are delivered by a background job (run inline under the test runner).
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.author.username = 'author'
+        self.author.save()
+        self.subscribers = [User.objects.create_user(f'reader{i}@example.com', 'password') for i in range(5)]
+        AuthorSubscription.objects.bulk_create([AuthorSubscription(user=user, author=self.author) for user in self.subscribers])
+
+    def test_fan_out_notifies_every_subscriber_after_commit(self):
+        self.assertEqual(unread_count(self.subscribers[0].pk), 0)
+        with mock.patch('api.signals.NOTIFICATION_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                BlogPost.objects.create(title='Hello', content='Body', author=self.author)
+                self.assertFalse(Notification.objects.exists()) # the request does not wait for the fan-out
+
+        notifications = Notification.objects.order_by('user_id')
+        self.assertEqual([notification.user_id for notification in notifications], [user.pk for user in self.subscribers])
+        self.assertEqual({notification.message for notification in notifications}, {'New post published by author: Hello.'})
+        inserts = [query for query in queries if query['sql'].startswith(f'INSERT INTO {connection.ops.quote_name("blog_notification")}')]
+        self.assertEqual(len(inserts), 3)
+        # bulk inserts send no signals, so the cached unread counters are dropped and recounted
+        self.assertEqual(unread_count(self.subscribers[0].pk), 1)
+
+    def test_edits_do_not_notify_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = BlogPost.objects.create(title='Hello', content='Body', author=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.title = 'Hello again'
+            post.save()
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_queued_share_is_delivered_by_the_outbox_job(self):
+        post = BlogPost.objects.create(title='Shared', content='Body', author=self.author)
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/posts/{post.pk}/share_post/', {'email': 'Friend@example.com'})
+            self.assertEqual(EmailOutbox.objects.get().status, 'pending')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+        self.assertEqual(mail.outbox[0].to, ['friend@example.com'])
+
+
+class FeedTests(BlogAPITestCase):
+    """
+    The home feed merges posts pushed into the reader's timeline with posts pulled from
+    high-subscriber authors, pages without gaps, and follows subscribes and unsubscribes.
+    """
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('api.feed.FEED_PUSH_MAX_SUBSCRIBERS', 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reader = User.objects.create_user('reader@example.com', 'password')
+        self.small = User.objects.create_user('small@example.com', 'password')
+        self.big = User.objects.create_user('big@example.com', 'password')
+        self.stranger = User.objects.create_user('stranger@example.com', 'password')
+        for author in (self.small, self.big):
+            AuthorSubscription.objects.create(user=self.reader, author=author)
+        AuthorSubscription.objects.create(user=self.stranger, author=self.big) # too big to push to now
+        self.client.force_authenticate(self.reader)
+        self.start = now()
+
+    def publish(self, author, title, minutes_ago=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BlogPost.objects.create(title=title, content='Body', author=author, status='published',
+                                           published_date=self.start - timedelta(minutes=minutes_ago))
+
+    def feed(self):
+        titles, before = [], None
+        while True:
+            response = self.client.get('/api/feed/', {'before': before} if before else {})
+            self.assertEqual(response.status_code, 200, response.content)
+            titles += [post['title'] for post in response.json()['results']]
+            before = response.json()['next']
+            if before is None:
+                return titles
+
+    def test_pushed_and_pulled_posts_are_merged(self):
+        counts = User.objects.filter(pk__in=[self.small.pk, self.big.pk]).order_by('pk').values_list('subscriber_count', flat=True)
+        self.assertEqual(list(counts), [1, 2])
+        for minutes_ago, author in enumerate([self.big, self.small, self.big, self.small]):
+            self.publish(author, f'{author.email[0]}{minutes_ago}', minutes_ago)
+        self.publish(self.stranger, 'not followed')
+        BlogPost.objects.create(title='draft', content='Body', author=self.small)
+
+        self.assertEqual(self.feed(), ['b0', 's1', 'b2', 's3'])
+        self.assertEqual(set(TimelineEntry.objects.values_list('post__title', flat=True)), {'s1', 's3'})
+
+    def test_pages_split_posts_sharing_a_date(self):
+        for i in range(15):
+            self.publish(self.small, f's{i}')
+            self.publish(self.big, f'b{i}')
+        titles = self.feed()
+        self.assertEqual(len(titles), 30)
+        self.assertEqual(set(titles), {f'{prefix}{i}' for prefix in 'sb' for i in range(15)})
+
+    def test_subscribe_backfills_and_unsubscribe_clears(self):
+        other = User.objects.create_user('other@example.com', 'password')
+        self.publish(other, 'older', 5)
+        self.publish(other, 'newer', 1)
+        self.assertEqual(self.client.post(f'/api/users/{other.pk}/subscribe/').status_code, 201)
+        self.assertEqual(self.feed(), ['newer', 'older'])
+        self.assertEqual(User.objects.get(pk=other.pk).subscriber_count, 1)
+
+        self.assertEqual(self.client.delete(f'/api/users/{other.pk}/unsubscribe/').status_code, 204)
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(post__author=other).exists())
+        self.assertEqual(User.objects.get(pk=other.pk).subscriber_count, 0)
+
+    def test_only_publishing_pushes(self):
+        post = self.publish(self.small, 'post', 10)
+        with mock.patch('api.signals.push_post_to_timelines') as push, self.captureOnCommitCallbacks(execute=True):
+            post.title = 'edited'
+            post.save()
+        push.assert_not_called()
+
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(self.feed(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            post.publish()
+        # publishing again moves the post to its new date
+        with self.captureOnCommitCallbacks(execute=True):
+            post.publish()
+        self.assertEqual(TimelineEntry.objects.get(post=post).published_date, BlogPost.objects.get(pk=post.pk).published_date)
+        self.assertEqual(self.feed(), ['edited'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/feed/', {'before': 'nope'}).status_code, 404)
+
+
+class KeysetPaginationTests(BlogAPITestCase):
+    """
+    Cursor pages follow (sort value, id) without gaps or repeats, even across rows sharing a
+    sort value, put NULL values last, and answer malformed cursors with 404.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.start = now()
+
+    def ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def test_cursor_round_trip(self):
+        posts = [BlogPost.objects.create(title=f'Post {i}', content='Body', author=self.author, status='published',
+                                         published_date=self.start - timedelta(hours=i)) for i in range(7)]
+        drafts = [BlogPost.objects.create(title=f'Draft {i}', content='Body', author=self.author) for i in range(2)]
+        first = self.client.get('/api/posts/', {'page_size': 3}).json()
+        self.assertNotIn('count', first)
+        self.assertEqual(len(first['results']), 3)
+        # newest first, drafts (no published date) last
+        self.assertEqual(self.ids('/api/posts/?page_size=3'), [post.pk for post in posts + drafts])
+
+    def test_ties_at_page_boundaries(self):
+        posts = [BlogPost.objects.create(title=f'Post {i}', content='Body', author=self.author, status='published',
+                                         published_date=self.start) for i in range(7)]
+        self.assertEqual(self.ids('/api/posts/?page_size=3'), [post.pk for post in posts])
+
+        comments = [Comment.objects.create(post=posts[0], author=self.author, content=f'Comment {i}') for i in range(5)]
+        Comment.objects.update(created_date=self.start)
+        self.assertEqual(self.ids('/api/comments/?page_size=2'), [comment.pk for comment in comments])
+
+    def test_malformed_cursors(self):
+        BlogPost.objects.create(title='Post', content='Body', author=self.author, status='published', published_date=self.start)
+        for cursor in ['not base64!', encode_cursor('not-a-date', 1), encode_cursor(self.start, 'x'),
+                       base64.urlsafe_b64encode(b'[1]').decode('ascii')]:
+            response = self.client.get('/api/posts/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.json()['detail'], 'Invalid cursor')
+
+
+class BlogPostQueryCountTests(BlogAPITestCase):
+    """
+    The number of queries each post endpoint runs must not grow with the number of
+    posts, tags, comments, likes and ratings it returns.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('reader@example.com', 'password')
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.author.username = 'author'
+        self.author.save()
+        self.category = Category.objects.create(name='python')
+        self.client.force_authenticate(self.user)
+        self.created = 0
+
+    def add_posts(self, count):
+        """
+        Create published posts, each with its own tags, comments, likes and ratings.
+        """
+        for _ in range(count):
+            self.created += 1
+            post = BlogPost.objects.create(title=f'Post {self.created}', content='# Hello', author=self.author, category=self.category)
+            post.publish()
+            post.tags.add(*[Tag.objects.create(name=f'tag-{self.created}-{i}') for i in range(2)])
+            for i in range(2):
+                commenter = User.objects.create_user(f'commenter-{self.created}-{i}@example.com', 'password')
+                Comment.objects.create(post=post, author=commenter, content='Nice post')
+                PostLike.objects.create(user=commenter, post=post)
+                PostRating.objects.create(user=commenter, post=post, rating=i + 3)
+        return post
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.add_posts(2)
+        small = self.count_queries(url)
+        self.add_posts(8)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f"{url} ran {small} queries for 2 posts but {large} for 10")
+
+    def test_list(self):
+        self.assertConstantQueries('/api/posts/')
+
+    def test_detail(self):
+        post = self.add_posts(1)
+        small = self.count_queries(f'/api/posts/{post.pk}/')
+        for _ in range(3):
+            commenter = User.objects.create_user(f'extra-{Comment.objects.count()}@example.com', 'password')
+            Comment.objects.create(post=post, author=commenter, content='Another one')
+        post.tags.add(Tag.objects.create(name='extra'))
+        self.assertEqual(small, self.count_queries(f'/api/posts/{post.pk}/'))
+
+    def test_posts_by_category(self):
+        self.assertConstantQueries(f'/api/posts/category/{self.category.name}/')
+
+    def test_posts_by_author(self):
+        self.assertConstantQueries('/api/posts/author/author/')
+
+    def test_most_liked(self):
+        self.assertConstantQueries('/api/posts/most-liked/')
+
+    def test_highest_rated(self):
+        self.assertConstantQueries('/api/posts/highest-rated/')
+
+
+class PostSearchTests(BlogAPITestCase):
+    """
+    '?search=' is answered from the full-text index, which follows post saves, tag changes and deletes.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.django = BlogPost.objects.create(title='Django tips', content='Models and views', author=self.author)
+        self.other = BlogPost.objects.create(title='Cooking', content='A recipe that mentions django once', author=self.author)
+
+    def search(self, query):
+        response = self.client.get('/api/posts/', {'search': query})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [post['id'] for post in response.json()['results']]
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.search('django'), [self.django.pk, self.other.pk])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search('reci'), [self.other.pk])
+
+    def test_index_follows_tags_and_deletes(self):
+        self.other.tags.add(Tag.objects.create(name='baking'))
+        self.assertEqual(self.search('baking'), [self.other.pk])
+        self.other.delete()
+        self.assertEqual(self.search('baking'), [])
+
+
+class ConditionalGetTests(BlogAPITestCase):
+    """
+    Read endpoints send ETag/Last-Modified, answer 304 while nothing changed and
+    serve fresh data once the object or anything shown with it changes.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.post = BlogPost.objects.create(title='Cached', content='Body', author=self.author)
+        self.url = f'/api/posts/{self.post.pk}/'
+
+    def test_post_detail_not_modified_until_changed(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        Comment.objects.create(post=self.post, author=self.author, content='New comment')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['comments']), 1)
+
+    def test_tag_rename_invalidates_tag_list_and_posts(self):
+        tag = Tag.objects.create(name='old')
+        self.post.tags.add(tag)
+        list_etag = self.client.get('/api/tags/')['ETag']
+        post_etag = self.client.get(self.url)['ETag']
+
+        tag.name = 'new'
+        tag.save()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['name'] for item in response.data['results']], ['new'])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=post_etag)
+        self.assertEqual(response.json()['tags'][0]['name'], 'new')
+
+    def test_only_shown_user_changes_invalidate_their_posts(self):
+        reader = User.objects.create_user('reader@example.com', 'password')
+        commented = BlogPost.objects.create(title='Commented', content='Body', author=reader)
+        Comment.objects.create(post=commented, author=self.author, content='Hello')
+        versions = lambda: (get_version('post', self.post.pk), get_version('post', commented.pk))
+        before = versions()
+
+        # a password change or a login does not change how the posts look
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.author.set_password('changed')
+            self.author.save()
+            self.author.last_login = now()
+            self.author.save(update_fields=['last_login'])
+        self.assertEqual((len(callbacks), versions()), (0, before))
+
+        # a new username shows on the posts they wrote and commented on, which get new versions after commit
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.author.username = 'renamed'
+            self.author.save()
+            self.assertEqual(versions(), before)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(versions()[0], before[0])
+        self.assertNotEqual(versions()[1], before[1])
+        self.assertEqual(self.client.get(self.url).json()['author']['username'], 'renamed')
+
+    def test_versions_bumped_by_another_process_invalidate(self):
+        etag = self.client.get(self.url)['ETag']
+        # such as a management command or another server worker: its own cache instance on the same files
+        other_process = SharedFileCache(settings.CACHES[VERSION_CACHE_ALIAS]['LOCATION'], {})
+        with mock.patch('api.caching.get_version_cache', return_value=other_process):
+            bump_version('post', self.post.pk)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SharePostOutboxTests(BlogAPITestCase):
+    """
+    share_post queues the email and answers 202; the outbox worker delivers it with retries.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.post = BlogPost.objects.create(title='Shared', content='Body', author=self.author)
+        self.url = f'/api/posts/{self.post.pk}/share_post/'
+
+    def test_share_is_queued_deduplicated_and_sent(self):
+        for _ in range(2):
+            response = self.client.post(self.url, {'email': 'friend@example.com'})
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['friend@example.com'])
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.client.post(self.url, {'email': 'friend@example.com'})
+        with mock.patch('api.outbox.EmailMessage.send', side_effect=OSError('connection refused')):
+            self.assertEqual(drain_outbox(), (0, 1))
+        email = EmailOutbox.objects.get()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, now())
+
+        # not due yet, so nothing is sent until the backoff has passed
+        self.assertEqual(drain_outbox(), (0, 0))
+        EmailOutbox.objects.update(next_attempt_at=now() - timedelta(seconds=1))
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sent_email_releases_dedup_key(self):
+        first, created = queue_share_email(self.post, 'friend@example.com', self.author)
+        self.assertTrue(created)
+        self.assertEqual(queue_share_email(self.post, ' Friend@example.com', self.author), (first, False))
+        drain_outbox()
+        _, created = queue_share_email(self.post, 'friend@example.com', self.author) # a later share is sent again
+        self.assertTrue(created)
+        self.assertEqual(EmailOutbox.objects.filter(dedup_key=None).get(), first)
+
+    def test_unreachable_mail_server(self):
+        self.client.post(self.url, {'email': 'friend@example.com'})
+        self.client.post(self.url, {'email': 'other@example.com'})
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=ConnectionRefusedError('refused')):
+            with self.assertRaises(OSError):
+                drain_outbox()
+            with self.assertRaises(CommandError):
+                call_command('send_outbox', stdout=io.StringIO())
+        self.assertEqual(list(EmailOutbox.objects.values_list('status', 'attempts')), [('pending', 0)] * 2)
+
+        # a connection dropped mid-batch counts against that email and stops the batch
+        with mock.patch('api.outbox.EmailMessage.send', side_effect=SMTPServerDisconnected('gone')), self.assertRaises(OSError):
+            drain_outbox()
+        self.assertEqual(list(EmailOutbox.objects.values_list('status', 'attempts')), [('pending', 1), ('sending', 0)])
+
+    def test_loop_backs_off_while_mail_server_is_unreachable(self):
+        outcomes = [ConnectionRefusedError('refused')] * 3 + [(1, 0), KeyboardInterrupt()]
+        with mock.patch('api.management.commands.send_outbox.drain_outbox', side_effect=outcomes), \
+                mock.patch('api.management.commands.send_outbox.time.sleep') as sleep, self.assertRaises(KeyboardInterrupt):
+            call_command('send_outbox', loop=True, interval=5, max_backoff=15, stdout=io.StringIO())
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [10, 15, 15, 5])
+
+
+class NotificationInboxTests(BlogAPITestCase):
+    """
+    The inbox lists only the user's notifications and keeps the cached unread count in step.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('reader@example.com', 'password')
+        self.other = User.objects.create_user('other@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        self.notifications = [Notification.objects.create(user=self.user, message=f'Message {i}') for i in range(3)]
+        Notification.objects.create(user=self.other, message='Not yours')
+
+    def test_list_is_scoped_to_user(self):
+        response = self.client.get('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({item['id'] for item in response.json()['results']}, {n.pk for n in self.notifications})
+
+    def test_unread_count_follows_create_and_mark_read(self):
+        self.assertEqual(self.client.get('/api/notifications/unread_count/').json()['unread_count'], 3)
+        Notification.objects.create(user=self.user, message='Another')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notifications/unread_count/')
+        self.assertEqual(response.json()['unread_count'], 4)
+        self.assertEqual(len(queries), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/notifications/mark_all_read/', {'up_to': self.notifications[1].pk})
+        self.assertEqual(response.data, {'marked_read': 2, 'unread_count': 2})
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(Notification.objects.get(pk=self.notifications[2].pk).is_read)
+
+    def test_unread_count_is_shared_between_processes(self):
+        self.assertEqual(self.client.get('/api/notifications/unread_count/').json()['unread_count'], 3)
+        # another process: its own cache instance on the same files
+        other_process = SharedFileCache(settings.CACHES[NOTIFICATION_CACHE_ALIAS]['LOCATION'], {})
+        self.assertEqual(other_process.incr(unread_key(self.user.pk)), 4)
+        self.assertEqual(self.client.get('/api/notifications/unread_count/').json()['unread_count'], 4)
+
+        # counters expire and are recounted, so one that missed an update is eventually right again
+        with mock.patch('api.notifications.UNREAD_COUNT_TIMEOUT', 1):
+            get_counter_cache().delete(unread_key(self.user.pk))
+            self.assertEqual(unread_count(self.user.pk), 3)
+            with mock.patch('time.time', return_value=time.time() + 2):
+                self.assertIsNone(get_counter_cache().get(unread_key(self.user.pk)))
+
+    def test_shared_counters_lose_no_increments(self):
+        cache = get_counter_cache()
+        cache.add('counter', 0, timeout=60)
+        location = settings.CACHES[NOTIFICATION_CACHE_ALIAS]['LOCATION']
+
+        def count():
+            process = SharedFileCache(location, {})
+            for _ in range(25):
+                process.incr('counter')
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.get('counter'), 100)
+        self.assertFalse(cache.add('counter', 0))
+
+
+class GenerateDataTests(BlogAPITestCase):
+    """
+    generate_data writes the same counters, post counts and timelines the signals would have,
+    and bench_endpoints requests every route against the generated dataset.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('blog.management.commands.generate_data.FEED_PUSH_MAX_SUBSCRIBERS', 2), \
+                mock.patch('blog.management.commands.generate_data.FEED_BACKFILL_SIZE', 2):
+            call_command('generate_data', users=5, posts=20, categories=3, tags=5, subscriptions_per_user=3,
+                         likes=40, ratings=30, comments=30, batch_size=7, stdout=io.StringIO())
+
+    def test_derived_data_matches_source_rows(self):
+        self.assertEqual(BlogPost.objects.count(), 20)
+        for post in BlogPost.objects.all():
+            ratings = list(PostRating.objects.filter(post=post).values_list('rating', flat=True))
+            self.assertEqual(
+                (post.like_count, post.rating_sum, post.rating_count, post.comment_count, post.is_render_stale()),
+                (PostLike.objects.filter(post=post).count(), sum(ratings), len(ratings), Comment.objects.filter(post=post).count(), False))
+            self.assertEqual(post.average_rating, sum(ratings) / len(ratings) if ratings else None)
+
+        published = BlogPost.objects.filter(BlogPost.PUBLISHED)
+        for category in Category.objects.all():
+            self.assertEqual(category.post_count, published.filter(category=category).count())
+        for tag in Tag.objects.all():
+            self.assertEqual(tag.post_count, published.filter(tags=tag).count())
+        for user in User.objects.all():
+            self.assertEqual(user.subscriber_count, AuthorSubscription.objects.filter(author=user).count())
+
+        expected = set()
+        for subscription in AuthorSubscription.objects.select_related('author'):
+            if subscription.author.subscriber_count <= 2:
+                latest = published.filter(author=subscription.author).order_by('-published_date', '-id')[:2]
+                expected |= {(subscription.user_id, post.pk, post.published_date) for post in latest}
+        self.assertTrue(expected)
+        self.assertEqual(set(TimelineEntry.objects.values_list('user_id', 'post_id', 'published_date')), expected)
+
+        # the repair commands find nothing to repair
+        for command, repaired in (('reconcile_post_counters', 'Repaired 0 post(s).'),
+                                  ('reconcile_category_tag_counts', 'Repaired 0 category(s) and 0 tag(s).')):
+            out = io.StringIO()
+            call_command(command, stdout=out)
+            self.assertIn(repaired, out.getvalue())
+
+    def test_bench_endpoints_covers_every_route(self):
+        out = io.StringIO()
+        call_command('bench_endpoints', iterations=1, warmup=0, stdout=out, stderr=io.StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['uncovered_routes'], [])
+        failed = {name: result['status'] for name, result in report['routes'].items() if result['status'] >= 400}
+        self.assertEqual(failed, {})
+
+
+class QueryPlanTests(BlogAPITestCase):
+    """
+    EXPLAIN the queries each hot endpoint runs against its main table and fail if one
+    falls back to a full table scan or a filesort instead of using an index.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader@example.com', 'password')
+        cls.authors = [User.objects.create_user(f'author{i}@example.com', 'password') for i in range(3)]
+        for i, author in enumerate(cls.authors):
+            author.username = f'author{i}'
+            author.save()
+        cls.categories = [Category.objects.create(name=f'category{i}') for i in range(3)]
+        posts = BlogPost.objects.bulk_create([
+            BlogPost(title=f'Post {i}', content='Body', author=cls.authors[i % 3], category=cls.categories[i % 3],
+                     status='published' if i % 4 else 'draft', published_date=now() - timedelta(hours=i) if i % 4 else None,
+                     like_count=i % 7, average_rating=(i % 5) or None)
+            for i in range(300)
+        ])
+        Comment.objects.bulk_create([Comment(post=posts[i % 30], author=cls.user, content='Comment') for i in range(300)])
+        Notification.objects.bulk_create([Notification(user=cls.user, message='Hello', is_read=bool(i % 2)) for i in range(300)])
+        TrendingScore.objects.bulk_create([TrendingScore(post=posts[i], window=window, score=i % 50, last_event_at=now() - timedelta(hours=i))
+                                           for i in range(300) for window in TRENDING_WINDOWS])
+        if connection.vendor == 'mysql':
+            with connection.cursor() as cursor:
+                for table in ('users_user', 'blog_blogpost', 'blog_comment', 'blog_notification', 'blog_trendingscore'):
+                    cursor.execute(f'ANALYZE TABLE {table}')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def plan_problems(self, sql):
+        """
+        Describe any full scan or filesort in the plan of one SELECT.
+        """
+        problems = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f'EXPLAIN {sql}')
+                columns = [column[0] for column in cursor.description]
+                for row in cursor.fetchall():
+                    step = dict(zip(columns, row))
+                    if step['type'] == 'ALL':
+                        problems.append(f"full scan of {step['table']}")
+                    if 'filesort' in (step['Extra'] or ''):
+                        problems.append(f"filesort on {step['table']}")
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    if detail.startswith('SCAN') and 'USING' not in detail:
+                        problems.append(detail)
+                    if 'TEMP B-TREE' in detail:
+                        problems.append(detail)
+        return problems
+
+    def assertIndexedPlans(self, url, table):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        quote = connection.ops.quote_name
+        # prefetches by a list of ids are primary/foreign key lookups; the hot query is the one paging the table
+        hot = [query['sql'] for query in queries
+               if query['sql'].startswith('SELECT') and f'FROM {quote(table)}' in query['sql'] and ' IN (' not in query['sql']]
+        self.assertTrue(hot, f"{url} ran no query against {table}")
+        for sql in hot:
+            self.assertEqual(self.plan_problems(sql), [], sql)
+        return response
+
+    def test_post_list(self):
+        response = self.assertIndexedPlans('/api/posts/', 'blog_blogpost')
+        self.assertIndexedPlans(response.json()['next'], 'blog_blogpost')
+
+    def test_published_posts(self):
+        self.assertIndexedPlans('/api/posts/?status=published', 'blog_blogpost')
+
+    def test_posts_by_author(self):
+        # posts were bulk created without signals, so post lists cached by earlier tests would be stale
+        get_cache().clear()
+        self.assertIndexedPlans('/api/posts/author/author1/', 'users_user')
+        get_cache().clear() # a warm post list needs no query against blog_blogpost
+        self.assertIndexedPlans('/api/posts/author/author1/', 'blog_blogpost')
+
+    def test_posts_by_category(self):
+        get_cache().clear()
+        self.assertIndexedPlans('/api/posts/category/category1/', 'blog_blogpost')
+
+    def test_posts_by_author_past_cached_list(self):
+        get_cache().clear()
+        with mock.patch.object(BlogPostViewSet, 'post_keys_cache_size', 5):
+            response = self.client.get('/api/posts/author/author1/')
+            self.assertIndexedPlans(response.json()['next'], 'blog_blogpost')
+
+    def test_ranked_posts(self):
+        self.assertIndexedPlans('/api/posts/most-liked/', 'blog_blogpost')
+        self.assertIndexedPlans('/api/posts/highest-rated/', 'blog_blogpost')
+
+    def test_comment_list(self):
+        self.assertIndexedPlans('/api/comments/', 'blog_comment')
+        # comments of one post, newest first
+        post_id = BlogPost.objects.order_by('pk').values_list('pk', flat=True).first()
+        with CaptureQueriesContext(connection) as queries:
+            list(Comment.objects.filter(post_id=post_id))
+        self.assertEqual(self.plan_problems(queries[0]['sql']), [], queries[0]['sql'])
+
+    def test_notification_list(self):
+        self.assertIndexedPlans('/api/notifications/', 'blog_notification')
+        self.assertIndexedPlans('/api/notifications/?is_read=false', 'blog_notification')
+
+    def test_trending(self):
+        for window in TRENDING_WINDOWS:
+            self.assertIndexedPlans(f'/api/posts/trending/?window={window}', 'blog_trendingscore')
+        with CaptureQueriesContext(connection) as queries:
+            trending.prune()
+        for query in queries:
+            self.assertEqual(self.plan_problems(query['sql']), [], query['sql'])
+
+
+class PostRepresentationTests(BlogAPITestCase):
+    """
+    Lists return the compact representation, and ?fields= drops fields without querying their columns.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.post = BlogPost.objects.create(title='Compact', content='# Heading\n\n' + 'word ' * 400, author=self.author)
+        Comment.objects.create(post=self.post, author=self.author, content='First')
+
+    def test_list_is_compact_and_detail_is_full(self):
+        item = self.client.get('/api/posts/').json()['results'][0]
+        self.assertNotIn('content', item)
+        self.assertNotIn('comments', item)
+        self.assertEqual((item['word_count'], item['reading_time'], item['comment_count']), (401, 3, 1))
+        self.assertTrue(item['excerpt'].startswith('Heading word'))
+
+        detail = self.client.get(f'/api/posts/{self.post.pk}/').json()
+        self.assertIn('content_as_html', detail)
+        self.assertEqual(len(detail['comments']), 1)
+
+    def test_sparse_fieldset_skips_dropped_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/', {'fields': 'id,title'})
+        self.assertEqual(response.json()['results'], [{'id': self.post.pk, 'title': 'Compact'}])
+        for query in queries:
+            self.assertNotIn('excerpt', query['sql'])
+            self.assertNotIn('users_user', query['sql'])
+
+    def test_list_is_served_from_fragment_cache(self):
+        first = self.client.get('/api/posts/').json()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/posts/').json(), first)
+        self.assertEqual(len(queries), 1) # the page of ids; every post came from the cache
+
+        Comment.objects.create(post=self.post, author=self.author, content='Second')
+        self.assertEqual(self.client.get('/api/posts/').json()['results'][0]['comment_count'], 2)
+
+
+class PostsByAuthorAndCategoryTests(BlogAPITestCase):
+    """
+    Author and category pages list published posts only, page by cursor, are addressed by
+    unique slugs and follow publishes, edits and deletes through their cached post lists.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('sam@example.com', 'password')
+        self.author.username = 'Sam'
+        self.author.save()
+        self.category = Category.objects.create(name='Web Development')
+        self.client.force_authenticate(self.author)
+        self.posts = [self.add_post(f'Post {i}', hours_ago=i) for i in range(5)]
+        self.draft = BlogPost.objects.create(title='Draft', content='Body', author=self.author, category=self.category)
+
+    def add_post(self, title, hours_ago=0, author=None, category=None):
+        return BlogPost.objects.create(title=title, content='Body', author=author or self.author,
+                                       category=category or self.category, status='published',
+                                       published_date=now() - timedelta(hours=hours_ago))
+
+    def titles(self, url):
+        titles = []
+        while url:
+            body = self.client.get(url).json()
+            titles += [post['title'] for post in body['results']]
+            url = body['next']
+        return titles
+
+    def test_slugs(self):
+        self.assertEqual((self.author.slug, self.category.slug), ('sam', 'web-development'))
+        other = User.objects.create_user('other@example.com', 'password')
+        other.username = 'sam'
+        other.save()
+        self.assertEqual(other.slug, 'sam-2')
+        self.add_post('Theirs', author=other)
+        # a shared username no longer makes the lookup fail
+        self.assertEqual(self.titles('/api/posts/author/sam-2/'), ['Theirs'])
+        self.assertEqual(self.client.get('/api/posts/author/nobody/').status_code, 404)
+
+    def test_slugs_without_a_username(self):
+        # create_user (and so createsuperuser) leaves the username empty
+        self.assertEqual(User.objects.create_user('Jo.Smith@example.com', 'password').slug, 'josmith')
+        self.assertEqual(User.objects.create_user('jo.smith@example.org', 'password').slug, 'josmith-2')
+        # nothing usable to derive a base from: a random suffix instead of scanning every 'user' slug
+        with CaptureQueriesContext(connection) as queries:
+            user = User.objects.create_user('!!!@example.com', 'password')
+        self.assertRegex(user.slug, r'^user-\d{6}$')
+        self.assertFalse([query for query in queries if 'LIKE' in query['sql']])
+
+    def test_slug_taken_concurrently_is_retried(self):
+        # another registration inserts the slug this one was about to take
+        with mock.patch('users.models.unique_slug', return_value='sam'):
+            other = User.objects.create_user('other@example.com', 'password')
+            other.username = 'Sam'
+            other.save()
+        self.assertRegex(other.slug, r'^sam-\d{6}$')
+        self.assertEqual(User.objects.get(pk=other.pk).slug, other.slug)
+        # the collision only rolled back its savepoint
+        with transaction.atomic():
+            category = Category.objects.create(name='web development!')
+        self.assertEqual(category.slug, 'web-development-2')
+
+    def test_pages_of_published_posts(self):
+        expected = [f'Post {i}' for i in range(5)]
+        for url in ('/api/posts/author/sam/?page_size=2', '/api/posts/category/web-development/?page_size=2'):
+            self.assertEqual(self.titles(url), expected)
+            # pages past the cached post list are queried
+            with mock.patch.object(BlogPostViewSet, 'post_keys_cache_size', 3):
+                get_cache().clear()
+                self.assertEqual(self.titles(url), expected)
+
+    def test_cached_list_follows_changes(self):
+        url = '/api/posts/category/web-development/'
+        self.assertEqual(len(self.titles(url)), 5)
+        with CaptureQueriesContext(connection) as queries:
+            self.titles(url)
+        self.assertEqual(len(queries), 1) # the slug; the post list and posts came from the cache
+
+        self.draft.publish()
+        self.assertEqual(self.titles(url)[0], 'Draft')
+        self.posts[0].delete()
+        self.assertNotIn('Post 0', self.titles(url))
+        self.posts[1].title = 'Edited'
+        self.posts[1].save()
+        self.assertIn('Edited', self.titles(url))
+        self.posts[2].category = Category.objects.create(name='Other')
+        self.posts[2].save()
+        self.assertNotIn('Post 2', self.titles(url))
+        self.assertEqual(self.titles('/api/posts/category/other/'), ['Post 2'])
+
+
+class PostCounterTests(BlogAPITestCase):
+    """
+    Likes, ratings and comments keep the stored counters of their post in step through creates,
+    re-rates and deletes, and reconcile_post_counters repairs counters that drifted.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.reader = User.objects.create_user('reader@example.com', 'password')
+        self.post = BlogPost.objects.create(title='Counted', content='Body', author=self.author, status='published', published_date=now())
+        self.client.force_authenticate(self.reader)
+
+    def counters(self):
+        return BlogPost.objects.values_list(*BlogPost.COUNTER_FIELDS).get(pk=self.post.pk)
+
+    def test_likes(self):
+        url = f'/api/posts/{self.post.pk}/like_post/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.counters()[0], 1) # the rejected like rolled back its count
+        self.client.force_authenticate(self.author)
+        self.client.post(url)
+        self.assertEqual(self.counters()[0], 2)
+        PostLike.objects.get(user=self.reader).delete() # unlike
+        self.assertEqual(self.counters()[0], 1)
+
+    def test_ratings(self):
+        url = f'/api/posts/{self.post.pk}/rate_post/'
+        self.client.post(url, {'rating': 4})
+        self.assertEqual(self.counters()[1:4], (4, 1, 4.0))
+        self.client.post(url, {'rating': 2}) # re-rating moves the sum, not the count
+        self.assertEqual(self.counters()[1:4], (2, 1, 2.0))
+        self.assertEqual(self.client.post(url, {'rating': 6}).status_code, 400)
+        self.client.force_authenticate(self.author)
+        self.client.post(url, {'rating': 5})
+        self.assertEqual(self.counters()[1:4], (7, 2, 3.5))
+        PostRating.objects.filter(user=self.author).delete()
+        PostRating.objects.get().delete()
+        self.assertEqual(self.counters()[1:4], (0, 0, None))
+
+    def test_comments(self):
+        data = {'post': self.post.pk, 'author': self.reader.pk}
+        response = self.client.post('/api/comments/', {**data, 'content': 'First'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.client.post('/api/comments/', {**data, 'content': 'Second'})
+        self.assertEqual(self.counters()[4], 2)
+        self.client.patch(f'/api/comments/{response.json()["id"]}/', {'content': 'Edited'})
+        self.assertEqual(self.counters()[4], 2)
+        self.assertEqual(self.client.delete(f'/api/comments/{response.json()["id"]}/').status_code, 204)
+        self.assertEqual(self.counters()[4], 1)
+
+    def test_reconcile_repairs_drift(self):
+        # likes and ratings created outside like_post/rate_post are not counted
+        PostLike.objects.create(user=self.reader, post=self.post)
+        PostRating.objects.create(user=self.reader, post=self.post, rating=3)
+        Comment.objects.create(post=self.post, author=self.reader, content='Counted')
+        BlogPost.objects.filter(pk=self.post.pk).update(rating_sum=9, rating_count=4, comment_count=7)
+        untouched = BlogPost.objects.create(title='Fine', content='Body', author=self.author)
+        version = get_version('post', self.post.pk)
+
+        out = io.StringIO()
+        call_command('reconcile_post_counters', stdout=out)
+        self.assertIn('Repaired 1 post(s).', out.getvalue())
+        self.assertEqual(self.counters(), (1, 3, 1, 3.0, 1))
+        self.assertNotEqual(get_version('post', self.post.pk), version)
+        self.assertEqual(BlogPost.objects.values_list(*BlogPost.COUNTER_FIELDS).get(pk=untouched.pk), (0, 0, 0, None, 0))
+
+        out = io.StringIO()
+        call_command('reconcile_post_counters', stdout=out)
+        self.assertIn('Repaired 0 post(s).', out.getvalue())
+
+
+class TrendingTests(BlogAPITestCase):
+    """
+    Likes and ratings score posts per window with exponential decay; each window ranks only
+    the posts active inside it, and prune drops the scores that fell out.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.posts = [BlogPost.objects.create(title=f'Post {i}', content='Body', author=self.author, status='published',
+                                              published_date=now()) for i in range(3)]
+        self.start = now()
+
+    def trending(self, window):
+        return [item['id'] for item in self.client.get('/api/posts/trending/', {'window': window}).json()]
+
+    def test_scoring(self):
+        first, second, third = self.posts
+        record_rating(first.pk, 5)
+        record_like(second.pk)
+        record_like(second.pk)
+        record_rating(third.pk, 1) # a fifth of a like
+        self.assertEqual(self.trending('1h'), [second.pk, first.pk, third.pk])
+        self.assertEqual(TrendingScore.objects.filter(post=second).count(), len(TRENDING_WINDOWS))
+
+        # the like on the view records the event too
+        self.client.post(f'/api/posts/{third.pk}/like_post/')
+        self.client.post(f'/api/posts/{third.pk}/like_post/')
+        self.assertEqual(self.trending('1h')[1:], [third.pk, first.pk])
+
+    def test_decay(self):
+        recent, earlier = self.posts[:2]
+        record_event(recent.pk, 1.0, self.start)
+        # two likes 30 minutes back weigh 2 / e^0.5 ~ 1.2 in the hour window, but 2 / e^(1/48) ~ 1.96 over 24 hours
+        record_event(earlier.pk, 1.0, self.start - timedelta(minutes=30))
+        record_event(earlier.pk, 1.0, self.start - timedelta(minutes=30))
+        self.assertEqual(self.trending('1h')[:2], [earlier.pk, recent.pk])
+        record_event(recent.pk, 0.5, self.start) # 1.5 now beats 1.2 in the hour, not 1.96 over the day
+        self.assertEqual(self.trending('1h')[:2], [recent.pk, earlier.pk])
+        self.assertEqual(self.trending('24h')[:2], [earlier.pk, recent.pk])
+
+        score = TrendingScore.objects.get(post=recent, window='1h').score
+        self.assertAlmostEqual(score, trending.event_term(TRENDING_WINDOWS['1h'], 1.5, self.start))
+
+    def test_window_selection(self):
+        hour, day, week = self.posts
+        record_event(hour.pk, 1.0, self.start)
+        record_event(day.pk, 100.0, self.start - timedelta(hours=2))
+        record_event(week.pk, 10000.0, self.start - timedelta(days=2))
+        self.assertEqual(self.trending('1h'), [hour.pk])
+        self.assertEqual(self.trending('24h'), [day.pk, hour.pk])
+        self.assertEqual(self.trending('7d'), [week.pk, day.pk, hour.pk])
+        self.assertEqual(self.client.get('/api/posts/trending/', {'window': '1y'}).status_code, 400)
+        self.assertEqual(len(self.client.get('/api/posts/trending/', {'window': '7d', 'limit': 1}).json()), 1)
+        # limits below one are clamped rather than sliced negatively
+        for limit in (0, -5):
+            self.assertEqual(len(self.client.get('/api/posts/trending/', {'window': '7d', 'limit': limit}).json()), 1)
+        self.assertEqual(self.client.get('/api/posts/trending/', {'limit': 'many'}).status_code, 400)
+
+        self.assertEqual(trending.prune(), 3) # the hour and day scores of week, the hour score of day
+        self.assertEqual(self.trending('7d'), [week.pk, day.pk, hour.pk])
+
+
+class CategoryTagCountTests(BlogAPITestCase):
+    """
+    Categories and tags count their published posts through publishes, moves, retags and
+    deletes; the tag cloud ranks tags by that count and drift is repaired by a command.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.python, self.web = Category.objects.create(name='python'), Category.objects.create(name='web')
+        self.tags = [Tag.objects.create(name=f'tag{i}') for i in range(3)]
+        self.post = BlogPost.objects.create(title='Counted', content='Body', author=self.author, category=self.python)
+        self.post.tags.add(*self.tags[:2])
+
+    def counts(self):
+        return ([category.post_count for category in Category.objects.order_by('pk')],
+                [tag.post_count for tag in Tag.objects.order_by('pk')])
+
+    def test_counts_follow_posts(self):
+        self.assertEqual(self.counts(), ([0, 0], [0, 0, 0])) # drafts are not counted
+        self.post.publish()
+        self.assertEqual(self.counts(), ([1, 0], [1, 1, 0]))
+
+        self.post.tags.remove(self.tags[0], self.tags[2]) # tag2 was never on the post
+        self.tags[2].blogpost_set.add(self.post)
+        self.assertEqual(self.counts(), ([1, 0], [0, 1, 1]))
+        self.post.tags.clear()
+        self.assertEqual(self.counts(), ([1, 0], [0, 0, 0]))
+        self.post.tags.set(self.tags)
+
+        self.post.category = self.web
+        self.post.save()
+        self.assertEqual(self.counts(), ([0, 1], [1, 1, 1]))
+        self.post.status = 'draft'
+        self.post.save()
+        self.assertEqual(self.counts(), ([0, 0], [0, 0, 0]))
+        self.post.publish()
+        self.post.delete()
+        self.assertEqual(self.counts(), ([0, 0], [0, 0, 0]))
+
+    def test_tag_cloud(self):
+        self.post.publish()
+        other = BlogPost.objects.create(title='Other', content='Body', author=self.author, status='published', published_date=now())
+        other.tags.add(self.tags[1])
+        cloud = self.client.get('/api/tags/cloud/').json()
+        self.assertEqual([(tag['name'], tag['post_count']) for tag in cloud], [('tag1', 2), ('tag0', 1)])
+        self.assertEqual(len(self.client.get('/api/tags/cloud/', {'limit': 1}).json()), 1)
+        self.assertEqual(self.client.get('/api/tags/cloud/', {'limit': 'many'}).status_code, 400)
+
+        other.tags.add(self.tags[2]) # the cached cloud is invalidated
+        self.assertEqual(self.client.get('/api/tags/cloud/').json()[-1]['name'], 'tag2')
+        self.assertEqual(self.client.get('/api/categories/').json()['results'][0]['post_count'], 1)
+
+    def test_reconcile_repairs_drift(self):
+        self.post.publish()
+        Category.objects.update(post_count=5)
+        BlogPost.objects.filter(pk=self.post.pk).update(status='draft') # no signals
+        out = io.StringIO()
+        call_command('reconcile_category_tag_counts', stdout=out)
+        self.assertIn('Repaired 2 category(s) and 2 tag(s).', out.getvalue())
+        self.assertEqual(self.counts(), ([0, 0], [0, 0, 0]))
+
+
+class RelatedPostTests(BlogAPITestCase):
+    """
+    Related posts rank by IDF-weighted shared tags plus category and author boosts, are served
+    from the precomputed table, and are kept current around posts whose tags change.
+    """
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(related, 'RELATED_POSTS_ASYNC', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.other = User.objects.create_user('other@example.com', 'password')
+        self.client.force_authenticate(self.author)
+        self.category = Category.objects.create(name='python')
+        self.rare, self.common, self.unrelated = [Tag.objects.create(name=name) for name in ('rare', 'common', 'unrelated')]
+        self.posts = {}
+        for title, tags, author in [('a', [self.rare, self.common], self.author), ('b', [self.rare, self.common], self.other),
+                                    ('c', [self.common], self.other), ('d', [self.unrelated], self.other),
+                                    ('e', [self.common], self.other)]:
+            post = BlogPost.objects.create(title=title, content='Body', author=author, status='published', published_date=now())
+            post.tags.set(tags)
+            self.posts[title] = post
+        call_command('rebuild_related_posts', stdout=io.StringIO())
+
+    def related(self, title):
+        return [post['title'] for post in self.client.get(f'/api/posts/{self.posts[title].pk}/related/').json()]
+
+    def stored(self):
+        return {post.title: [BlogPost.objects.get(pk=pk).title for pk in related.related_post_ids(post.pk)]
+                for post in BlogPost.objects.order_by('title')}
+
+    def test_ranking(self):
+        self.assertEqual(self.related('a'), ['b', 'c', 'e'])
+        self.assertEqual(self.related('d'), [])
+        self.posts['e'].author = self.author
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts['e'].save()
+        # the author boost breaks the tie between c and e
+        self.assertEqual(self.related('a'), ['b', 'e', 'c'])
+        self.assertEqual(self.client.get('/api/posts/0/related/').status_code, 404)
+
+    def test_served_with_one_lookup(self):
+        self.related('a')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.related('a'), ['b', 'c', 'e'])
+        self.assertEqual(len(queries), 1)
+
+    def test_incremental_updates_follow_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts['d'].tags.add(self.rare)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.common.blogpost_set.remove(self.posts['b'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts['c'].status = 'draft'
+            self.posts['c'].save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts['e'].delete()
+        incremental = self.stored()
+        self.assertEqual(incremental['a'], ['b', 'd'])
+        self.assertEqual(incremental['c'], [])
+
+        # the same posts as a rebuild; their order may differ until it folds in the drift of the tag weights
+        call_command('rebuild_related_posts', stdout=io.StringIO())
+        self.assertEqual({title: set(titles) for title, titles in incremental.items()},
+                         {title: set(titles) for title, titles in self.stored().items()})
+
+    def test_full_lists_are_recomputed_when_a_post_drops_out(self):
+        with mock.patch.object(related, 'RELATED_POSTS_COUNT', 1):
+            related.rebuild()
+            self.assertEqual(self.stored()['c'], ['e'])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.posts['e'].tags.remove(self.common)
+            # the runner-up was not stored for c, so c's list was recomputed
+            self.assertEqual(self.stored()['c'], ['b'])
+        self.assertEqual(RelatedPost.objects.filter(post=self.posts['c']).count(), 1)
+
+
+class JWTUserCacheTests(BlogAPITestCase):
+    """
+    Read-only requests authenticate from the in-process user cache; saving the user invalidates it
+    and writes always check the database.
+    """
+    def setUp(self):
+        super().setUp()
+        user_cache.clear()
+        self.user = User.objects.create_user('reader@example.com', 'password')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_reads_authenticate_without_queries(self):
+        self.assertEqual(self.client.get('/api/notifications/unread_count/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/notifications/unread_count/').status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/notifications/mark_all_read/')
+        self.assertTrue(any('users_user' in query['sql'] for query in queries))
+
+    def test_deactivation_invalidates_cached_user(self):
+        self.assertEqual(self.client.get('/api/notifications/unread_count/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/notifications/unread_count/').status_code, 401)
+
+
+class SignInProtectionTests(BlogAPITestCase):
+    """
+    Sign-in hashes a password for unknown emails too, and attempts are throttled per email and per IP.
+    """
+    url = '/api/api/users/login/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('reader@example.com', 'password')
+        # the middle of a throttle window, so no test straddles two
+        patcher = mock.patch('api.throttling.time.time', return_value=1_800_000_030.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unknown_email_costs_a_hash(self):
+        with mock.patch('api.hashing.check_password', wraps=check_password) as checked:
+            response = self.client.post(self.url, {'email': 'nobody@example.com', 'password': 'guess'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(checked.call_count, 1)
+
+        response = self.client.post(self.url, {'email': 'reader@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+    def test_attempts_are_throttled_per_email(self):
+        for _ in range(5):
+            self.assertEqual(self.client.post(self.url, {'email': 'reader@example.com', 'password': 'wrong'}).status_code, 401)
+        response = self.client.post('/api/token/', {'email': 'Reader@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.post(self.url, {'email': 'other@example.com', 'password': 'x'}).status_code, 401)
+
+    def test_attempts_are_throttled_per_ip_whatever_it_forwards(self):
+        for i in range(20):
+            response = self.client.post(self.url, {'email': f'guess{i}@example.com', 'password': 'x'},
+                                        HTTP_X_FORWARDED_FOR=f'10.0.0.{i}')
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post(self.url, {'email': 'reader@example.com', 'password': 'password'},
+                                    HTTP_X_FORWARDED_FOR='10.0.1.1')
+        self.assertEqual(response.status_code, 429)
+        # the rest of the window, then until this window's 21 attempts weigh 19 or less: 30 + 60 * 2 / 21
+        self.assertEqual(response['Retry-After'], '36')
+        response = self.client.post(self.url, {'email': 'reader@example.com', 'password': 'password'}, REMOTE_ADDR='10.0.1.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_attempts_are_counted_with_atomic_increments(self):
+        # each attempt is one incr() of the shared counter, so concurrent attempts cannot overwrite each other's count
+        throttle = LoginEmailThrottle()
+        request = mock.Mock(data={'email': 'reader@example.com'})
+        allowed = [throttle.allow_request(request, None) for _ in range(6)]
+        self.assertEqual(allowed, [True] * 5 + [False])
+        key = f"{throttle.get_cache_key(request, None)}:{int(1_800_000_030 // 60)}"
+        # in the cache every process counts in
+        self.assertEqual(caches[THROTTLE_CACHE_ALIAS].get(key), 6)
+        self.assertEqual(SharedFileCache(settings.CACHES[THROTTLE_CACHE_ALIAS]['LOCATION'], {}).get(key), 6)
+
+    def test_no_burst_across_a_window_boundary(self):
+        throttle = LoginEmailThrottle()
+        request = mock.Mock(data={'email': 'reader@example.com'})
+        with mock.patch('api.throttling.time.time', return_value=1_800_000_055.0): # the end of a window
+            self.assertEqual([throttle.allow_request(request, None) for _ in range(5)], [True] * 5)
+        with mock.patch('api.throttling.time.time', return_value=1_800_000_065.0): # the start of the next
+            self.assertFalse(throttle.allow_request(request, None))
+        # with the refused attempt counted, the next one fits once the previous 5 weigh 3: 24 seconds in
+        self.assertAlmostEqual(throttle.wait(), 19.0)
+        with mock.patch('api.throttling.time.time', return_value=1_800_000_072.0):
+            self.assertFalse(throttle.allow_request(request, None)) # the refused attempt counted too
+        with mock.patch('api.throttling.time.time', return_value=1_800_000_110.0):
+            self.assertTrue(throttle.allow_request(request, None))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProfilePictureTests(BlogAPITestCase):
+    """
+    Uploads are validated, stored under their content hash once, and get thumbnails served with immutable headers.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('reader@example.com', 'password')
+        self.other = User.objects.create_user('other@example.com', 'password')
+
+    def upload(self, user, content, name='avatar.png'):
+        self.client.force_authenticate(user)
+        return self.client.post(f'/api/users/{user.pk}/profile-picture/',
+                                {'profile_picture': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def image(self):
+        output = io.BytesIO()
+        Image.new('RGBA', (300, 200), (255, 0, 0, 128)).save(output, 'PNG')
+        return output.getvalue()
+
+    def test_duplicate_uploads_share_storage_and_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True): # thumbnails are rendered by a background job after commit
+            response = self.upload(self.user, self.image())
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['avatar']['sizes'])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.profile_picture_thumbnails)
+
+        response = self.upload(self.other, self.image(), name='copy.png')
+        self.assertEqual(response.data['avatar']['original'], self.user.profile_picture.url)
+        url = response.data['avatar']['sizes']['64']['webp']
+        thumbnail = self.client.get(url)
+        self.assertEqual(thumbnail['Cache-Control'], 'public, max-age=31536000, immutable')
+        with Image.open(io.BytesIO(b''.join(thumbnail.streaming_content))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 64)))
+
+    def test_rejects_invalid_images(self):
+        self.assertEqual(self.upload(self.user, b'not an image').status_code, 400)
+        self.assertEqual(self.upload(self.user, self.image()[:100]).status_code, 400)
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True)
+class InstrumentationTests(BlogAPITestCase):
+    """
+    Instrumented requests report their timings in Server-Timing and one JSON log line.
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.category = Category.objects.create(name='python')
+        self.post = BlogPost.objects.create(title='Timed', content='# Body', author=self.author, category=self.category)
+        self.client.force_authenticate(self.author)
+
+    def server_timing(self, response):
+        return {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            response = self.client.post('/api/posts/', {'title': 'New', 'content': '*Text*', 'category': 'python'})
+        self.assertEqual(response.status_code, 201)
+        timings = self.server_timing(response)
+        for name in ['db', 'markdown', 'serialize', 'total']:
+            self.assertIn(name, timings)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['method'], record['path'], record['status']), ('POST', '/api/posts/', 201))
+        self.assertNotIn('sql', record)
+
+    def test_slow_requests_are_logged_with_sql(self):
+        with mock.patch('api.instrumentation.INSTRUMENTATION_SLOW_MS', 0), \
+                self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            self.client.get(f'/api/posts/{self.post.pk}/', HTTP_ACCEPT='application/json')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertTrue(any('blog_blogpost' in query['sql'] for query in record['sql']))
+
+    def test_profile_on_demand(self):
+        with mock.patch('api.instrumentation.INSTRUMENTATION_PROFILE_KEY', 'secret'), \
+                self.assertLogs('api.instrumentation', 'INFO') as logs:
+            self.client.get('/api/tags/', HTTP_X_PROFILE='wrong')
+            self.client.get('/api/tags/', HTTP_X_PROFILE='secret')
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertNotIn('profile', records[0])
+        self.assertIn('function calls', records[1]['profile'])
+
+    async def test_asgi_requests_are_timed_but_not_profiled(self):
+        token = RefreshToken.for_user(self.author).access_token
+        with mock.patch('api.instrumentation.INSTRUMENTATION_PROFILE_KEY', 'secret'), \
+                self.assertLogs('api.instrumentation', 'INFO') as logs:
+            response = await self.async_client.get('/api/tags/', headers={'Authorization': f'Bearer {token}', 'X-Profile': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('auth', self.server_timing(response))
+        self.assertNotIn('profile', json.loads(logs.records[-1].getMessage()))
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('Server-Timing', response)
+        with timed('db'): # outside an instrumented request timers do nothing
+            pass
+
+
+class OnePerMinuteThrottle(SlidingWindowThrottle):
+    scope = 'login_ip'
+
+    def __init__(self):
+        self.capacity, self.period = 1, 60
+
+    def get_cache_key(self, request, view):
+        return f'throttle:test:{request.user.pk}'
+
+
+class AsyncReadViewTests(BlogAPITestCase):
+    """
+    Under ASGI the read endpoints are served by async views running the DRF views' reads and
+    request pipeline (authentication, permissions, throttles); writes and the browsable API are
+    handed to the DRF views, and WSGI requests never reach the async views.
+    """
+    def setUp(self):
+        super().setUp()
+        user_cache.clear()
+        self.author = User.objects.create_user('author@example.com', 'password')
+        self.author.username = 'author'
+        self.author.save()
+        self.reader = User.objects.create_user('reader@example.com', 'password')
+        self.category = Category.objects.create(name='python')
+        self.post = BlogPost.objects.create(title='Async', content='Body', author=self.author, category=self.category,
+                                            status='published', published_date=now())
+        Comment.objects.create(post=self.post, author=self.reader, content='First')
+        AuthorSubscription.objects.create(user=self.reader, author=self.author)
+        Notification.objects.create(user=self.reader, message='Hello')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.reader).access_token}'}
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth['Authorization'])
+
+    async def test_reads_match_the_drf_views(self):
+        for url in ['/api/posts/', f'/api/posts/{self.post.pk}/', '/api/posts/category/python/',
+                    '/api/posts/author/author/', '/api/feed/', '/api/notifications/', '/api/notifications/unread_count/',
+                    f'/api/posts/?search=async&category={self.category.pk}', '/api/posts/?fields=id,title']:
+            response = await self.async_client.get(url, headers=self.auth)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIs(response.resolver_match.func.view_class, AsyncReadView, url)
+            expected = await sync_to_async(self.client.get)(url)
+            self.assertEqual(response.json(), expected.json(), url)
+
+        response = await self.async_client.get('/api/posts/category/missing/', headers=self.auth)
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(f'/api/posts/{self.post.pk + 100}/', headers=self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_valid_token(self):
+        response = await self.async_client.get('/api/posts/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = await self.async_client.get('/api/posts/', headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_throttles_apply(self):
+        with mock.patch.object(BlogPostViewSet, 'throttle_classes', [OnePerMinuteThrottle]):
+            self.assertEqual((await self.async_client.get('/api/posts/', headers=self.auth)).status_code, 200)
+            response = await self.async_client.get('/api/posts/', headers=self.auth)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    async def test_writes_and_browsable_api_use_drf_views(self):
+        response = await self.async_client.post('/api/posts/', {'title': 'New', 'content': 'Text', 'category': 'python'},
+                                                 headers=self.auth)
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.get('/api/posts/', headers={**self.auth, 'Accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    def test_wsgi_requests_use_drf_views(self):
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.resolver_match.func.cls, BlogPostViewSet)
+        with override_settings(ASYNC_READ_VIEWS=False):
+            response = async_to_sync(AsyncClient().get)('/api/posts/', headers=self.auth)
+        self.assertIs(response.resolver_match.func.cls, BlogPostViewSet)
+
+
+class ReplicaRoutingTests(BlogAPITransactionTestCase):
+    """
+    Two SQLite files stand in for the primary and a replica; the replica is a copy of the
+    primary taken in setUp, so rows written afterwards are only visible on the primary.
+    """
+    aliases = ('primary', 'replica')
+    databases = '__all__' # includes the two aliases, added before the test case checks its databases
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for alias in cls.aliases:
+            connections.settings[alias] = {**connections['default'].settings_dict,
+                                           'NAME': os.path.join(cls.directory, f'{alias}.sqlite3')}
+        super().setUpClass()
+        call_command('migrate', database='primary', verbosity=0)
+        cls.patches = [mock.patch.object(replicas, 'PRIMARY_DATABASE', 'primary'),
+                       mock.patch.object(replicas, 'DATABASE_REPLICAS', {'replica': 1})]
+        for patch in cls.patches:
+            patch.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for patch in cls.patches:
+            patch.stop()
+        super().tearDownClass()
+        for alias in cls.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        super().setUp()
+        replicas._lag_checks.clear()
+        self.user = User.objects.create_user('reader@example.com', 'password')
+        self.other = User.objects.create_user('other@example.com', 'password')
+        self.category = Category.objects.create(name='python')
+        self.post = BlogPost.objects.create(title='Replicated', content='Body', author=self.user, category=self.category)
+        connections['replica'].close()
+        shutil.copy(os.path.join(self.directory, 'primary.sqlite3'), os.path.join(self.directory, 'replica.sqlite3'))
+        # written after the copy: only on the primary
+        self.fresh = BlogPost.objects.create(title='Fresh', content='Body', author=self.user, category=self.category)
+
+    def get(self, user, post, client=None):
+        client = client or self.client_class()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client.get(f'/api/posts/{post.pk}/', HTTP_ACCEPT='application/json')
+
+    def test_reads_go_to_replica_until_the_client_writes(self):
+        self.assertEqual(self.get(self.user, self.post).status_code, 200)
+        self.assertEqual(self.get(self.user, self.fresh).status_code, 404) # replica has not caught up
+        self.assertEqual(BlogPost.objects.filter(pk=self.fresh.pk).count(), 1) # outside requests: primary
+
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post(f'/api/posts/{self.fresh.pk}/like/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(replicas.REPLICA_PIN_COOKIE, response.cookies)
+        # other clients still read from the replica
+        self.assertEqual(self.get(self.other, self.fresh).status_code, 404)
+
+        # pinned by cookie and, for clients without cookies, by token
+        response = self.client.get(f'/api/posts/{self.fresh.pk}/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        tokenonly = self.client_class()
+        tokenonly.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(tokenonly.get(f'/api/posts/{self.fresh.pk}/').status_code, 200)
+        # the token's pin is seen by other workers: here, a cache instance of another process
+        other_process = SharedFileCache(settings.CACHES[replicas.REPLICA_PIN_CACHE_ALIAS]['LOCATION'], {})
+        self.assertTrue(other_process.get(replicas.pin_key(f'Bearer {token}')))
+        with mock.patch('api.replicas.get_pin_cache', return_value=other_process):
+            self.assertEqual(tokenonly.get(f'/api/posts/{self.fresh.pk}/').status_code, 200)
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch('api.replicas.replica_lag', return_value=replicas.REPLICA_MAX_LAG + 1):
+            self.assertEqual(self.get(self.user, self.fresh).status_code, 200)
+        replicas._lag_checks.clear()
+        with mock.patch('api.replicas.replica_lag', return_value=None):
+            self.assertEqual(self.get(self.user, self.fresh).status_code, 200)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def ping(self):
+        if not self.alive:
+            raise OSError('gone away')
+
+    def rollback(self):
+        self.ping()
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """
+    The MySQL backend's pool, driven with stand-in connections.
+    """
+    def test_reuses_bounds_and_replaces_connections(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+        first = pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+
+        pool.checkin(first)
+        first.alive = False # failed health check on checkout
+        second = pool.checkout()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+
+        pool.checkin(second)
+        pool.max_lifetime = 0 # too old to hand out again
+        self.assertIsNot(pool.checkout(), second)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['in_use'], stats['created'], stats['reused']), (1, 1, 3, 1))
+        self.assertEqual((stats['timeouts'], stats['unhealthy'], stats['recycled']), (1, 1, 1))
+
+    def test_connection_of_a_collected_owner_is_freed(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+
+        class Owner:
+            pass
+
+        owner = Owner()
+        connection = pool.checkout(owner=owner)
+        del owner
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['lost'], 1)
+        self.assertIsNot(pool.checkout(), connection)
@@ -0,0 +1,108 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Cache holding the request counters; it must be shared by every process serving requests (and support
+# atomic add() and incr()), or each process allows the full rate
+THROTTLE_CACHE_ALIAS = getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Sliding-window request counter kept in the cache. A rate of 'N/period' (from
+    DEFAULT_THROTTLE_RATES[scope]) allows N requests in any period: the count of the current
+    fixed window plus the count of the previous one, weighted by the share of it the sliding
+    period still covers. A plain fixed window would allow 2N requests across a window boundary.
+
+    Counters are created with cache.add() and counted with cache.incr(), which the shared cache
+    makes atomic across processes, so concurrent requests cannot all read the same count and
+    slip past the limit. A token bucket would need its tokens and refill time read and written
+    together, which the cache API cannot do atomically.
+
+    Subclasses set `scope` and return the counter's key from get_cache_key(), or None to skip throttling.
+    """
+    scope = None
+    wait_seconds = None
+
+    def __init__(self):
+        self.capacity, self.period = self.parse_rate(api_settings.DEFAULT_THROTTLE_RATES[self.scope])
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        cache = caches[THROTTLE_CACHE_ALIAS]
+        window, elapsed = divmod(time.time(), self.period)
+        window = int(window)
+        current_key = f'{key}:{window}'
+        # a counter is read through the next window too, as the previous one
+        cache.add(current_key, 0, timeout=2 * self.period)
+        try:
+            count = cache.incr(current_key)
+        except ValueError:
+            # the counter expired between add() and incr()
+            cache.add(current_key, 1, timeout=2 * self.period)
+            count = 1
+        previous = cache.get(f'{key}:{window - 1}', 0)
+        if previous * (1 - elapsed / self.period) + count <= self.capacity:
+            return True
+        self.wait_seconds = self.seconds_until_allowed(previous, count, elapsed)
+        return False
+
+    def seconds_until_allowed(self, previous, count, elapsed):
+        """
+        Seconds until one more request fits under the limit, if no other request comes in meanwhile.
+        """
+        room = self.capacity - 1
+        if count <= room and previous:
+            # the previous window's share shrinks enough during this window
+            return (1 - (room - count) / previous) * self.period - elapsed
+        # this window's count has to shrink enough as the previous one of the next window
+        return self.period - elapsed + max(0.0, 1 - room / count) * self.period
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(SlidingWindowThrottle):
+    """
+    Credential attempts per client IP address.
+    """
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return f'throttle:{self.scope}:{self.get_ident(request)}'
+
+    def get_ident(self, request):
+        # without NUM_PROXIES, DRF keys on the client-supplied X-Forwarded-For, which a client can change on every attempt
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return super().get_ident(request)
+
+
+class LoginEmailThrottle(SlidingWindowThrottle):
+    """
+    Credential attempts per account email, whichever addresses they come from.
+    """
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        digest = hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()
+        return f'throttle:{self.scope}:{digest}'
+
+
+CREDENTIAL_THROTTLES = [LoginIPThrottle, LoginEmailThrottle]
@@ -0,0 +1,82 @@
+import math
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value, FloatField
+from django.db.models.functions import Exp, Greatest, Ln
+from django.utils.timezone import now
+from blog.models import TrendingScore
+
+# Sliding windows; each window's length is also the time constant its scores decay with
+TRENDING_WINDOWS = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+}
+TRENDING_LIKE_WEIGHT = getattr(settings, 'TRENDING_LIKE_WEIGHT', 1.0)
+TRENDING_RATING_WEIGHT = getattr(settings, 'TRENDING_RATING_WEIGHT', 1.0)
+# Largest page the trending endpoint serves
+TRENDING_MAX_RESULTS = getattr(settings, 'TRENDING_MAX_RESULTS', 100)
+
+# Scores are stored as log(sum(weight * e^((t - EPOCH) / window))). Every post decays at the
+# same rate, so ordering by the stored score is the same as ordering by the decayed score now,
+# and the log keeps the numbers from overflowing as time moves on.
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def event_term(length, weight, when):
+    """
+    Log-space contribution of one event of the given weight at time `when`.
+    """
+    return (when - EPOCH).total_seconds() / length.total_seconds() + math.log(weight)
+
+
+def record_event(post_id, weight, when=None):
+    """
+    Add a like or rating event to the post's score in every window with one atomic UPDATE each.
+    """
+    when = when or now()
+    for window, length in TRENDING_WINDOWS.items():
+        term = Value(event_term(length, weight, when), output_field=FloatField())
+        # score = log(e^score + e^term), written as term + ln(1 + e^(score - term)) so it stays in range
+        new_score = term + Ln(Value(1.0) + Exp(F('score') - term))
+        last_event_at = Greatest(F('last_event_at'), Value(when))
+        scores = TrendingScore.objects.filter(post_id=post_id, window=window)
+        if scores.update(score=new_score, last_event_at=last_event_at):
+            continue
+        try:
+            with transaction.atomic():
+                TrendingScore.objects.create(post_id=post_id, window=window,
+                                             score=event_term(length, weight, when), last_event_at=when)
+        except IntegrityError:
+            # another request created the row first; fold this event into it
+            scores.update(score=new_score, last_event_at=last_event_at)
+
+
+def record_like(post_id):
+    record_event(post_id, TRENDING_LIKE_WEIGHT)
+
+
+def record_rating(post_id, rating):
+    record_event(post_id, TRENDING_RATING_WEIGHT * rating / 5)
+
+
+def top_post_ids(window, limit):
+    """
+    Ids of the highest scoring posts with activity inside the window, best first. Walks the
+    (window, -score, last_event_at) index, skipping the stale rows prune has not deleted yet.
+    """
+    cutoff = now() - TRENDING_WINDOWS[window]
+    return list(TrendingScore.objects.filter(window=window, last_event_at__gte=cutoff)
+                .order_by('-score').values_list('post_id', flat=True)[:limit])
+
+
+def prune():
+    """
+    Delete scores whose last event fell out of their window. Returns the number of rows deleted.
+    """
+    current = now()
+    deleted = 0
+    for window, length in TRENDING_WINDOWS.items():
+        deleted += TrendingScore.objects.filter(window=window, last_event_at__lt=current - length).delete()[0]
+    return deleted
@@ -7,7 +7,11 @@ from .views import (
     TagViewSet,
     CommentViewSet,
     UserLoginView,
+    FeedView,
+    NotificationViewSet,
 )
+from .async_views import AsyncReadView
+from .throttling import CREDENTIAL_THROTTLES
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 # Create a router for automatic URL routing based on viewsets
@@ -19,20 +23,24 @@ router.register('posts', BlogPostViewSet)
 router.register('categories', CategoryViewSet)
 router.register('tags', TagViewSet)
 router.register('comments', CommentViewSet)
+router.register('notifications', NotificationViewSet, basename='notification')
 
 # Define URL patterns
 urlpatterns = [
     # JWT authentication endpoints
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', TokenObtainPairView.as_view(throttle_classes=CREDENTIAL_THROTTLES), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
      # Your custom login view, if needed
     path('api/users/login/', UserLoginView.as_view(), name='user_login'),
+    # Home feed of posts from subscribed authors
+    path('feed/', FeedView.as_view(), name='feed'),
+
     # Custom actions for BlogPostViewSet
-    path('posts/category/<str:category_name>/', 
+    path('posts/category/<slug:category_slug>/', 
          BlogPostViewSet.as_view({'get': 'posts_by_category'}), 
          name='posts-by-category'),
-    path('posts/author/<str:author_username>/', 
+    path('posts/author/<slug:author_slug>/', 
          BlogPostViewSet.as_view({'get': 'posts_by_author'}), 
          name='posts-by-author'),
 
@@ -66,3 +74,20 @@ urlpatterns = [
 
 # Include the router's URL patterns
 urlpatterns += router.urls
+
+# Read endpoints served by native async views under ASGI (see api/async_views.py), ahead of
+# `urlpatterns` in ASYNC_READ_URLCONF; their other methods go to the same DRF views as above
+views_by_name = {pattern.name: pattern.callback for pattern in reversed(urlpatterns)}
+
+async_urlpatterns = [
+    path(route, AsyncReadView.as_view(sync_view=views_by_name[name]), name=name)
+    for route, name in [
+        ('feed/', 'feed'),
+        ('posts/', 'blogpost-list'),
+        ('posts/<int:pk>/', 'blogpost-detail'),
+        ('posts/category/<slug:category_slug>/', 'posts-by-category'),
+        ('posts/author/<slug:author_slug>/', 'posts-by-author'),
+        ('notifications/', 'notification-list'),
+        ('notifications/unread_count/', 'notification-unread-count'),
+    ]
+]
@@ -1,20 +1,39 @@
-from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.exceptions import PermissionDenied, NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
 from blog.models import BlogPost, Category, Tag, Comment, PostLike, PostRating, AuthorSubscription, Notification
-from .serializers import BlogPostSerializer, CategorySerializer, TagSerializer, UserSerializer, CommentSerializer, AuthorSubscriptionSerializer,NotificationSerializer, PostLikeSerializer, PostRatingSerializer
-from .filters import BlogPostFilter
+from .serializers import BlogPostSerializer, BlogPostListSerializer, CategorySerializer, TagSerializer, UserSerializer, CommentSerializer, AuthorSubscriptionSerializer,NotificationSerializer, PostLikeSerializer, PostRatingSerializer
+from .filters import BlogPostFilter, PostSearchFilter
 from .permissions import IsOwnerOrReadOnly
-from rest_framework.filters import SearchFilter, OrderingFilter
+from .pagination import PostCursorPagination, CommentCursorPagination, NotificationCursorPagination, KeysetPagination, encode_cursor, decode_cursor
+from .caching import ConditionalRetrieveMixin, ConditionalListMixin, cached_fragments_read, cached_sorted_keys_read, get_version
+from .reads import run_read, filter_queryset_read
+from rest_framework.filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
-from django.db import models
-from django.core.mail import send_mail
+from django.db import transaction, IntegrityError
+from django.db.models import Prefetch
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
+from rest_framework.renderers import JSONRenderer
+from rest_framework.parsers import MultiPartParser
+from django.http import HttpResponse, FileResponse, Http404
+from django.core.files.storage import default_storage
+import mimetypes
+import hashlib
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from .feed import timeline_read
+from .outbox import queue_share_email
+from .notifications import unread_count, unread_count_read, mark_read
+from .throttling import CREDENTIAL_THROTTLES
+from .hashing import verify_password
+from .avatars import save_profile_picture
+from .trending import TRENDING_WINDOWS, TRENDING_MAX_RESULTS, record_like, record_rating, top_post_ids
+from .related import related_post_ids
 
 User = get_user_model()
 
@@ -24,7 +43,7 @@ class UserViewSet(ModelViewSet):
     serializer_class = UserSerializer
 
     # Custom action to handle user registration
-    @action(detail=False, methods=['post'], url_path='register', permission_classes=[])
+    @action(detail=False, methods=['post'], url_path='register', permission_classes=[], throttle_classes=CREDENTIAL_THROTTLES)
     def register(self, request):
         # Get data from the request
         email = request.data.get('email')
@@ -59,6 +78,19 @@ class UserViewSet(ModelViewSet):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    # Upload a profile picture (multipart field `profile_picture`); thumbnails are generated in the background
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], parser_classes=[MultiPartParser],
+            url_path='profile-picture')
+    def profile_picture(self, request, pk=None):
+        user = self.get_object()
+        if user != request.user:
+            raise PermissionDenied("You can only change your own profile picture.")
+        upload = request.FILES.get('profile_picture')
+        if upload is None:
+            return Response({"detail": "profile_picture is required."}, status=status.HTTP_400_BAD_REQUEST)
+        save_profile_picture(user, upload)
+        return Response(UserSerializer(user).data)
+
     # Allows a user to subscribe to another user(author)
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def subscribe_to_author(self, request, pk=None):
@@ -108,21 +140,134 @@ class UserViewSet(ModelViewSet):
             'notification' : notification_serializer.data
             }, status=status.HTTP_204_NO_CONTENT)
 
-class BlogPostViewSet(ModelViewSet):
-    queryset = BlogPost.objects.all()
+# model columns read by each BlogPost serializer field (fields not listed read the column of the same name)
+POST_FIELD_COLUMNS = {
+    'author': ('author__id', 'author__username', 'author__slug', 'author__email', 'author__bio',
+               'author__profile_picture', 'author__profile_picture_hash', 'author__profile_picture_thumbnails'),
+    'category': ('category__name',),
+    'content_as_html': ('content', 'content_html', 'content_hash', 'render_version'),
+    'tags': (),
+    'comments': (),
+}
+# columns the paginators and ranking endpoints sort on
+POST_SORT_COLUMNS = ('id', 'published_date', 'like_count', 'average_rating')
+# Most (published date, id) pairs cached per author and per category; later pages are queried
+POST_KEYS_CACHE_SIZE = getattr(settings, 'POST_KEYS_CACHE_SIZE', 1000)
+# Tags returned by the tag cloud by default, and at most
+TAG_CLOUD_SIZE = getattr(settings, 'TAG_CLOUD_SIZE', 50)
+TAG_CLOUD_MAX_SIZE = getattr(settings, 'TAG_CLOUD_MAX_SIZE', 200)
+
+
+class BlogPostViewSet(ConditionalRetrieveMixin, ModelViewSet):
+    # load the author, category, tags and comments (with their authors) up front so serializing a page costs a fixed number of queries
+    queryset = BlogPost.objects.select_related('author', 'category').prefetch_related(
+        'tags',
+        Prefetch('comments', queryset=Comment.objects.select_related('author')),
+    )
     serializer_class = BlogPostSerializer
+    # actions returning many posts use the compact list representation
+    list_actions = {'list', 'posts_by_category', 'posts_by_author', 'most_liked', 'highest_rated', 'trending', 'related'}
+    pagination_class = PostCursorPagination # keyset pagination on (-published_date, id), no COUNT(*)
+    cache_kind = 'post' # detail responses carry an ETag and are cached per post version
+    post_keys_cache_size = POST_KEYS_CACHE_SIZE
 
     #ensure that only authenticated(logged-in) users can access these views and IsOwnerOrReadOnly restricts modification to the owner
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
 
     #filtering options
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter] # adds search, filter and ordering capabilities
+    filter_backends = [DjangoFilterBackend, PostSearchFilter, OrderingFilter] # adds search, filter and ordering capabilities
     filterset_class = BlogPostFilter
     filterset_fields = ['category', 'author', 'status', 'published_date']
     
-    #searching and ordering
-    search_fields = ['title', 'content', 'tags__name', 'author__username']
+    #searching (title, content, tag names and author username are indexed by the search backend) and ordering
     ordering_fields = ['published_date', 'title']
+    # filters that query while filtering (model choice validation, search); async views run them in a thread
+    querying_filter_params = {'category', 'author', 'search'}
+
+    def get_serializer_class(self):
+        if self.action in self.list_actions:
+            return BlogPostListSerializer
+        return BlogPostSerializer
+
+    #on reads, only query the columns and relations of the fields the serializer will output (see ?fields=)
+    def get_queryset(self):
+        if self.request.method not in SAFE_METHODS:
+            return super().get_queryset()
+        fields = self.get_serializer_class().selected_fields(self.request)
+
+        columns = set(POST_SORT_COLUMNS)
+        for name in fields:
+            columns.update(POST_FIELD_COLUMNS.get(name, (name,)))
+        columns.update(self.get_ordering_columns())
+
+        queryset = BlogPost.objects.only(*columns)
+        related = [name for name in ('author', 'category') if name in fields]
+        if related:
+            queryset = queryset.select_related(*related)
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'comments' in fields:
+            queryset = queryset.prefetch_related(Prefetch('comments', queryset=Comment.objects.select_related('author')))
+        return queryset
+
+    #JSON list pages are assembled from per-post JSON fragments cached by post version; only misses are serialized
+    #reads are written once for this view and the async read views (see api/reads.py)
+    def list(self, request, *args, **kwargs):
+        return run_read(self.list_read(request, *args, **kwargs))
+
+    def list_read(self, request, *args, **kwargs):
+        queryset = yield from filter_queryset_read(self, self.get_queryset())
+        if not self.uses_fragments():
+            page = yield from self.paginator.paginate_queryset_read(queryset, request)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        page = yield from self.paginator.paginate_queryset_read(self.id_page_queryset(queryset), request)
+        return (yield from self.page_response_read(page))
+
+    def uses_fragments(self):
+        return settings.POST_FRAGMENT_CACHE and self.request.accepted_renderer.format == 'json'
+
+    #respond with a page of posts of which only the ids are loaded
+    def page_response_read(self, page):
+        ids = [post.pk for post in page]
+        if self.uses_fragments():
+            return self.fragments_response((yield from self.cached_fragments_read(ids)))
+        posts = {post.pk: post for post in (yield self.get_queryset().filter(pk__in=ids))}
+        return self.get_paginated_response(self.get_serializer([posts[pk] for pk in ids if pk in posts], many=True).data)
+
+    def cached_fragments_read(self, ids):
+        return cached_fragments_read('post', ids, self.fragment_variant(),
+                                     lambda missing: self.get_queryset().filter(pk__in=missing), self.render_fragments)
+
+    #published posts of one author or category, paged from their cached (published date, id) list (see api/signals.py)
+    def published_page_read(self, kind, pk, queryset):
+        queryset = queryset.filter(BlogPost.PUBLISHED)
+        keys = yield from cached_sorted_keys_read(
+            kind, pk, self.paginator.sorted_keys_read(queryset, self.request, self.post_keys_cache_size))
+        page = self.paginator.paginate_keys(keys, queryset, self.request)
+        if page is None:
+            page = yield from self.paginator.paginate_queryset_read(self.id_page_queryset(queryset), self.request)
+        return page
+
+    #page over the sort columns only; full rows are loaded for cache misses alone
+    def id_page_queryset(self, queryset):
+        return queryset.select_related(None).prefetch_related(None).only(*POST_SORT_COLUMNS, *self.get_ordering_columns())
+
+    def fragment_variant(self):
+        fields = self.get_serializer_class().selected_fields(self.request)
+        return hashlib.md5(','.join(fields).encode('utf-8')).hexdigest()[:12]
+
+    def render_fragments(self, posts):
+        renderer = JSONRenderer()
+        data = self.get_serializer(posts, many=True).data
+        return {post.pk: renderer.render(item) for post, item in zip(posts, data)}
+
+    def fragments_response(self, fragments):
+        return HttpResponse(self.paginator.get_paginated_json(fragments), content_type='application/json')
+
+    def get_ordering_columns(self):
+        return [name.lstrip('-') for name in self.request.query_params.get('ordering', '').split(',')
+                if name.lstrip('-') in self.ordering_fields]
 
     #Override the perform_create method to automatically associate the post with the currently authenticated user
     def perform_create(self, serializer):
@@ -141,35 +286,31 @@ class BlogPostViewSet(ModelViewSet):
         instance.delete()#delete the post
 
 
-# Custom action to get blog posts filtered by category
-    @action(detail=False, methods=['get'], url_path='category/(?P<category_name>[^/.]+)')
-    def posts_by_category(self, request, category_name=None):
-        if not category_name:# Check if the category name is provided in the URL
-            raise ValidationError("Category name is required.") # Raise a validation error if missing
-        try:
-            category = Category.objects.get(name=category_name) #try to find the category by name
-        except Category.DoesNotExist:
-            raise NotFound("Category not found.")
-        
-        #Retrieve posts belonging to this category with optimized queries for author and tags
-        posts = BlogPost.objects.filter(category=category)
-        serializer = BlogPostSerializer(posts, many=True)
-        return Response(serializer.data)
+# Custom action to get the published blog posts of a category, newest first
+    @action(detail=False, methods=['get'], url_path='category/(?P<category_slug>[^/.]+)')
+    def posts_by_category(self, request, category_slug=None):
+        return run_read(self.posts_by_category_read(request, category_slug))
 
-#Custom action to get blog posts by a specific author
-    @action(detail=False, methods=['get'], url_path='author/(?P<author_username>[^/.]+)')
-    def posts_by_author(self, request, author_username=None):
-        if not author_username:
-            raise ValidationError("Author username is required.")
-        try:
-            author = User.objects.get(username=author_username)
-        except User.DoesNotExist:
+    def posts_by_category_read(self, request, category_slug=None):
+        category_id = yield Category.objects.filter(slug=category_slug).values_list('pk', flat=True), 'first'
+        if category_id is None:
+            raise NotFound("Category not found.")
+        queryset = self.get_queryset().filter(category_id=category_id)
+        page = yield from self.published_page_read('category-posts', category_id, queryset)
+        return (yield from self.page_response_read(page))
+
+#Custom action to get the published blog posts of a specific author, newest first
+    @action(detail=False, methods=['get'], url_path='author/(?P<author_slug>[^/.]+)')
+    def posts_by_author(self, request, author_slug=None):
+        return run_read(self.posts_by_author_read(request, author_slug))
+
+    def posts_by_author_read(self, request, author_slug=None):
+        author_id = yield User.objects.filter(slug=author_slug).values_list('pk', flat=True), 'first'
+        if author_id is None:
             raise NotFound("Author not found.")
-        
-        #retrieve posts by this author with optimized queries for category and tags
-        posts = BlogPost.objects.filter(author=author)
-        serializer = BlogPostSerializer(posts, many=True)
-        return Response(serializer.data)
+        queryset = self.get_queryset().filter(author_id=author_id)
+        page = yield from self.published_page_read('author-posts', author_id, queryset)
+        return (yield from self.page_response_read(page))
     
  
 # Custom action to like a blog post
@@ -177,12 +318,15 @@ class BlogPostViewSet(ModelViewSet):
     def like_post(self, request, pk=None):
         post = self.get_object()# Get post using the provided primary key(pk)
 
-        # Check if the user has already liked the post
-        if PostLike.objects.filter(user=request.user, post=post).exists():
+        #create a like record and bump the stored like count in the same transaction; the unique (user, post)
+        #constraint rejects a like the user already made, including one made concurrently, and rolls back the count
+        try:
+            with transaction.atomic():
+                PostLike.objects.create(user=request.user, post=post)
+                BlogPost.update_like_count(post.pk, 1)
+                record_like(post.pk)
+        except IntegrityError:
             return Response({"detail": "You already liked this post."}, status=status.HTTP_400_BAD_REQUEST)
-
-        #if the user hasn't like the post , create a like record
-        PostLike.objects.create(user=request.user, post=post)
         return Response({"detail": "Post liked successfully."}, status=status.HTTP_201_CREATED)
 # Custom action to rate a blog post
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
@@ -194,28 +338,74 @@ class BlogPostViewSet(ModelViewSet):
         if not rating_value or not (1 <= int(rating_value) <= 5):
             return Response({"detail": "Rating must be between 1 and 5."}, status=status.HTTP_400_BAD_REQUEST)
         
-        #update or create the rating record
-        rating, created = PostRating.objects.update_or_create(
-            user=request.user, post=post, defaults={'rating': rating_value})
+        rating_value = int(rating_value)
+
+        #update or create the rating record and adjust the stored rating totals by the difference
+        with transaction.atomic():
+            rating = PostRating.objects.select_for_update().filter(user=request.user, post=post).first()
+            if rating is None:
+                PostRating.objects.create(user=request.user, post=post, rating=rating_value)
+                BlogPost.update_rating_totals(post.pk, rating_value, 1)
+                record_rating(post.pk, rating_value)
+            elif rating.rating != rating_value:
+                previous = rating.rating
+                rating.rating = rating_value
+                rating.save(update_fields=['rating'])
+                BlogPost.update_rating_totals(post.pk, rating_value - previous, 0)
         return Response({"detail": f"Post rated successfully with {rating_value}."}, status=status.HTTP_200_OK)
 
 #custom action to check the average rating for each post
     @action(detail=False, methods=['get'])
     def most_liked(self, request):
-        #uses annotate to calculate the average rating for each post
-        # Orders posts by their average rating in descending order
-        most_liked_posts = BlogPost.objects.annotate(likes_count=models.Count('postlike')).order_by('-likes_count')
-        serializer = BlogPostSerializer(most_liked_posts, many=True)
-        return Response(serializer.data)
+        # Orders posts by their stored like count, paginated on the (-like_count, id) index
+        most_liked_posts = self.get_queryset().order_by('-like_count')
+        page = self.paginate_queryset(most_liked_posts)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 #custom action for value of how the blog post was rated
     @action(detail=False, methods=['get'])
     def highest_rated(self, request):
-        highest_rated_posts = BlogPost.objects.annotate(average_rating=models.Avg('postrating__rating')).order_by('-average_rating')
-        serializer = BlogPostSerializer(highest_rated_posts, many=True)
-        return Response(serializer.data)
+        # Orders posts by their stored average rating, paginated on the (-average_rating, id) index
+        highest_rated_posts = self.get_queryset().order_by('-average_rating')
+        page = self.paginate_queryset(highest_rated_posts)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
 
+#custom action for the posts with the most recent like and rating activity
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        window = request.query_params.get('window', '24h')
+        if window not in TRENDING_WINDOWS:
+            raise ValidationError(f"window must be one of: {', '.join(TRENDING_WINDOWS)}.")
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.paginator.page_size)), 1), TRENDING_MAX_RESULTS)
+        except ValueError:
+            raise ValidationError("limit must be an integer.")
+
+        # read the precomputed top-N and hydrate only those posts, keeping the ranking order
+        post_ids = top_post_ids(window, limit)
+        posts = self.get_queryset().in_bulk(post_ids)
+        serializer = self.get_serializer([posts[pk] for pk in post_ids if pk in posts], many=True)
+        return Response(serializer.data)
+
+# Custom action to get the most similar posts, precomputed by api/related.py, most similar first
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        try:
+            post_ids = related_post_ids(int(pk))
+        except ValueError:
+            raise NotFound("Post not found.")
+        if not post_ids and not BlogPost.objects.filter(pk=pk).exists():
+            raise NotFound("Post not found.")
+
+        if self.uses_fragments():
+            fragments = run_read(self.cached_fragments_read(post_ids))
+            return HttpResponse(b'[' + b','.join(fragments) + b']', content_type='application/json')
+        posts = self.get_queryset().in_bulk(post_ids)
+        return Response(self.get_serializer([posts[pk] for pk in post_ids if pk in posts], many=True).data)
+
 #custom action to share a post via email    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def share_post(self, request, pk=None):
@@ -226,33 +416,40 @@ class BlogPostViewSet(ModelViewSet):
         if not email:
             return Response({"detail": "Email is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            # Use Django's send_email function to send the post content via email
-            send_mail(
-                subject=f"Check out this blog post: {post.title}",
-                message=post.content,
-                from_email='no-reply@blog.com',
-                recipient_list=[email],
-            )
-            return Response({"detail": "Post shared successfully."}, status=status.HTTP_200_OK)
-
-        except Exception as e:# if there is an error while sending the email
-            return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
- 
+        #queue the email in the outbox; the outbox worker delivers it (see api/outbox.py)
+        queue_share_email(post, email, request.user)
+        return Response({"detail": "Post share queued."}, status=status.HTTP_202_ACCEPTED)
 
-class CategoryViewSet(ModelViewSet):
+
+class CategoryViewSet(ConditionalListMixin, ConditionalRetrieveMixin, ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_kind = 'category' # list and detail responses carry an ETag and are cached per version
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(ConditionalListMixin, ConditionalRetrieveMixin, ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_kind = 'tag' # list and detail responses carry an ETag and are cached per version
     permission_classes = [IsAuthenticated]  # Optional: Only allow authenticated users to create/edit tags.
 
+    # the most used tags by published post count, read in order from the post_count index
+    @action(detail=False, methods=['get'])
+    def cloud(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', TAG_CLOUD_SIZE)), 1), TAG_CLOUD_MAX_SIZE)
+        except ValueError:
+            raise ValidationError("limit must be an integer.")
+        # cached with the tag list, whose version every count change bumps
+        return self.versioned_response(
+            request, get_version(self.cache_kind), f'cloud:{limit}',
+            lambda: self.get_serializer(Tag.objects.filter(post_count__gt=0).order_by('-post_count', 'id')[:limit], many=True).data,
+        )
+
 class CommentViewSet(ModelViewSet):
     queryset = Comment.objects.all().select_related('author', 'post')  # Optimize with select_related
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CommentCursorPagination # keyset pagination on (-created_date, id), no COUNT(*)
 
 #assigns the currently authenticated user as the author of the comment
     def perform_create(self, serializer):
@@ -270,7 +467,49 @@ class CommentViewSet(ModelViewSet):
             raise PermissionDenied("You cannot delete another user's comment.")
         instance.delete()
 
+class NotificationViewSet(ReadOnlyModelViewSet):
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = NotificationCursorPagination # keyset pagination on (-created_at, id), no COUNT(*)
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['is_read']
+
+    #users only see their own notifications
+    def get_queryset(self):
+        return Notification.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        return run_read(self.list_read(request, *args, **kwargs))
+
+    def list_read(self, request, *args, **kwargs):
+        queryset = yield from filter_queryset_read(self, self.get_queryset())
+        page = yield from self.paginator.paginate_queryset_read(queryset, request)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+#number of unread notifications, served from a cached per-user counter
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        return run_read(self.unread_count_read(request))
+
+    def unread_count_read(self, request):
+        return Response({"unread_count": (yield from unread_count_read(request.user.pk))})
+
+#marks every unread notification up to and including `up_to` (or all of them) read in one UPDATE
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        up_to = request.data.get('up_to')
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                raise ValidationError("up_to must be a notification id.")
+        marked = mark_read(request.user.pk, up_to=up_to)
+        return Response({"marked_read": marked, "unread_count": unread_count(request.user.pk)})
+
 class UserLoginView(APIView):
+    permission_classes = [] # signing in must not require being signed in
+    throttle_classes = CREDENTIAL_THROTTLES # attempt counters per client IP and per email
+
     def post(self, request, *args, **kwargs):
         email = request.data.get("email")
         password = request.data.get("password")
@@ -279,13 +518,10 @@ class UserLoginView(APIView):
         if not email or not password:
             return Response({"detail": "Email and password are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return Response({"detail": "Invalid email or password."}, status=status.HTTP_401_UNAUTHORIZED)
+        user = User.objects.filter(email=email).first()
 
-        # Check the password
-        if not user.check_password(password):
+        # Check the password in the bounded hash pool; unknown emails are checked against a dummy hash so they take as long
+        if not verify_password(user, password):
             return Response({"detail": "Invalid email or password."}, status=status.HTTP_401_UNAUTHORIZED)
 
         # Generate and return the token
@@ -296,3 +532,52 @@ class UserLoginView(APIView):
             "access": access_token,
             "refresh": str(refresh)
         })
+
+
+class FeedView(APIView):
+    """
+    Home feed of published posts from the authors the user subscribes to, newest first.
+    Pass the `next` value of a page as `?before=` to fetch the following page.
+    """
+    permission_classes = [IsAuthenticated]
+    limit = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+    def get(self, request, *args, **kwargs):
+        return run_read(self.get_read(request, *args, **kwargs))
+
+    def get_read(self, request, *args, **kwargs):
+        posts, next_key = yield from timeline_read(request.user, self.limit, before=self.get_before(request))
+        return self.feed_response(request, posts, next_key)
+
+    #`before` is an opaque (published date, id) cursor, so posts sharing a date are split across pages without gaps
+    def get_before(self, request):
+        before = request.query_params.get('before')
+        if not before:
+            return None
+        try:
+            published_date, pk = decode_cursor(before)
+            published_date = parse_datetime(published_date)
+        except (TypeError, ValueError):
+            published_date = None
+        if published_date is None:
+            raise NotFound(KeysetPagination.invalid_cursor_message)
+        return published_date, pk
+
+    def feed_response(self, request, posts, next_key):
+        return Response({
+            'next': encode_cursor(*next_key) if next_key is not None else None,
+            'results': BlogPostListSerializer(posts, many=True, context={'request': request}).data,
+        })
+
+
+def avatar_file(request, path):
+    """
+    Serve a stored profile picture or thumbnail. Their names are content hashes, so a
+    response never changes and clients and proxies may cache it forever.
+    """
+    name = f'avatars/{path}'
+    if not default_storage.exists(name):
+        raise Http404("Image not found.")
+    response = FileResponse(default_storage.open(name), content_type=mimetypes.guess_type(name)[0])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,245 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now
+from django.utils.text import slugify
+from api.feed import FEED_PUSH_MAX_SUBSCRIBERS, FEED_BACKFILL_SIZE
+from blog.models import (
+    BlogPost, Category, Tag, Comment, PostLike, PostRating, AuthorSubscription, TimelineEntry, render_content,
+)
+
+User = get_user_model()
+
+WORDS = (
+    'django api cache query index latency python thread async request response server client database '
+    'table row column page cursor token user author post comment tag category feed search rank score '
+    'render markdown template view model field signal worker queue batch stream memory profile benchmark '
+    'deploy release review test debug trace metric throughput bottleneck schema migration replica pool '
+    'the a of and to in is for on with as it that this by from at be are was we can will not but'
+).split()
+# relative frequency of 1 to 5 star ratings
+RATING_WEIGHTS = (1, 1, 2, 4, 3)
+
+
+def zipf_cum_weights(count, exponent):
+    """
+    Cumulative weights of a Zipf distribution over `count` ranks, for random.choices.
+    """
+    total = 0.0
+    cum_weights = []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+class Command(BaseCommand):
+    """
+    Generate a synthetic dataset for benchmarks with bulk_create: users, Markdown posts,
+    Zipf-distributed authors, categories, tags, subscriptions, likes, ratings and comments.
+
+    Rows are inserted directly, so the derived data that signals and save() would maintain
+    (rendered HTML, counters, post counts, timelines, the search index and related posts) is written by the command too.
+    """
+    help = "Generate a synthetic benchmark dataset."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--max-tags-per-post', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int, default=20)
+        parser.add_argument('--likes', type=int, default=50000)
+        parser.add_argument('--ratings', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent for author, tag and post popularity.")
+        parser.add_argument('--published-ratio', type=float, default=0.9)
+        parser.add_argument('--prefix', default='bench', help="Prefix of generated emails, usernames, categories and tags.")
+        parser.add_argument('--password', default='password', help="Password of every generated user.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.zipf = options['zipf']
+        prefix = options['prefix']
+        if User.objects.filter(email__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Users with the prefix '{prefix}' already exist; pass another --prefix.")
+
+        with transaction.atomic():
+            user_ids = self.create_users(prefix, options['users'], options['password'])
+            category_ids = self.create_named(Category, f'{prefix}-category', options['categories'])
+            tag_ids = self.create_named(Tag, f'{prefix}-tag', options['tags'])
+            posts = self.create_posts(options, user_ids, category_ids)
+            self.create_post_tags(posts, tag_ids, options['max_tags_per_post'])
+            subscriptions = self.create_subscriptions(user_ids, options['subscriptions_per_user'])
+            self.create_timelines(subscriptions, posts)
+
+        # bulk_create skips the signals counting the published posts of categories and tags
+        call_command('reconcile_category_tag_counts', batch_size=self.batch_size, stdout=self.stdout)
+        call_command('rebuild_search_index', batch_size=self.batch_size, stdout=self.stdout)
+        call_command('rebuild_related_posts', batch_size=self.batch_size, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(user_ids)} users, {len(posts)} posts, {len(subscriptions)} subscriptions, "
+            f"{options['likes']} likes, {options['ratings']} ratings and {options['comments']} comments (at most)."))
+
+    def sample(self, population, count, cum_weights=None):
+        return self.rng.choices(population, cum_weights=cum_weights, k=count)
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def create_users(self, prefix, count, password):
+        hashed = make_password(password) # hashing once keeps generation fast; every user shares the password
+        User.objects.bulk_create(
+            [User(email=f'{prefix}-{i}@example.com', username=f'{prefix}-{i}', slug=slugify(f'{prefix}-{i}'), password=hashed, bio=self.words(12))
+             for i in range(count)],
+            batch_size=self.batch_size,
+        )
+        # re-read the ids, since not every database returns them from bulk_create
+        return list(User.objects.filter(email__startswith=f'{prefix}-').order_by('pk').values_list('pk', flat=True))
+
+    def create_named(self, model, prefix, count):
+        # bulk_create skips save(), so models with a slug get the one save() would derive from the name
+        slugged = any(field.name == 'slug' for field in model._meta.fields)
+        model.objects.bulk_create([model(name=f'{prefix}-{i}', **({'slug': slugify(f'{prefix}-{i}')} if slugged else {}))
+                                   for i in range(count)], batch_size=self.batch_size)
+        return list(model.objects.filter(name__startswith=f'{prefix}-').order_by('pk').values_list('pk', flat=True))
+
+    def markdown_body(self):
+        paragraphs = [self.words(self.rng.randint(40, 120)) + '.' for _ in range(self.rng.randint(2, 8))]
+        return '\n\n'.join([f'# {self.words(5).title()}', *paragraphs, f'- {self.words(4)}\n- {self.words(4)}'])
+
+    def create_posts(self, options, user_ids, category_ids):
+        """
+        Insert the posts with their likes, ratings and comments, storing the counters those imply.
+        Returns [(post id, author id, published date)] in insertion order.
+        """
+        count = options['posts']
+        # a fixed set of bodies, each rendered once, keeps generation fast
+        bodies = [(body, render_content(body)) for body in (self.markdown_body() for _ in range(min(count, 50)))]
+        author_ids = self.sample(user_ids, count, zipf_cum_weights(len(user_ids), self.zipf))
+        categories = self.sample(category_ids, count, zipf_cum_weights(len(category_ids), self.zipf)) if category_ids else [None] * count
+        current = now()
+
+        # post popularity follows a Zipf distribution over a random ranking of the posts
+        ranking = list(range(count))
+        self.rng.shuffle(ranking)
+        popular = zipf_cum_weights(count, self.zipf)
+        likes = {(user, post) for user, post in zip(self.sample(user_ids, options['likes']),
+                                                    self.sample(ranking, options['likes'], popular))}
+        ratings = {}
+        for user, post in zip(self.sample(user_ids, options['ratings']), self.sample(ranking, options['ratings'], popular)):
+            ratings[(user, post)] = self.rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0]
+        comments = list(zip(self.sample(user_ids, options['comments']), self.sample(ranking, options['comments'], popular)))
+
+        like_counts = [0] * count
+        rating_sums = [0] * count
+        rating_counts = [0] * count
+        comment_counts = [0] * count
+        for _, post in likes:
+            like_counts[post] += 1
+        for (_, post), rating in ratings.items():
+            rating_sums[post] += rating
+            rating_counts[post] += 1
+        for _, post in comments:
+            comment_counts[post] += 1
+
+        posts = []
+        for i in range(count):
+            body, rendered = self.rng.choice(bodies)
+            published = self.rng.random() < options['published_ratio']
+            posts.append(BlogPost(
+                title=self.words(self.rng.randint(3, 8)).capitalize(),
+                content=body,
+                author_id=author_ids[i],
+                category_id=categories[i],
+                status='published' if published else 'draft',
+                published_date=current - timedelta(seconds=self.rng.randint(0, 365 * 86400)) if published else None,
+                like_count=like_counts[i],
+                rating_sum=rating_sums[i],
+                rating_count=rating_counts[i],
+                average_rating=rating_sums[i] / rating_counts[i] if rating_counts[i] else None,
+                comment_count=comment_counts[i],
+                **rendered,
+            ))
+        BlogPost.objects.bulk_create(posts, batch_size=self.batch_size)
+        # every post of the new users is new, in insertion order
+        rows = list(BlogPost.objects.filter(author_id__in=set(author_ids)).order_by('pk')
+                    .values_list('pk', 'author_id', 'published_date'))
+        post_ids = [pk for pk, _, _ in rows]
+
+        PostLike.objects.bulk_create([PostLike(user_id=user, post_id=post_ids[post]) for user, post in likes],
+                                     batch_size=self.batch_size)
+        PostRating.objects.bulk_create([PostRating(user_id=user, post_id=post_ids[post], rating=rating)
+                                        for (user, post), rating in ratings.items()], batch_size=self.batch_size)
+        Comment.objects.bulk_create([Comment(author_id=user, post_id=post_ids[post], content=self.words(self.rng.randint(5, 40)))
+                                     for user, post in comments], batch_size=self.batch_size)
+        return rows
+
+    def create_post_tags(self, posts, tag_ids, max_tags):
+        if not tag_ids:
+            return
+        Through = BlogPost.tags.through
+        cum_weights = zipf_cum_weights(len(tag_ids), self.zipf)
+        rows = []
+        for post_id, _, _ in posts:
+            for tag_id in set(self.sample(tag_ids, self.rng.randint(0, max_tags), cum_weights)):
+                rows.append(Through(blogpost_id=post_id, tag_id=tag_id))
+        Through.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def create_subscriptions(self, user_ids, per_user):
+        """
+        Subscribe every user to authors picked with Zipf popularity, so a few authors have most subscribers.
+        """
+        cum_weights = zipf_cum_weights(len(user_ids), self.zipf)
+        subscriptions = set()
+        for user_id in user_ids:
+            for author_id in self.sample(user_ids, per_user, cum_weights):
+                if author_id != user_id:
+                    subscriptions.add((user_id, author_id))
+        AuthorSubscription.objects.bulk_create(
+            [AuthorSubscription(user_id=user_id, author_id=author_id) for user_id, author_id in subscriptions],
+            batch_size=self.batch_size,
+        )
+        # bulk_create skips the signals counting each author's subscribers
+        authors_by_count = {}
+        for author_id, count in Counter(author_id for _, author_id in subscriptions).items():
+            authors_by_count.setdefault(count, []).append(author_id)
+        for count, author_ids in authors_by_count.items():
+            for start in range(0, len(author_ids), self.batch_size):
+                User.objects.filter(pk__in=author_ids[start:start + self.batch_size]).update(subscriber_count=count)
+        return subscriptions
+
+    def create_timelines(self, subscriptions, posts):
+        """
+        Fill the timelines the way backfill_timeline would: each author's latest published posts, for
+        every author small enough to push to subscribers (the others are merged in at read time).
+        """
+        latest = {}
+        published = sorted((row for row in posts if row[2] is not None), key=lambda row: row[2], reverse=True)
+        for post_id, author_id, published_date in published:
+            if len(latest.setdefault(author_id, [])) < FEED_BACKFILL_SIZE:
+                latest[author_id].append((post_id, published_date))
+
+        subscriber_counts = {}
+        for _, author_id in subscriptions:
+            subscriber_counts[author_id] = subscriber_counts.get(author_id, 0) + 1
+
+        entries = []
+        for user_id, author_id in subscriptions:
+            if subscriber_counts[author_id] > FEED_PUSH_MAX_SUBSCRIBERS:
+                continue
+            entries.extend(TimelineEntry(user_id=user_id, post_id=post_id, published_date=published_date)
+                           for post_id, published_date in latest.get(author_id, ()))
+            if len(entries) >= self.batch_size:
+                TimelineEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+                entries = []
+        TimelineEntry.objects.bulk_create(entries, batch_size=self.batch_size)
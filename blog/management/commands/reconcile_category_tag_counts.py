@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+from api.caching import bump_versions
+from blog.models import BlogPost, Category, Tag
+
+
+class Command(BaseCommand):
+    """
+    Recount the published posts of every category and tag and repair the ones whose
+    stored post_count drifted (e.g. after posts were changed with queryset updates).
+    """
+    help = "Repair drift in the published post counts of categories and tags."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of rows repaired per transaction.")
+
+    def handle(self, *args, **options):
+        repaired = {}
+        for model, field, kind in ((Category, 'category', 'category'), (Tag, 'tags', 'tag')):
+            counts = Subquery(
+                BlogPost.objects.filter(BlogPost.PUBLISHED, **{field: OuterRef('pk')}).order_by().values(field)
+                .annotate(total=Count('pk')).values('total'),
+                output_field=IntegerField(),
+            )
+            drifted = (model.objects.order_by('pk').annotate(actual=Coalesce(counts, 0))
+                       .exclude(post_count=F('actual')).values_list('pk', 'actual'))
+
+            repaired[kind] = 0
+            batch = []
+            for row in drifted.iterator(chunk_size=options['batch_size']):
+                batch.append(row)
+                if len(batch) >= options['batch_size']:
+                    repaired[kind] += self.repair(model, kind, batch)
+                    batch = []
+            if batch:
+                repaired[kind] += self.repair(model, kind, batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired {repaired['category']} category(s) and {repaired['tag']} tag(s)."))
+
+    def repair(self, model, kind, rows):
+        with transaction.atomic():
+            model.objects.bulk_update([model(pk=pk, post_count=count) for pk, count in rows], ['post_count'])
+            bump_versions(kind, [pk for pk, _ in rows] + ['list']) # bulk_update sends no signals
+        return len(rows)
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import Count, Sum, F, OuterRef, Subquery, Q, IntegerField
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+from api.caching import bump_versions
+from blog.models import BlogPost, Comment, PostLike, PostRating
+
+
+class Command(BaseCommand):
+    """
+    Recount likes, ratings and comments from their tables and repair every blog post
+    whose stored like_count, rating_sum, rating_count or comment_count drifted.
+    """
+    help = "Repair drift in the denormalized like, rating and comment counters on blog posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of posts repaired per transaction.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        def aggregate(model, expression):
+            return Coalesce(Subquery(
+                model.objects.filter(post=OuterRef('pk')).order_by().values('post')
+                .annotate(total=expression).values('total'),
+                output_field=IntegerField(),
+            ), 0)
+
+        drifted = (BlogPost.objects.order_by('pk')
+                   .annotate(actual_likes=aggregate(PostLike, Count('pk')),
+                             actual_rating_sum=aggregate(PostRating, Sum('rating')),
+                             actual_rating_count=aggregate(PostRating, Count('pk')),
+                             actual_comments=aggregate(Comment, Count('pk')))
+                   .filter(~Q(like_count=F('actual_likes'))
+                           | ~Q(rating_sum=F('actual_rating_sum'))
+                           | ~Q(rating_count=F('actual_rating_count'))
+                           | ~Q(comment_count=F('actual_comments')))
+                   .values_list('pk', 'actual_likes', 'actual_rating_sum', 'actual_rating_count', 'actual_comments'))
+
+        repaired = 0
+        batch = []
+        for row in drifted.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                repaired += self.repair(batch)
+                batch = []
+        if batch:
+            repaired += self.repair(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} post(s)."))
+
+    def repair(self, rows):
+        posts = [
+            BlogPost(pk=pk, like_count=likes, rating_sum=rating_sum, rating_count=rating_count,
+                     average_rating=rating_sum / rating_count if rating_count else None, comment_count=comments)
+            for pk, likes, rating_sum, rating_count, comments in rows
+        ]
+        with transaction.atomic():
+            BlogPost.objects.bulk_update(posts, BlogPost.COUNTER_FIELDS)
+            bump_versions('post', [post.pk for post in posts]) # bulk_update sends no signals
+        return len(posts)
@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import django
+from django.core.management.base import BaseCommand
+from api.caching import bump_versions
+from blog.models import BlogPost, MARKDOWN_RENDER_VERSION, render_content, content_digest
+
+
+def _render_batch(batch):
+    """
+    Render a batch of (id, content) pairs. Runs in a worker process so it only touches plain data.
+    """
+    return [(post_id, render_content(content)) for post_id, content in batch]
+
+
+class Command(BaseCommand):
+    """
+    Re-render the stored HTML of every blog post whose content changed or
+    whose render_version is older than the current MARKDOWN_RENDER_VERSION.
+    """
+    help = "Bulk re-render stale Markdown for blog posts in parallel batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of posts rendered per batch.")
+        parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (defaults to CPU count).")
+        parser.add_argument('--force', action='store_true', help="Re-render every post, even if it is up to date.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        force = options['force']
+        workers = options['workers'] or os.cpu_count() or 1
+
+        updated = 0
+        # workers started with spawn (macOS, Windows) import blog.models, which needs the app registry
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            # a couple of batches per worker in flight, so only those batches' content is held in memory
+            pending = set()
+            for batch in self._stale_batches(batch_size, force):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    updated += self._save(done)
+                pending.add(executor.submit(_render_batch, batch))
+            updated += self._save(pending)
+
+        self.stdout.write(self.style.SUCCESS(f"Re-rendered {updated} post(s)."))
+
+    def _save(self, futures):
+        """
+        Store the rendered fields of finished batches; returns the number of posts saved.
+        """
+        saved = 0
+        for future in futures:
+            posts = [BlogPost(id=post_id, **rendered) for post_id, rendered in future.result()]
+            # bulk_update skips save() so the content is not re-rendered a second time
+            BlogPost.objects.bulk_update(posts, BlogPost.RENDERED_FIELDS)
+            bump_versions('post', [post.pk for post in posts]) # bulk_update sends no signals
+            saved += len(posts)
+        return saved
+
+    def _stale_batches(self, batch_size, force):
+        """
+        Walk the table in primary key order and yield batches of (id, content) that need rendering.
+        Each chunk is its own query after the last id seen, so no cursor stays open while batches are saved.
+        """
+        last_id = 0
+        batch = []
+        while True:
+            rows = list(BlogPost.objects.filter(pk__gt=last_id).order_by('pk')
+                        .values_list('id', 'content', 'content_hash', 'render_version')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for post_id, content, digest, version in rows:
+                if force or version != MARKDOWN_RENDER_VERSION or digest != content_digest(content):
+                    batch.append((post_id, content))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        if batch:
+            yield batch
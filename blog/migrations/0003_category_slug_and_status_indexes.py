@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-17 23:02
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def fill_slugs(apps, schema_editor):
+    # the historical model has no save() override, so the slugs are derived here as users.models.slug_base does
+    Category = apps.get_model('blog', 'Category')
+    taken = set()
+    categories = list(Category.objects.order_by('pk'))
+    for category in categories:
+        base = slugify(category.name)[:50].strip('-') or 'category'
+        slug, suffix = base, 1
+        while slug in taken:
+            suffix += 1
+            slug = f'{base}-{suffix}'
+        taken.add(slug)
+        category.slug = slug
+    Category.objects.bulk_update(categories, ['slug'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_post_excerpt_and_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(db_index=False, default='', editable=False, max_length=60),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(editable=False, max_length=60, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['author', 'status', '-published_date', 'id'], name='blogpost_author_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['category', 'status', '-published_date', 'id'], name='blogpost_cat_status_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-17 21:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_posts(apps, schema_editor):
+    # the same counts reconcile_category_tag_counts computes, for the rows that exist already
+    published = apps.get_model('blog', 'BlogPost').objects.filter(status='published', published_date__isnull=False)
+    for model, field in ((apps.get_model('blog', 'Category'), 'category'), (apps.get_model('blog', 'Tag'), 'tags')):
+        counts = Subquery(published.filter(**{field: OuterRef('pk')}).order_by().values(field)
+                          .annotate(total=Count('pk')).values('total'), output_field=IntegerField())
+        model.objects.update(post_count=Coalesce(counts, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_category_slug_and_status_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-post_count', 'id'], name='tag_post_count_idx'),
+        ),
+        migrations.RunPython(count_posts, migrations.RunPython.noop),
+    ]
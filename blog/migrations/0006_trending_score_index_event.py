@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_related_posts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='trendingscore',
+            name='trending_window_score_idx',
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['window', '-score', 'last_event_at'], name='trending_window_score_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:13
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def release_dedup_keys(apps, schema_editor):
+    # only emails waiting to be sent keep their key; of concurrent duplicates the first one keeps it
+    EmailOutbox = apps.get_model('blog', 'EmailOutbox')
+    EmailOutbox.objects.exclude(status__in=['pending', 'sending']).update(dedup_key=None)
+    first_ids = (EmailOutbox.objects.exclude(dedup_key=None).values('dedup_key').order_by()
+                 .annotate(first_id=Min('pk')).values_list('first_id', flat=True))
+    EmailOutbox.objects.exclude(dedup_key=None).exclude(pk__in=list(first_ids)).update(dedup_key=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_trending_score_index_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='dedup_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(release_dedup_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='emailoutbox',
+            constraint=models.UniqueConstraint(fields=('dedup_key',), name='outbox_unique_dedup_key'),
+        ),
+    ]
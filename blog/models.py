@@ -1,29 +1,105 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Cast
 from django.contrib.auth import get_user_model
 from django.utils.timezone import now
 from django.conf import settings
+import hashlib
+import math
 import markdown
+from django.utils.html import strip_tags
 from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+from users.models import save_with_slug
 
 #retrieve the user model defined in AUTH_USER_MODEL
 User = get_user_model()
 
+# Bump MARKDOWN_RENDER_VERSION in settings whenever the renderer config changes so stored HTML is re-rendered
+MARKDOWN_RENDER_VERSION = getattr(settings, 'MARKDOWN_RENDER_VERSION', 2)
+MARKDOWN_EXTENSIONS = getattr(settings, 'MARKDOWN_EXTENSIONS', [])
+# Length of the stored excerpt in words, and the reading speed used for reading_time
+EXCERPT_WORDS = getattr(settings, 'EXCERPT_WORDS', 50)
+WORDS_PER_MINUTE = getattr(settings, 'WORDS_PER_MINUTE', 200)
+
+
+def render_markdown(content):
+    """
+    Render Markdown source into HTML using the configured extensions.
+    Timed as 'markdown' in request timings by the api app (see ApiConfig.ready).
+    """
+    return markdown.markdown(content, extensions=MARKDOWN_EXTENSIONS)
+
+
+def content_digest(content):
+    """
+    Return the sha256 hex digest used to detect changes to the Markdown source.
+    """
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def render_content(content):
+    """
+    Build every stored field derived from the Markdown source: the HTML, its hash and
+    renderer version, and the plain-text excerpt, word count and reading time (minutes).
+    """
+    html = render_markdown(content)
+    text = strip_tags(html)
+    word_count = len(text.split())
+    return {
+        'content_html': html,
+        'content_hash': content_digest(content),
+        'render_version': MARKDOWN_RENDER_VERSION,
+        'excerpt': Truncator(text).words(EXCERPT_WORDS),
+        'word_count': word_count,
+        'reading_time': max(1, math.ceil(word_count / WORDS_PER_MINUTE)),
+    }
+
+class PostCounted(models.Model):
+    """
+    Rows that posts are filed under, storing how many published posts they have. The count is
+    maintained with atomic F() updates by the signals in api/signals.py (see
+    reconcile_category_tag_counts to repair drift).
+    """
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def update_post_counts(cls, pks, delta):
+        """
+        Atomically add delta to the post count of every listed row.
+        """
+        # never take a drifted count below zero
+        cls.objects.filter(pk__in=pks, post_count__gte=-delta).update(post_count=F('post_count') + delta)
+
+
 # Organizes blog posts into categories with a unique name
-class Category(models.Model):
+class Category(PostCounted):
     name = models.CharField(max_length=50, unique=True)
+    # URL-safe handle for category pages, kept in step with the name (see save_with_slug)
+    slug = models.SlugField(max_length=60, unique=True, editable=False)
+    slug_source = ('name',)
 
     class Meta:
         ordering = ['name'] #categories are displayed in alphabetical order
 
+    def save(self, *args, **kwargs):
+        save_with_slug(self, self.name, super().save, args, kwargs)
+
     def __str__(self):
         return self.name
 
 #optional for labelling blog posts with a unique name  
-class Tag(models.Model):
+class Tag(PostCounted):
     name = models.CharField(max_length=50, unique=True)
 
     class Meta:
         ordering = ['name'] # Tags are displayed in alphabetical order
+        indexes = [
+            models.Index(fields=['-post_count', 'id'], name='tag_post_count_idx'), # the tag cloud
+        ]
 
     def __str__(self):
         return self.name
@@ -44,15 +120,104 @@ class BlogPost(models.Model):
     created_date = models.DateTimeField(auto_now_add=True) #Auto-set on creation
     tags = models.ManyToManyField(Tag, blank=True)# tags associated with the post
     status = models.CharField(max_length=10,choices=STATUS_CHOICES, default='draft')
+    # the posts that are public: listed by author and category and counted in their post counts
+    PUBLISHED = Q(status='published', published_date__isnull=False)
+
+    # Rendered HTML stored next to the source, tagged with the hash and renderer version it was built from
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    render_version = models.PositiveIntegerField(default=0, editable=False)
+    # plain-text summary stored with the HTML so list pages never carry the full body
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveIntegerField(default=1, editable=False) # minutes
+
+    # like/rating aggregates maintained with atomic F() updates (see reconcile_post_counters to repair drift)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(null=True, blank=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
 
+    @property
+    def is_published(self):
+        return self.status == 'published' and self.published_date is not None
+
     @property
     def content_as_html(self):
         """
-        convert Markdown content of the blog post into HTML for safe rendering
+        convert Markdown content of the blog post into HTML for safe rendering.
+        Serves the stored HTML and only renders on the fly if it is stale.
+        """
+        if self.is_render_stale():
+            return mark_safe(render_markdown(self.content))
+        return mark_safe(self.content_html)
+
+    def is_render_stale(self):
+        """
+        True when the stored HTML was built from different content or an older renderer config.
+        """
+        return (self.render_version != MARKDOWN_RENDER_VERSION
+                or self.content_hash != content_digest(self.content))
+
+    def refresh_rendered_content(self):
+        """
+        Re-render the stored HTML, excerpt and reading stats if they are stale.
+        Returns True when the fields were updated.
         """
-        return mark_safe(markdown.markdown(self.content))
+        if not self.is_render_stale():
+            return False
+        for name, value in render_content(self.content).items():
+            setattr(self, name, value)
+        return True
+
+    # columns only ever written with F() updates, so a regular save() must not overwrite them with stale values
+    COUNTER_FIELDS = ('like_count', 'rating_sum', 'rating_count', 'average_rating', 'comment_count')
+    # columns written by refresh_rendered_content
+    RENDERED_FIELDS = ('content_html', 'content_hash', 'render_version', 'excerpt', 'word_count', 'reading_time')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        # re-render only when the content or renderer config changed
+        if self.refresh_rendered_content():
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.RENDERED_FIELDS)
+        super().save(*args, **kwargs)
     
+    @classmethod
+    def update_like_count(cls, post_id, delta):
+        """
+        Atomically add delta (1 or -1) to the post's like count.
+        """
+        # never take a drifted counter below zero; reconcile_post_counters repairs it
+        cls.objects.filter(pk=post_id, like_count__gte=-delta).update(like_count=F('like_count') + delta)
+
+    @classmethod
+    def update_comment_count(cls, post_id, delta):
+        """
+        Atomically add delta (1 or -1) to the post's comment count.
+        """
+        cls.objects.filter(pk=post_id, comment_count__gte=-delta).update(comment_count=F('comment_count') + delta)
+
+    @classmethod
+    def update_rating_totals(cls, post_id, sum_delta, count_delta):
+        """
+        Atomically adjust the rating sum and count, then recompute the stored average.
+        Call inside a transaction so both statements apply together.
+        """
+        posts = cls.objects.filter(pk=post_id)
+        posts.filter(rating_sum__gte=-sum_delta, rating_count__gte=-count_delta).update(
+            rating_sum=F('rating_sum') + sum_delta, rating_count=F('rating_count') + count_delta)
+        posts.filter(rating_count__gt=0).update(
+            average_rating=Cast('rating_sum', models.FloatField()) / F('rating_count'))
+        posts.filter(rating_count=0).update(average_rating=None)
+
     def publish(self):
         """
         Publish the post by setting its status to 'published' 
@@ -64,6 +229,18 @@ class BlogPost(models.Model):
 
     class Meta:
         ordering = ['-published_date'] # Display the most recent posts first
+        indexes = [
+            # hot listing paths: newest first overall, by status, by author and by category
+            models.Index(fields=['-published_date', 'id'], name='blogpost_pub_idx'),
+            models.Index(fields=['status', '-published_date', 'id'], name='blogpost_status_pub_idx'),
+            models.Index(fields=['author', '-published_date', 'id'], name='blogpost_author_pub_idx'),
+            models.Index(fields=['category', '-published_date', 'id'], name='blogpost_category_pub_idx'),
+            # published posts of one author or category, in page order (posts_by_author, posts_by_category)
+            models.Index(fields=['author', 'status', '-published_date', 'id'], name='blogpost_author_status_idx'),
+            models.Index(fields=['category', 'status', '-published_date', 'id'], name='blogpost_cat_status_idx'),
+            models.Index(fields=['-like_count', 'id'], name='blogpost_like_count_idx'),
+            models.Index(fields=['-average_rating', 'id'], name='blogpost_avg_rating_idx'),
+        ]
 
 
     def __str__(self):
@@ -78,6 +255,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_date'] #Display the most recent comments first
+        indexes = [
+            models.Index(fields=['post', '-created_date', 'id'], name='comment_post_created_idx'),
+            models.Index(fields=['-created_date', 'id'], name='comment_created_idx'),
+        ]
 
 
     def __str__(self):
@@ -132,6 +313,107 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at', 'id'], name='notification_inbox_idx'),
+            models.Index(fields=['user', '-created_at', 'id'], name='notification_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.user.username} - Read: {self.is_read}"
+
+# per-user home timeline filled when a followed author publishes (fan-out on write)
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='timeline_entries')
+    published_date = models.DateTimeField() # copied from the post so a page is a single index range scan
+
+    class Meta:
+        unique_together = ('user', 'post') # a post appears once per timeline
+        ordering = ['-published_date', '-post']
+        indexes = [
+            models.Index(fields=['user', '-published_date', '-post'], name='timeline_user_published_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.user_id}"
+
+
+# decayed like/rating activity per post and trending window, updated incrementally as events arrive
+class TrendingScore(models.Model):
+    WINDOW_CHOICES = (
+        ('1h', 'Last hour'),
+        ('24h', 'Last 24 hours'),
+        ('7d', 'Last 7 days'),
+    )
+
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='trending_scores')
+    window = models.CharField(max_length=3, choices=WINDOW_CHOICES)
+    score = models.FloatField() # log of the decayed event weight, comparable across posts at any moment
+    last_event_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('post', 'window') # one score per post and window
+        ordering = ['-score']
+        indexes = [
+            # the leaderboard walks a window by score and skips rows whose last event left the window (until
+            # prune deletes them), so last_event_at is in the index and stale rows are rejected without reading the table
+            models.Index(fields=['window', '-score', 'last_event_at'], name='trending_window_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} trending {self.window}: {self.score}"
+
+
+# the precomputed most similar published posts of each published post (see api/related.py)
+class RelatedPost(models.Model):
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField() # 0 for the most similar
+
+    class Meta:
+        unique_together = ('post', 'related')
+        ordering = ['post', 'rank']
+        indexes = [
+            models.Index(fields=['post', 'rank'], name='relatedpost_post_rank_idx'), # the whole list in one range scan
+        ]
+
+    def __str__(self):
+        return f"Post {self.related_id} related to post {self.post_id}: {self.score}"
+
+
+# emails queued by the API and delivered in batches by the outbox worker (see send_outbox)
+class EmailOutbox(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    post = models.ForeignKey(BlogPost, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_emails')
+    sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_emails')
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    # set while the email waits to be sent and cleared once it is sent or has failed, so identical shares queue once
+    dedup_key = models.CharField(max_length=64, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now) # when a pending email is due, or a claimed one may be retried
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+        constraints = [
+            # unique among the NULLs of finished emails on every database, without a partial index
+            models.UniqueConstraint(fields=['dedup_key'], name='outbox_unique_dedup_key'),
+        ]
 
     def __str__(self):
-        return f"Notification for {self.user.username} - Read: {self.is_read}"
\ No newline at end of file
+        return f"Email to {self.recipient} ({self.status})"
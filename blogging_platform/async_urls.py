@@ -0,0 +1,11 @@
+"""
+URL configuration for ASGI requests, set by api.async_views.AsyncReadViewsMiddleware: the read
+endpoints of api.urls served by native async views, then every route of ROOT_URLCONF.
+"""
+from django.urls import path, include
+from api.urls import async_urlpatterns
+from .urls import urlpatterns as root_urlpatterns
+
+urlpatterns = [
+    path('api/', include(async_urlpatterns)),
+] + root_urlpatterns
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware', # first, so its total covers the whole request
+    'api.replicas.ReplicaRoutingMiddleware', # picks the database the request reads from
+    'api.async_views.AsyncReadViewsMiddleware', # ASGI only: routes the read endpoints to native async views
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,15 +92,29 @@ WSGI_APPLICATION = 'blogging_platform.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # django.db.backends.mysql with a per-process connection pool (see api/mysql_pool/base.py)
+        'ENGINE': 'api.mysql_pool',
         'NAME': 'blogging_platform',
         'USER': 'jacinta25',
         'PASSWORD': 'condition2030.KE',
         'HOST': 'localhost',
         'PORT': '3306',
+        'CONN_MAX_AGE': 0,  # connections go back to the pool at the end of each request
+        'OPTIONS': {
+            # max_size per process: keep (processes x max_size) under MySQL's max_connections
+            'pool': {'max_size': 10, 'timeout': 10, 'max_lifetime': 3600, 'max_idle': 600},
+        },
     }
 }
 
+# Read replicas for safe-method requests (see api/replicas.py). Add each replica to DATABASES
+# (with 'TEST': {'MIRROR': 'default'}) and list it here with its share of the reads, e.g. {'replica': 1}.
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+DATABASE_REPLICAS = {}
+REPLICA_STICKY_SECONDS = 10  # clients read from the primary this long after they write
+REPLICA_PIN_CACHE_ALIAS = 'shared'  # bearer-token clients are pinned in the cache every worker reads
+REPLICA_MAX_LAG = 5  # seconds; replicas further behind are skipped until they catch up
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -143,13 +162,21 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # attempts allowed in any sliding period for sign-in, /token/ and register (see api/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'login_email': '5/min',
+    },
+    # reverse proxies in front of the app whose X-Forwarded-For entries are trusted for client IPs;
+    # 0 uses REMOTE_ADDR. Set it to the number of proxies when deploying behind a load balancer.
+    'NUM_PROXIES': 0,
 }
 
 
@@ -169,3 +196,107 @@ SECURE_HSTS_PRELOAD = True
 CSRF_COOKIE_SECURE = True  # Use secure cookies for CSRF protection
 SESSION_COOKIE_SECURE = True  # Use secure cookies for session management
 
+# Bump when the Markdown renderer config changes so stored post HTML is re-rendered (see rerender_posts)
+MARKDOWN_RENDER_VERSION = 2
+MARKDOWN_EXTENSIONS = []
+
+# Subscriber notification fan-out: chunk size for bulk_create and whether it runs on the background worker
+NOTIFICATION_CHUNK_SIZE = 1000
+NOTIFICATION_FANOUT_ASYNC = True
+# Unread notification counters: kept in the shared cache and recounted after UNREAD_COUNT_TIMEOUT seconds,
+# which bounds how long a counter can stay wrong after an update it missed
+NOTIFICATION_CACHE_ALIAS = 'shared'
+UNREAD_COUNT_TIMEOUT = 60 * 60
+# Jobs queued for the in-process background worker (see api/background.py) run inline under `manage.py test`,
+# so they finish before assertions and never touch the test database from another thread
+BACKGROUND_JOBS_INLINE = sys.argv[1:2] == ['test']
+
+# Home feed: authors above this subscriber count are merged in at read time instead of pushed to timelines
+FEED_PUSH_MAX_SUBSCRIBERS = 10000
+
+# Full-text search: backend defaults to MySQL FULLTEXT or SQLite FTS5 depending on the database vendor
+# SEARCH_BACKEND = 'api.search.MySQLFullTextBackend'
+SEARCH_MAX_RESULTS = 200
+SEARCH_TITLE_BOOST = 5.0
+
+# Trending leaderboard: weight of a like and of a 5-star rating, and the largest page served
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_RATING_WEIGHT = 1.0
+TRENDING_MAX_RESULTS = 100
+
+# Local-memory cache with LRU culling for cached API responses, which are keyed by object version.
+# The versions live in a cache shared by every process on the host, so a change made by another
+# worker, the background jobs or a management command invalidates this process's responses too.
+# The shared cache also keeps the state every process must see: unread notification counters
+# and sign-in throttle counters (add() and incr() are atomic across processes), and the replica
+# pins of bearer-token clients.
+# Across several hosts, point 'shared' at a shared backend (e.g. RedisCache or PyMemcacheCache).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blogging-platform',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'api.cache_backends.SharedFileCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'blogging-platform-shared'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+RESPONSE_CACHE_ALIAS = 'default'
+VERSION_CACHE_ALIAS = 'shared'
+THROTTLE_CACHE_ALIAS = 'shared'
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Under ASGI (e.g. `uvicorn blogging_platform.asgi:application`), serve the post, feed and notification
+# reads with native async views; WSGI servers keep the DRF views. Compare with `manage.py bench_async_reads`.
+ASYNC_READ_VIEWS = True
+ASYNC_READ_URLCONF = 'blogging_platform.async_urls'
+
+# Email outbox used by share_post: delivered in batches by the background worker or `manage.py send_outbox --loop`
+OUTBOX_FROM_EMAIL = 'no-reply@blog.com'
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BACKOFF = 60  # seconds before the first retry, doubled after each failure
+OUTBOX_AUTO_DRAIN = True
+
+# Assemble JSON post list pages from per-post JSON fragments cached by post version
+POST_FRAGMENT_CACHE = True
+# Most (published date, id) pairs cached per author and per category for their post pages; deeper pages are queried
+POST_KEYS_CACHE_SIZE = 1000
+
+# Tags returned by /api/tags/cloud/ by default, and the most a client can ask for with ?limit=
+TAG_CLOUD_SIZE = 50
+TAG_CLOUD_MAX_SIZE = 200
+
+# Related posts (see api/related.py): how many are stored per post, the boosts added to the tag
+# similarity for a shared category or author, the post count above which a tag is ignored, and
+# whether updates after a change run on the background worker. Rebuild with rebuild_related_posts.
+RELATED_POSTS_COUNT = 10
+RELATED_CATEGORY_BOOST = 0.2
+RELATED_AUTHOR_BOOST = 0.1
+RELATED_MAX_TAG_POSTS = 5000
+RELATED_POSTS_ASYNC = True
+
+# In-process cache of users for authenticating read-only requests without a query (see api/authentication.py)
+AUTH_USER_CACHE_TTL = 30  # seconds; saves in the same process invalidate immediately
+AUTH_USER_CACHE_SIZE = 10000
+
+# Bounded thread pool for password hashing (see api/hashing.py)
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_QUEUE = 32  # waiting hash jobs before sign-in attempts are turned away with 429
+
+# Profile picture pipeline (see api/avatars.py)
+AVATAR_SIZES = (64, 128, 256)  # square thumbnails, each stored as WebP and JPEG
+AVATAR_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+
+# Per-request timings (SQL, Markdown, serialization, auth) as a Server-Timing header and JSON log lines
+# on the 'api.instrumentation' logger (see api/instrumentation.py). Off, the middleware removes itself.
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED') == '1'
+INSTRUMENTATION_SLOW_MS = 500  # slower requests are logged at WARNING with their SQL
+INSTRUMENTATION_SQL_SAMPLE_RATE = 1.0
+INSTRUMENTATION_PROFILE_KEY = os.getenv('INSTRUMENTATION_PROFILE_KEY')  # send as X-Profile to cProfile a request (WSGI only)
@@ -16,9 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from api.views import avatar_file
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # content-addressed profile pictures, served with immutable cache headers
+    path('media/avatars/<path:path>', avatar_file, name='avatar-file'),
     path('api/', include('api.urls')),
     path('markdownx/', include('markdownx.urls')),
         
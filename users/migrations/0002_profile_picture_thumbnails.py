@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_thumbnails',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-17 23:02
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def fill_slugs(apps, schema_editor):
+    # the historical model has no save() override, so the slugs are derived here as users.models.slug_base does
+    User = apps.get_model('users', 'User')
+    taken = set()
+    users = list(User.objects.order_by('pk').only('pk', 'username'))
+    for user in users:
+        base = slugify(user.username)[:50].strip('-') or 'user'
+        slug, suffix = base, 1
+        while slug in taken:
+            suffix += 1
+            slug = f'{base}-{suffix}'
+        taken.add(slug)
+        user.slug = slug
+    User.objects.bulk_update(users, ['slug'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_profile_picture_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='slug',
+            field=models.SlugField(db_index=False, default='', editable=False, max_length=60),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='slug',
+            field=models.SlugField(editable=False, max_length=60, unique=True),
+        ),
+    ]
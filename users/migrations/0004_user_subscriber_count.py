@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subscribers(apps, schema_editor):
+    AuthorSubscription = apps.get_model('blog', 'AuthorSubscription')
+    counts = Subquery(AuthorSubscription.objects.filter(author=OuterRef('pk')).order_by().values('author')
+                      .annotate(total=Count('pk')).values('total'), output_field=IntegerField())
+    apps.get_model('users', 'User').objects.update(subscriber_count=Coalesce(counts, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_slug'),
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='subscriber_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_subscribers, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,84 @@
-from django.db import models
+import re
+import string
+from django.db import models, router, transaction, IntegrityError
+from django.db.models import F
 from django.contrib.auth.models import BaseUserManager, AbstractUser
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
+
+
+# random suffixes tried once a slug and its next free numeric suffix were both taken concurrently
+SLUG_RANDOM_ATTEMPTS = 5
+
+
+def slug_base(instance, value):
+    """
+    The slug value maps to; empty when value has no usable characters.
+    """
+    max_length = instance._meta.get_field('slug').max_length
+    # room is left for the suffix a colliding slug gets
+    return slugify(value)[:max_length - 10].strip('-')
+
+
+def has_slug_base(instance, base):
+    return bool(instance.slug) and re.fullmatch(rf'{re.escape(base)}(-\d+)?', instance.slug) is not None
+
+
+def unique_slug(instance, base):
+    """
+    base, with a numeric suffix when another row of the instance's model already has it as slug.
+    """
+    # one query for every slug the suffixes could collide with, instead of one per attempt
+    taken = set(type(instance)._default_manager.exclude(pk=instance.pk)
+                .filter(slug__startswith=base).values_list('slug', flat=True))
+    slug, suffix = base, 1
+    while slug in taken:
+        suffix += 1
+        slug = f'{base}-{suffix}'
+    return slug
+
+
+def slug_candidates(instance, base):
+    """
+    Slugs to try in turn: base, then its next free numeric suffix, then random numeric suffixes.
+    Without a base only random suffixes of the model name are tried, since those would all share one prefix.
+    """
+    if base:
+        yield base
+        yield unique_slug(instance, base) # only scanned once base is taken
+    prefix = base or instance._meta.model_name
+    for _ in range(SLUG_RANDOM_ATTEMPTS):
+        yield f'{prefix}-{get_random_string(6, string.digits)}'
+
+
+def save_with_slug(instance, value, save, args, kwargs):
+    """
+    Save the instance with save(*args, **kwargs), giving it a unique slug derived from value and
+    keeping the one it has while value maps to the same base. Call from save() in place of super().save().
+
+    Each slug is inserted rather than checked first, so concurrent saves that pick the same one
+    retry with the next candidate instead of failing on the unique constraint.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not {'slug', *instance.slug_source} & set(update_fields):
+        return save(*args, **kwargs)
+    base = slug_base(instance, value)
+    if has_slug_base(instance, base or instance._meta.model_name):
+        return save(*args, **kwargs)
+    if update_fields is not None:
+        kwargs['update_fields'] = {*update_fields, 'slug'}
+    manager = type(instance)._default_manager
+    for slug in slug_candidates(instance, base):
+        instance.slug = slug
+        try:
+            # a savepoint, so a collision leaves any surrounding transaction usable
+            with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(instance), instance=instance)):
+                return save(*args, **kwargs)
+        except IntegrityError:
+            if not manager.exclude(pk=instance.pk).filter(slug=slug).exists():
+                raise # another unique field collided
+    raise IntegrityError(f"No free slug for {base or instance._meta.model_name!r} after {SLUG_RANDOM_ATTEMPTS} random attempts.")
+
 
 #Custom user manager to handle user creation 
 class UserManager(BaseUserManager):
@@ -41,11 +120,21 @@ class User(AbstractUser):
     
     """
     email = models.EmailField(unique=True, max_length=100)
-    username = models.CharField(unique=False, max_length=50)
+    username = models.CharField(unique=False, max_length=50, db_index=True) # indexed for author lookups by username
+    # unique handle in author URLs, since usernames are not unique; follows the username, or the local part
+    # of the email while the username is empty (see save_with_slug)
+    slug = models.SlugField(max_length=60, unique=True, editable=False)
+    slug_source = ('username', 'email')
     
     #optional bio and profile picture fields with image upload capability for user profiles
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # sha256 of the picture, which names where it and its thumbnails are stored (see api/avatars.py)
+    profile_picture_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    profile_picture_thumbnails = models.BooleanField(default=False) # True once the thumbnails are generated
+    # maintained with atomic F() updates as subscriptions are created and deleted (see api/signals.py);
+    # the feed pulls the posts of authors above FEED_PUSH_MAX_SUBSCRIBERS instead of pushing them
+    subscriber_count = models.PositiveIntegerField(default=0, editable=False)
 
 # Specify email as the field used for authentication instead of username
     USERNAME_FIELD = 'email'
@@ -56,6 +145,24 @@ class User(AbstractUser):
 #Use the custom manager for user creation
     objects = UserManager()
 
+    # columns only ever written with F() updates, so a regular save() must not overwrite them with stale values
+    COUNTER_FIELDS = ('subscriber_count',)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        save_with_slug(self, self.username or self.email.partition('@')[0], super().save, args, kwargs)
+
+    @classmethod
+    def update_subscriber_count(cls, user_id, delta):
+        """
+        Atomically add delta (1 or -1) to the user's subscriber count.
+        """
+        cls.objects.filter(pk=user_id, subscriber_count__gte=-delta).update(subscriber_count=F('subscriber_count') + delta)
+
     def __str__(self):
         return self.email
     
\ No newline at end of file